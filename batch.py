@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Runs storefront commands read from a JSONL file, one request per line.
+
+Each request is a json object such as
+    {"customer": "alice", "command": "purchase", "args": {"part_id": "CPU_01"}}
+and produces one json result line with the request's line number, whether
+it succeeded, its structured result or error, and the text it printed.
+"""
+
+import json
+import time
+
+import commands
+
+# Run every request in a JSONL file against the store and write the results
+# to output as JSONL. Returns the number of commands run, the time taken and
+# the throughput.
+def run_batch(store, requests_file, output):
+    count = 0
+    start = time.perf_counter()
+    with open(requests_file, encoding = "utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            count += 1
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a json object")
+            except ValueError as exc:
+                result = {"ok": False, "error": f"Invalid request: {exc}"}
+            else:
+                result = commands.execute(store,
+                                          str(request.get("customer", "")),
+                                          request.get("command"),
+                                          request.get("args"))
+            output.write(json.dumps({"line": line_number, **result}) + "\n")
+    seconds = time.perf_counter() - start
+    return {"commands": count, "seconds": seconds,
+            "commands_per_sec": count / seconds if seconds else 0.0}
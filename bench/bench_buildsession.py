@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Measures a step of buildsession.BuildSession on large catalogs: choosing a
+part and narrowing every slot left to fill, as the interactive build shows
+after each step, against narrowing by scanning the parts of each slot.
+
+Usage: bench/bench_buildsession.py [number of parts ...] [--builds N]
+
+For each catalog size, builds are made from random parts that still fit,
+with an undo and redo after every choice. For the first few builds, the
+counts of parts that fit are checked against the scan after every step.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import buildsession
+import functions
+from index import InventoryIndex
+import synthetic
+
+# Parts shown for each slot left to fill, as render.build_session shows.
+EXAMPLES = 5
+# Builds checked against the scan, which is slow, for each catalog.
+CHECKED = 3
+
+# Return whether a part fits a slot of a session, checking every choice in
+# the other slots, as a scan would.
+def fits(session, slot, part):
+    choice = [part] if slot == "rams" else part
+    return not session.violations(slot, choice)
+
+# Return the number of parts of each slot left to fill that fit, scanning
+# every part of the slot's type.
+def scan(session, by_type):
+    return {slot: sum(fits(session, slot, part)
+                      for part in by_type[buildsession.SLOTS[slot]])
+            for slot in session.open_slots()}
+
+# Return the number of parts of each slot left to fill that fit, and a few
+# of them, from the session's indexes.
+def narrow(session):
+    counts = {}
+    for slot in session.open_slots():
+        counts[slot] = session.count(slot)
+        session.candidates(slot, EXAMPLES)
+    return counts
+
+# Make one build from parts that fit, undoing and redoing each choice, and
+# return the seconds spent in steps and the steps taken. With a scan, check
+# the session's counts against it after every step.
+def make_build(session, rng, by_type = None):
+    seconds = 0.0
+    steps = 0
+    while (slot := session.next_slot()) is not None:
+        start = time.perf_counter()
+        parts = session.candidates(slot, 50)
+        seconds += time.perf_counter() - start
+        if not parts:
+            # Nothing fits; start the slot before it again.
+            session.undo()
+            continue
+        part = rng.choice(parts)
+        choice = [part] * rng.randint(1, session.max_rams or 1) \
+            if slot == "rams" else part
+        start = time.perf_counter()
+        session.choose(slot, choice)
+        session.undo()
+        session.redo()
+        counts = narrow(session)
+        seconds += time.perf_counter() - start
+        steps += 1
+        if by_type is not None and counts != scan(session, by_type):
+            sys.exit(f"Counts after choosing {slot} differ from the scan.")
+    return seconds, steps
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split(
+        "\n\n", maxsplit = 1)[0])
+    parser.add_argument("sizes", type = int, nargs = "*",
+                        default = [10_000, 100_000, 1_000_000])
+    parser.add_argument("--builds", type = int, default = 200)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    for size in args.sizes:
+        inventory = {item["id"]: functions.create_part(item) for item
+                     in synthetic.make_items(size, args.seed)}
+        start = time.perf_counter()
+        index = InventoryIndex(inventory)
+        # The index is built on its first lookup.
+        index.count("CPU")
+        indexing = time.perf_counter() - start
+        by_type = {}
+        for part in inventory.values():
+            by_type.setdefault(part.type, []).append(part)
+
+        rng = random.Random(args.seed)
+        for _ in range(CHECKED):
+            make_build(buildsession.BuildSession(index), rng, by_type)
+        seconds = steps = 0
+        for _ in range(args.builds):
+            spent, taken = make_build(buildsession.BuildSession(index), rng)
+            seconds += spent
+            steps += taken
+        session = buildsession.BuildSession(index)
+        session.choose("motherboard", rng.choice(by_type["Motherboard"]))
+        start = time.perf_counter()
+        scan(session, by_type)
+        scanning = time.perf_counter() - start
+        print(f"{size} parts, indexed in {indexing:.2f}s: "
+              f"{seconds / steps * 1e6:.0f}us per step with the indexes, "
+              f"{scanning * 1e6:.0f}us scanning after a motherboard "
+              f"(checked)")
+
+if __name__ == "__main__":
+    main()
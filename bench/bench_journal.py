@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Measures journal.Journal: how many events a second it logs at different
+group commit sizes, and how long restoring takes from a long log and from
+a snapshot with a short log after it.
+
+Usage: bench/bench_journal.py [number of events] [directory]
+
+The journal is written under the directory, a temporary one by default;
+give a directory on the disk to be measured, since fsync costs depend on it.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import commands
+import functions
+from journal import Journal, sessions_state
+import synthetic
+
+GROUP_SIZES = (1, 8, 64, 512)
+CUSTOMERS = 1000
+
+# Return n cart events over the parts: mostly parts added, and some
+# removed again.
+def make_events(part_ids, n, seed = 0):
+    rng = random.Random(seed)
+    events = []
+    carts = {}
+    for _ in range(n):
+        customer = f"customer-{rng.randrange(CUSTOMERS)}"
+        cart = carts.setdefault(customer, [])
+        if cart and rng.random() < 0.2:
+            part_id = cart.pop(rng.randrange(len(cart)))
+            events.append({"customer": customer, "op": "remove",
+                           "items": [[part_id, 1]]})
+        else:
+            part_id = rng.choice(part_ids)
+            cart.append(part_id)
+            events.append({"customer": customer, "op": "add",
+                           "parts": [[part_id, 1]]})
+    return events
+
+# Restore a journal into a new store and return the seconds taken and the
+# events replayed.
+def time_restore(inventory, directory):
+    store = commands.Store(inventory, matrix = False)
+    journal = Journal(directory)
+    start = time.perf_counter()
+    replayed = journal.restore(store)
+    seconds = time.perf_counter() - start
+    journal.close()
+    return seconds, replayed
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    inventory = {item["id"]: functions.create_part(item)
+                 for item in synthetic.make_items(6000)}
+    events = make_events(list(inventory), n)
+    with tempfile.TemporaryDirectory(
+            dir = sys.argv[2] if len(sys.argv) > 2 else None) as root:
+        print(f"{n} events")
+        for group_size in GROUP_SIZES:
+            # A long delay leaves every write to the group commit.
+            directory = os.path.join(root, f"group-{group_size}")
+            journal = Journal(directory, group_size, max_delay = 60,
+                              snapshot_every = n + 1)
+            journal.restore(commands.Store(inventory, matrix = False))
+            start = time.perf_counter()
+            for event in events:
+                journal.append(event)
+            journal.flush()
+            seconds = time.perf_counter() - start
+            journal.close()
+            print(f"\tgroup commit of {group_size}: {n / seconds:.0f} "
+                  f"events/sec, {journal.fsyncs} fsyncs")
+
+        directory = os.path.join(root, f"group-{GROUP_SIZES[-1]}")
+        seconds, replayed = time_restore(inventory, directory)
+        print(f"\trestore from the log alone: {replayed} events in "
+              f"{seconds * 1000:.0f}ms")
+        # Snapshot the restored sessions and log a short tail after them.
+        store = commands.Store(inventory, matrix = False)
+        journal = Journal(directory)
+        journal.restore(store)
+        journal.checkpoint(sessions_state(store))
+        for event in events[:n // 100]:
+            journal.append(event)
+        journal.close()
+        seconds, replayed = time_restore(inventory, directory)
+        print(f"\trestore from a snapshot of {len(store.sessions)} sessions "
+              f"and {replayed} events: {seconds * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
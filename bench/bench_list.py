@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compares printing each part of a listing as it is found, as list_parts used
+to, with rendering the whole listing and writing it at once.
+
+Output goes to the null device, once line buffered as a terminal is and
+once block buffered as a redirected file is.
+
+Usage: bench/bench_list.py [number of parts]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import render
+import synthetic
+
+# Print the details of each part on its own, as list_parts did.
+def print_each(inventory, file):
+    for item in inventory.values():
+        print(f"{item.details()}", file = file)
+
+# List the parts with the quiet API and write the rendered listing once.
+def render_once(inventory, file):
+    render.show(render.parts(functions.list_parts(inventory)), file)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    inventory = {item["id"]: functions.create_part(item)
+                 for item in synthetic.make_items(n)}
+    print(f"{n} parts")
+
+    start = time.perf_counter()
+    functions.list_parts(inventory)
+    seconds = time.perf_counter() - start
+    print(f"\tlist_parts alone: {seconds:.3f}s")
+
+    for label, buffering in (("line buffered", 1), ("block buffered", -1)):
+        timings = {}
+        for method in (print_each, render_once):
+            with open(os.devnull, "w", buffering = buffering) as file:
+                start = time.perf_counter()
+                method(inventory, file)
+                timings[method] = time.perf_counter() - start
+        print(f"\t{label}: print per part {timings[print_each]:.2f}s, "
+              f"one write {timings[render_once]:.2f}s "
+              f"({timings[print_each] / timings[render_once]:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Compares the memory used by a dict of part objects with objects.PartStore.
+
+Usage: bench/bench_memory.py [number of parts]
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import objects
+import synthetic
+
+# Build an inventory with add(part) for every synthetic part and return the
+# traced memory it holds, in bytes, and the time taken.
+def measure(n, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    inventory = build(functions.create_part(item)
+                      for item in synthetic.make_items(n))
+    seconds = time.perf_counter() - start
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del inventory
+    return used, seconds
+
+class _DictPart:
+    """Part with a per-instance __dict__, as parts were before __slots__."""
+
+# Copy a part into an object with a __dict__.
+def unslotted(part):
+    copy = _DictPart()
+    for klass in type(part).__mro__:
+        for field in getattr(klass, "__slots__", ()):
+            setattr(copy, field, getattr(part, field))
+    return copy
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    layouts = {"dict of objects with __dict__":
+                   lambda parts: {part.id: unslotted(part) for part in parts},
+               "dict of objects with __slots__":
+                   lambda parts: {part.id: part for part in parts},
+               "PartStore": objects.PartStore}
+    print(f"{n} parts")
+    for label, build in layouts.items():
+        used, seconds = measure(n, build)
+        print(f"\t{label}: {used / 2**20:.1f} MiB "
+              f"({used / n:.0f} bytes/part, built in {seconds:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Measures what metrics cost per command: with metrics off, against running
+the command handler without the check, and with metrics on.
+
+Usage: bench/bench_metrics.py [number of commands] [number of parts]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import commands
+import functions
+from metrics import Metrics
+import synthetic
+
+# Commands a browsing customer sends, by name and arguments.
+WORKLOAD = (("details", {"part_id": "CPU_0000001"}),
+            ("compatibility", {"part_id1": "CPU_0000001",
+                               "part_id2": "MB_0000001"}),
+            ("purchase", {"part_id": "RAM_0000001"}),
+            ("remove", {"items": ["RAM_0000001"]}),
+            ("cart", {}))
+
+# Run n commands of the workload and return the seconds taken, the best
+# of a few runs.
+def run(store, n, execute, repeat = 5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for number in range(n):
+            command, args = WORKLOAD[number % len(WORKLOAD)]
+            execute(store, "bench", command, args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    parts = int(sys.argv[2]) if len(sys.argv) > 2 else 6000
+    inventory = {item["id"]: functions.create_part(item)
+                 for item in synthetic.make_items(parts)}
+    print(f"{n} commands over {parts} parts")
+
+    store = commands.Store(inventory)
+    run(store, n, commands.execute, 1)
+    bare = run(store, n, commands._execute)
+    off = run(store, n, commands.execute)
+    metrics = Metrics()
+    metrics.instrument()
+    store.metrics = metrics
+    try:
+        on = run(store, n, commands.execute)
+    finally:
+        metrics.restore()
+    for label, seconds in (("handler alone", bare), ("metrics off", off),
+                           ("metrics on", on)):
+        print(f"\t{label}: {seconds / n * 1e6:.2f}us per command "
+              f"({(seconds - bare) / n * 1e9:+.0f}ns)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compares cart totals kept as float dollars, as Decimal dollars and as
+integer cents, the way money.py keeps them.
+
+Usage: bench/bench_money.py [number of cart lines ...]
+
+For each cart size, the lines are added to a running total one at a time,
+as a cart does, and summed once more from the lines, as checkout does; the
+cents total is summed with money.LineTotals, which uses NumPy for long
+carts when it is installed. The float total is then checked against the
+exact one, and a total left after adding and removing every line again
+shows how far floats drift.
+"""
+
+from decimal import Decimal
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import money
+
+# Return the seconds of the fastest of a few runs of func.
+def best_of(func, runs = 5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+# Return the total of the (price, units) lines added one at a time.
+def running_total(lines, zero):
+    total = zero
+    for price, units in lines:
+        total += price * units
+    return total
+
+# Return what is left of a total after adding and then removing each line.
+def churned_total(lines, zero):
+    total = zero
+    for price, units in lines:
+        total += price * units
+    for price, units in lines:
+        total -= price * units
+    return total
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10, 1000, 100_000]
+    rng = random.Random(0)
+    for n in sizes:
+        cents = [(rng.randrange(100, 250_000), rng.randint(1, 4))
+                 for _ in range(n)]
+        floats = [(price / money.CENTS, units) for price, units in cents]
+        decimals = [(Decimal(price).scaleb(-2), units)
+                    for price, units in cents]
+        line_totals = money.LineTotals()
+        for number, (price, units) in enumerate(cents):
+            line_totals.set(number, price, units)
+        exact = running_total(cents, 0)
+
+        print(f"{n} lines, total {money.format_cents(exact)}")
+        for label, lines, zero, checkout in (
+                ("float dollars", floats, 0.0,
+                 lambda: running_total(floats, 0.0)),
+                ("Decimal dollars", decimals, Decimal(0),
+                 lambda: running_total(decimals, Decimal(0))),
+                ("integer cents", cents, 0, line_totals.total)):
+            adding = best_of(lambda: running_total(lines, zero))
+            summing = best_of(checkout)
+            total = running_total(lines, zero)
+            if isinstance(total, int):
+                shown = money.format_cents(total)
+            else:
+                shown = f"${total:.2f}"
+            check = ("exact" if shown == money.format_cents(exact) else
+                     f"shows {shown}")
+            print(f"\t{label}: adding {adding / n * 1e9:.0f}ns per line, "
+                  f"checkout {summing * 1e6:.1f}us, {check}, "
+                  f"{churned_total(lines, zero)!s} left after removing")
+
+if __name__ == "__main__":
+    main()
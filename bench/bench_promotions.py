@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Measures what promotions cost a cart change: repricing the changed line
+with promotions.Promotions, as objects.Cart does, against working out every
+promotion over the whole cart again after each change.
+
+Usage: bench/bench_promotions.py [cart lines ...] [--rules N]
+
+A cart of synthetic parts is filled to each number of lines and then
+changed at random: units of parts added and removed, and computers built
+and taken out. Besides a GPU sale, a RAM multi-buy and CPU and motherboard
+bundles, --rules sales on single parts are added, some of them on parts of
+the other promotions. The discounts kept by the cart, loose CPUs and
+motherboards paired by bundles included, are checked against the naive
+ones after every change.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import money
+import objects
+import promotions
+import synthetic
+
+CHANGES = 5000
+# Changes checked, and timed, with the naive discounts, which are slow.
+NAIVE_CHANGES = 50
+
+# Return the promotions for the benchmark, with sales on single parts.
+def make_rules(inventory, sales, rng):
+    rules = [{"name": "GPU sale", "type": "percent", "percent": 10,
+              "parts": {"category": "GPU"}},
+             {"name": "RAM 3 for 2", "type": "multibuy", "buy": 3,
+              "pay": 2, "parts": {"category": "RAM"}},
+             {"name": "AM5 bundle", "type": "bundle", "amount": 50,
+              "cpu": {"socket": "AM5"}, "motherboard": {"socket": "AM5"}},
+             {"name": "LGA1700 bundle", "type": "bundle", "percent": 8,
+              "cpu": {"socket": "LGA1700"},
+              "motherboard": {"socket": "LGA1700"}}]
+    part_ids = sorted(inventory)
+    for number in range(sales):
+        rules.append({"name": f"Sale {number}", "type": "percent",
+                      "percent": rng.choice((5, 12.5, 20, 30)),
+                      "parts": {"ids": rng.sample(part_ids, 3)}})
+    return rules
+
+# Return whether a selector of a promotion picks a part.
+def picks(selector, part):
+    return (selector.get("category", part.type) == part.type and
+            selector.get("socket", getattr(part, "socket", None)) ==
+            getattr(part, "socket", None) and
+            ("ids" not in selector or part.id in selector["ids"]))
+
+# Return what units of a part save under the rules, working every rule out.
+def naive_line(rules, part, units):
+    best = 0
+    for rule in rules:
+        if rule["type"] == "bundle" or not picks(rule["parts"], part):
+            continue
+        if rule["type"] == "percent":
+            hundredths = money.to_cents(rule["percent"])
+            best = max(best, (part.price * units * hundredths + 5000) //
+                       10000)
+        else:
+            best = max(best, units // rule["buy"] *
+                       (rule["buy"] - rule["pay"]) * part.price)
+    return min(best, part.price * units)
+
+# Return what the loose CPUs and motherboards of a cart save from bundles,
+# listing the units each bundle covers first. The benchmark's bundles cover
+# different sockets, so no unit is shared by two of them.
+def naive_loose_bundles(rules, cart):
+    bundles = [rule for rule in rules if rule["type"] == "bundle"]
+    units = [{"CPU": [], "Motherboard": []} for _ in bundles]
+    value = 0
+    for part_id, count in cart.counts.items():
+        part = cart.parts[part_id]
+        if part.type not in ("CPU", "Motherboard"):
+            continue
+        for bundle, rule in zip(units, bundles):
+            if picks({"category": part.type, **rule[part.type.lower()]},
+                     part):
+                bundle[part.type] += [part.price] * count
+                value += part.price * count - naive_line(rules, part, count)
+                break
+    discount = 0
+    for bundle, rule in zip(units, bundles):
+        pairs = min(len(bundle["CPU"]), len(bundle["Motherboard"]))
+        if "amount" in rule:
+            discount += pairs * money.to_cents(rule["amount"])
+        elif pairs:
+            price = sum(sum(sorted(prices)[-pairs:])
+                        for prices in bundle.values())
+            discount += (price * money.to_cents(rule["percent"]) +
+                         5000) // 10000
+    return min(discount, value)
+
+# Return what a whole cart saves under the rules, working every rule out.
+def naive_discount(rules, cart):
+    discount = naive_loose_bundles(rules, cart)
+    for part_id, units in cart.counts.items():
+        discount += naive_line(rules, cart.parts[part_id], units)
+    for computer in cart.computers.values():
+        units = {}
+        for part in computer.parts():
+            units[part] = units.get(part, 0) + 1
+        saved = sum(naive_line(rules, part, count)
+                    for part, count in units.items())
+        bundle = 0
+        for rule in rules:
+            if (rule["type"] == "bundle" and
+                    picks({"category": "CPU", **rule["cpu"]}, computer.cpu)
+                    and picks({"category": "Motherboard",
+                               **rule["motherboard"]},
+                              computer.motherboard)):
+                bundle = max(bundle, money.to_cents(rule["amount"])
+                             if "amount" in rule else
+                             ((computer.cpu.price +
+                               computer.motherboard.price) *
+                              money.to_cents(rule["percent"]) + 5000) //
+                             10000)
+        discount += min(saved + bundle, computer.price)
+    return discount
+
+# Return a computer of parts picked at random, its CPU and motherboard
+# sharing a socket.
+def make_computer(by_type, number, rng):
+    motherboard = rng.choice(by_type["Motherboard"])
+    cpus = [cpu for cpu in by_type["CPU"]
+            if cpu.socket == motherboard.socket] or by_type["CPU"]
+    ram = rng.choice(by_type["RAM"])
+    return objects.Computer(f"PC_{number}", motherboard,
+                            [ram] * rng.choice((2, 3, 4)), rng.choice(cpus),
+                            rng.choice(by_type["PSU"]),
+                            rng.choice(by_type["Storage"]))
+
+# Return the cart changes for a cart of a number of lines: first filling
+# it, then changing it at random, as ("add", part, units), ("remove", part
+# ID, units), ("build", computer) and ("unbuild", computer ID).
+def make_changes(inventory, by_type, lines, rng):
+    parts = list(inventory.values())
+    changes = []
+    held = {}
+    computers = []
+    while len(held) < lines:
+        part = rng.choice(parts)
+        changes.append(("add", part, 1))
+        held[part.id] = held.get(part.id, 0) + 1
+    filled = len(changes)
+    for number in range(CHANGES):
+        roll = rng.random()
+        if roll < 0.05:
+            computer = make_computer(by_type, number, rng)
+            computers.append(computer.id)
+            changes.append(("build", computer))
+        elif roll < 0.1 and computers:
+            changes.append(("unbuild",
+                            computers.pop(rng.randrange(len(computers)))))
+        elif roll < 0.55 or not held:
+            part = rng.choice(parts)
+            units = rng.randint(1, 3)
+            held[part.id] = held.get(part.id, 0) + units
+            changes.append(("add", part, units))
+        else:
+            part_id = rng.choice(list(held))
+            units = rng.randint(1, held[part_id])
+            held[part_id] -= units
+            if not held[part_id]:
+                del held[part_id]
+            changes.append(("remove", part_id, units))
+    return changes[:filled], changes[filled:]
+
+# Make one change to a cart.
+def change(cart, step):
+    if step[0] == "add":
+        cart.add(step[1], step[2])
+    elif step[0] == "remove":
+        cart.remove(step[1], step[2])
+    elif step[0] == "build":
+        cart.add_computer(step[1])
+    else:
+        cart.remove_computer(step[1])
+
+# Return the microseconds per change of making the changes to a filled
+# cart, working out the whole cart's discount after each one if a naive
+# function is given.
+def time_changes(fill, changes, offers = None, naive = None):
+    cart = objects.Cart(promotions = offers)
+    for step in fill:
+        change(cart, step)
+    start = time.perf_counter()
+    for step in changes:
+        change(cart, step)
+        if naive is not None:
+            naive(cart)
+    return (time.perf_counter() - start) / len(changes) * 1e6
+
+# Exit if the discount a cart keeps is not the naive one, or its total is
+# not the one summed from its lines.
+def check_cart(cart, rules, step):
+    expected = naive_discount(rules, cart)
+    if cart.discount != expected or cart.line_totals.total() != cart.total:
+        sys.exit(f"Discount {cart.discount} after {step}, expected "
+                 f"{expected}.")
+
+# Make the changes to a filled cart, checking it after filling it and
+# after every change. Return the discount at the end.
+def check(fill, changes, offers, rules):
+    cart = objects.Cart(promotions = offers)
+    for step in fill:
+        change(cart, step)
+    check_cart(cart, rules, "filling the cart")
+    for step in changes:
+        change(cart, step)
+        check_cart(cart, rules, step[0])
+    return cart.discount
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split(
+        "\n\n", maxsplit = 1)[0])
+    parser.add_argument("lines", type = int, nargs = "*",
+                        default = [10, 100, 1000])
+    parser.add_argument("--rules", type = int, default = 200,
+                        help = "sales on single parts to add (default: 200)")
+    parser.add_argument("--parts", type = int, default = 6000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    inventory = {item["id"]: functions.create_part(item) for item
+                 in synthetic.make_items(args.parts, args.seed)}
+    by_type = {}
+    for part in inventory.values():
+        by_type.setdefault(part.type, []).append(part)
+    rules = make_rules(inventory, args.rules, rng)
+    start = time.perf_counter()
+    offers = promotions.Promotions(rules, inventory)
+    print(f"{len(rules)} promotions over {args.parts} parts, compiled in "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms")
+    for lines in args.lines:
+        fill, changes = make_changes(inventory, by_type, lines, rng)
+        discount = check(fill, changes[:NAIVE_CHANGES], offers, rules)
+        plain = time_changes(fill, changes)
+        compiled = time_changes(fill, changes, offers)
+        naive = time_changes(fill, changes[:NAIVE_CHANGES],
+                             naive = lambda cart: naive_discount(rules, cart))
+        print(f"\t{lines} lines: {plain:.1f}us per change without "
+              f"promotions, {compiled:.1f}us repricing the line, "
+              f"{naive:.0f}us working out the whole cart "
+              f"(checked, {money.format_cents(discount)} off)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compares solver.recommend with brute-force enumeration of every build.
+
+Usage: bench/bench_recommend.py [--sizes N ...] [--budget B] [--k K]
+"""
+
+import argparse
+import heapq
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import money
+import solver
+import synthetic
+
+# Return the score of a build under an objective.
+def build_score(build, objective):
+    parts = [build.motherboard, build.cpu, build.psu, build.storage,
+             build.storage2, build.gpu]
+    return (sum(objective.part_score(part) for part in parts if part) +
+            objective.part_score(build.ram) * build.ram_count)
+
+# Return the k best builds by enumerating every compatible build.
+def brute_force(inventory, budget, objective, k, catalog):
+    return heapq.nlargest(k, solver.enumerate_builds(inventory, budget,
+                                                     catalog),
+                          key = lambda build: (build_score(build, objective),
+                                               -build.price))
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument("--sizes", type = int, nargs = "+",
+                        default = [60, 90, 6000, 60000])
+    parser.add_argument("--budget", type = money.to_cents, default = "1500",
+                        help = "budget in dollars (default: 1500)")
+    parser.add_argument("--k", type = int, default = 5)
+    parser.add_argument("--brute-limit", type = int, default = 100,
+                        help = "largest catalog to brute force")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        inventory = {}
+        for item in synthetic.make_items(size):
+            part = functions.create_part(item)
+            inventory[part.id] = part
+        catalog = solver.Catalog(inventory)
+        for name, objective in solver.OBJECTIVES.items():
+            start = time.perf_counter()
+            solver.recommend(inventory, args.budget, objective, args.k,
+                             catalog)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            builds = solver.recommend(inventory, args.budget, objective,
+                                      args.k, catalog)
+            warm = time.perf_counter() - start
+            line = (f"{size} parts, {name}: recommend {first * 1000:.1f}ms "
+                    f"first, {warm * 1000:.2f}ms warm")
+            if size <= args.brute_limit:
+                start = time.perf_counter()
+                expected = brute_force(inventory, args.budget, objective,
+                                       args.k, catalog)
+                brute = time.perf_counter() - start
+                same = ([(build_score(build, objective), build.price)
+                         for build in builds] ==
+                        [(build_score(build, objective), build.price)
+                         for build in expected])
+                line += (f", brute force {brute * 1000:.1f}ms "
+                         f"({'same' if same else 'DIFFERENT'} ranking)")
+            print(line)
+
+if __name__ == "__main__":
+    main()
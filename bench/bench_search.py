@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Measures building the search index and the time of typical queries.
+
+Usage: bench/bench_search.py [number of parts]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import search
+import synthetic
+
+# Queries a customer might type: exact words, prefixes, misspellings and
+# attributes, over the whole catalog and within a category.
+QUERIES = (("synthetic cpu", ""), ("lga1700 motherboard", ""),
+           ("synth gpu overclockable", ""), ("synthetik storag", ""),
+           ("32gb", "RAM"), ("am4", "CPU"), ("cpu_00001", ""),
+           ("ram 4217", ""))
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    parts = [functions.create_part(item)
+             for item in synthetic.make_items(n)]
+    print(f"{n} parts")
+
+    start = time.perf_counter()
+    index = search.SearchIndex(parts)
+    index.prepare()
+    print(f"\tindex built in {time.perf_counter() - start:.2f}s")
+
+    for query, category in QUERIES:
+        for page in (1, 5):
+            timings = []
+            for _ in range(20):
+                start = time.perf_counter()
+                results = index.search(query, category or None, page)
+                timings.append(time.perf_counter() - start)
+            label = f"{query!r}" + (f" in {category}" if category else "")
+            print(f"\t{label}, page {page}: "
+                  f"{statistics.median(timings) * 1e6:.0f}us, "
+                  f"{len(results.parts)} parts"
+                  f"{', more follow' if results.more else ''}")
+
+if __name__ == "__main__":
+    main()
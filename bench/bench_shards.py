@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Measures how server.py scales with worker processes, driving customers who
+set a budget, buy parts, build computers and check out.
+
+Usage: bench/bench_shards.py [--parts N] [--customers N] [--workers 1,2,4]
+                             [--connections N] [--port PORT]
+
+A synthetic inventory is generated and compiled to a snapshot, and a server
+is started with each number of workers in turn and driven with the same
+requests. Throughput is reported with its speedup over the first run. The
+clients run in this process, so on a machine with few cores they compete
+with the workers for them.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import loadgen
+import snapshot
+import synthetic
+import workload
+
+# Commands of the workload sessions that are sent; browsing is left out.
+COMMANDS = ("budget", "purchase", "build", "checkout")
+
+# Return the scripts of the customers, as lists of server requests.
+def make_scripts(catalog, customers, seed):
+    scripts = {}
+    for request in workload.sessions(catalog, customers, seed):
+        if request["command"] in COMMANDS:
+            scripts.setdefault(request["customer"], []).append(
+                {"session": request["customer"],
+                 "command": request["command"], "args": request["args"]})
+    return list(scripts.values())
+
+# Drive a server with the scripts and return the requests per second, the
+# sorted latencies and the number of failed commands.
+async def drive(port, scripts, connections):
+    pool = asyncio.Queue()
+    for _ in range(connections):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        pool.put_nowait(loadgen.Connection(reader, writer))
+    latencies = []
+    failed = []
+
+    # Run one customer's script, keeping the responses that failed.
+    async def run(script):
+        for request in script:
+            connection = await pool.get()
+            start = time.perf_counter()
+            try:
+                response = await connection.request(request)
+            finally:
+                latencies.append(time.perf_counter() - start)
+                pool.put_nowait(connection)
+            if not response["ok"]:
+                failed.append(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(script) for script in scripts))
+    seconds = time.perf_counter() - start
+    while not pool.empty():
+        pool.get_nowait().writer.close()
+    latencies.sort()
+    return len(latencies) / seconds, latencies, len(failed)
+
+# Start a server with a number of workers, drive it and stop it.
+def run_workers(json_file, workers, scripts, args):
+    server = subprocess.Popen([sys.executable,
+                               os.path.join(ROOT, "server.py"), json_file,
+                               "--port", str(args.port),
+                               "--workers", str(workers)],
+                              stderr = subprocess.DEVNULL)
+    try:
+        asyncio.run(loadgen.wait_for_server("127.0.0.1", args.port))
+        return asyncio.run(drive(args.port, scripts, args.connections))
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split(
+        "\n\n", maxsplit = 1)[0])
+    parser.add_argument("--parts", type = int, default = 60_000)
+    parser.add_argument("--customers", type = int, default = 2000)
+    parser.add_argument("--workers", default = None,
+                        help = "comma-separated worker counts (default: 1 "
+                               "and powers of two up to the cores)")
+    parser.add_argument("--connections", type = int, default = 64)
+    parser.add_argument("--port", type = int, default = 8766)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(",")]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= (os.cpu_count() or 1):
+            counts.append(counts[-1] * 2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, "inventory.json")
+        synthetic.write_inventory(json_file, args.parts, args.seed)
+        snapshot.current_snapshot(json_file)
+        catalog = workload.load_catalog(json_file, args.seed)
+        scripts = make_scripts(catalog, args.customers, args.seed)
+        print(f"{args.parts} parts, {args.customers} customers, "
+              f"{sum(map(len, scripts))} requests, {os.cpu_count()} cores")
+        baseline = None
+        for workers in counts:
+            rate, latencies, failed = run_workers(json_file, workers,
+                                                  scripts, args)
+            baseline = baseline or rate
+            print(f"\t{workers} workers: {rate:.0f} requests/sec "
+                  f"({rate / baseline:.2f}x), p50 "
+                  f"{loadgen.percentile(latencies, 0.50) * 1000:.2f}ms, p99 "
+                  f"{loadgen.percentile(latencies, 0.99) * 1000:.2f}ms, "
+                  f"{failed} failed")
+
+if __name__ == "__main__":
+    main()
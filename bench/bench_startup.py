@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Compares starting a store from a json inventory with starting it from the
+inventory's binary snapshot: loading the inventory and making the
+commands.Store that serves it, as storefront.py and server.py do.
+
+Usage: bench/bench_startup.py [number of parts]
+
+After starting, some parts are looked up by ID and the first step of a
+build is narrowed, which reads one sorted index from the snapshot.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import commands
+import functions
+import snapshot
+from stock import StockLedger
+import synthetic
+
+LOOKUPS = 1000
+
+# Time a function and return its result and the seconds taken.
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+# Look up some parts by ID and read a field of each, as the first commands
+# of a session would.
+def look_up(inventory, part_ids):
+    return sum(inventory[part_id].price for part_id in part_ids)
+
+# Load an inventory and make a store over it, as storefront.py --batch and
+# server.py do, and return the store. The search index is left to the
+# store, which builds it on the first search.
+def start(load, json_file):
+    stock = StockLedger()
+    inventory = load(json_file, stock = stock)
+    return commands.Store(inventory, stock)
+
+# Return the number of CPUs that fit under 100W, as narrowing the CPUs of a
+# build does.
+def first_step(store):
+    return store.index.count("CPU", "power_draw", None, 100)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, "inventory.json")
+        snapshot_file = snapshot.snapshot_path(json_file)
+        synthetic.write_inventory(json_file, n)
+        _, compile_seconds = timed(snapshot.compile_snapshot, json_file,
+                                   snapshot_file)
+        print(f"{n} parts: {os.path.getsize(json_file) / 2**20:.1f} MiB of "
+              f"json, {os.path.getsize(snapshot_file) / 2**20:.1f} MiB "
+              f"snapshot compiled in {compile_seconds:.2f}s")
+
+        store, json_seconds = timed(start, functions.create_inventory,
+                                    json_file)
+        part_ids = random.Random(0).sample(list(store.inventory),
+                                           min(LOOKUPS, n))
+        expected, json_lookups = timed(look_up, store.inventory, part_ids)
+        fitting, json_step = timed(first_step, store)
+        del store
+        print(f"\tjson:     started in {json_seconds * 1000:.1f}ms, "
+              f"{len(part_ids)} lookups in {json_lookups * 1000:.2f}ms, "
+              f"first build step in {json_step * 1000:.1f}ms")
+
+        store, open_seconds = timed(start, snapshot.load_inventory,
+                                    json_file)
+        if not isinstance(store.inventory, snapshot.SnapshotInventory):
+            raise AssertionError("the snapshot was not opened")
+        total, snapshot_lookups = timed(look_up, store.inventory, part_ids)
+        if total != expected:
+            raise AssertionError("the snapshot and json prices differ")
+        found, snapshot_step = timed(first_step, store)
+        if found != fitting:
+            raise AssertionError("the snapshot and json indexes differ")
+        stock = StockLedger()
+        _, stock_seconds = timed(lambda: [
+            stock.set(part_id, count)
+            for part_id, count in store.inventory.stock_counts()])
+        store.inventory.close()
+        print(f"\tsnapshot: started in {open_seconds * 1000:.2f}ms, "
+              f"{len(part_ids)} lookups in {snapshot_lookups * 1000:.2f}ms, "
+              f"first build step in {snapshot_step * 1000:.1f}ms "
+              f"({json_seconds / open_seconds:.0f}x faster to start)")
+        print(f"\tloading every stock count up front: "
+              f"{stock_seconds * 1000:.1f}ms (load_inventory reads them "
+              "on first use instead)")
+
+if __name__ == "__main__":
+    main()
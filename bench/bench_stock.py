@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measures stock.StockLedger under threads reserving and releasing parts.
+
+Usage: bench/bench_stock.py [threads] [operations per thread]
+
+Most operations hit a few hot parts, as on a sale. Each run compares one lock
+for the whole ledger with the default striping, and checks afterwards that no
+units were lost or created.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from functions import PartException
+from stock import StockLedger
+
+PARTS = [f"PART_{number:04d}" for number in range(2000)]
+HOT = PARTS[:8]
+UNITS = 50
+
+# Reserve parts for a simulated customer and then either release them or
+# commit them as a sale, counting the units sold.
+def worker(ledger, operations, seed, sold, barrier):
+    rng = random.Random(seed)
+    units = 0
+    barrier.wait()
+    for _ in range(operations):
+        part_id = rng.choice(HOT) if rng.random() < 0.8 else rng.choice(PARTS)
+        try:
+            reservation = ledger.reserve(part_id)
+        except PartException:
+            continue
+        if rng.random() < 0.05:
+            try:
+                ledger.commit([reservation])
+                units += 1
+            except PartException:
+                pass
+        else:
+            ledger.release(reservation)
+    sold.append(units)
+
+# Run the workload and return the operations per second and units sold.
+def run(stripes, threads, operations):
+    ledger = StockLedger(stripes = stripes)
+    for part_id in PARTS:
+        ledger.set(part_id, UNITS)
+    sold = []
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target = worker,
+                                args = (ledger, operations, seed, sold,
+                                        barrier))
+               for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    seconds = time.perf_counter() - start
+    left = sum(ledger.available(part_id) for part_id in PARTS)
+    if left + sum(sold) != UNITS * len(PARTS):
+        raise AssertionError(f"{UNITS * len(PARTS)} units stocked, but "
+                             f"{left} left and {sum(sold)} sold")
+    return threads * operations / seconds, sum(sold)
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    print(f"{threads} threads, {operations} operations each, "
+          f"{len(HOT)} hot parts of {len(PARTS)}")
+    for stripes in (1, 64):
+        rate, sold = run(stripes, threads, operations)
+        print(f"\t{stripes} stripe(s): {rate:.0f} ops/sec, {sold} units "
+              "sold, stock conserved")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Times the core storefront operations on a synthetic catalog and customer
+workload, and writes the results as json to compare across commits.
+
+The inventory is generated with synthetic.py unless one is given, loaded
+with create_inventory, and then driven by the customer sessions of
+workload.py through commands.execute, with the metrics of metrics.py timing
+list_parts, compatibility, compatibility_build, build, remove, checkout and
+the other functions the commands call. The load and the workload are run
+--repeat times, each on a freshly loaded inventory, and the median of the
+runs is reported, since a single run can be a third slower than the next
+on the same code.
+
+Usage: bench/bench_suite.py [--parts N] [--customers N] [--repeat N]
+                            [--output FILE] [--compare BASELINE]
+                            [--threshold FRACTION]
+
+With --compare, each operation is checked against the results of an
+earlier run, and the exit status is 1 if any mean time grew by more than
+the threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import commands
+import functions
+from metrics import Metrics
+from stock import StockLedger
+import synthetic
+import workload
+
+# Operations reported, in order, after create_inventory.
+OPERATIONS = ("list_parts", "details", "compatibility", "purchase",
+              "build", "compatibility_build", "remove", "checkout")
+
+# Return the commit the suite runs on, or None outside a git checkout.
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd = ROOT, capture_output = True, text = True,
+                              check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Load the inventory and return it with its stock and the timing of the
+# load.
+def time_load(json_file):
+    stock = StockLedger()
+    start = time.perf_counter()
+    inventory = functions.create_inventory(json_file, stock = stock)
+    seconds = time.perf_counter() - start
+    return inventory, stock, {"count": 1, "mean": seconds, "total": seconds}
+
+# Run the workload against the inventory and return the timing of each
+# operation and the commands per second.
+def time_workload(inventory, stock, requests):
+    store = commands.Store(inventory, stock)
+    metrics = Metrics()
+    metrics.instrument()
+    try:
+        start = time.perf_counter()
+        for request in requests:
+            commands.execute(store, request["customer"], request["command"],
+                             request["args"])
+        seconds = time.perf_counter() - start
+    finally:
+        metrics.restore()
+    hot_paths = metrics.snapshot()["hot_paths"]
+    results = {}
+    for operation in OPERATIONS:
+        latency = hot_paths.get(f"functions.{operation}")
+        if latency is not None:
+            results[operation] = {
+                "count": latency["count"],
+                "mean": latency["total"] / latency["count"],
+                "p50": latency["p50"], "p95": latency["p95"],
+                "p99": latency["p99"], "total": latency["total"]}
+    return results, len(requests) / seconds
+
+# Return the median of each timing of each operation over several runs,
+# each a dictionary of operation -> timings.
+def median_timings(runs):
+    medians = {}
+    for operation in runs[0]:
+        timings = [run[operation] for run in runs if operation in run]
+        medians[operation] = {field: statistics.median(
+            timing[field] for timing in timings) for field in timings[0]}
+    return medians
+
+# Print how each operation compares with a baseline and return the
+# operations whose mean time grew by more than the threshold.
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"Compared with {baseline.get('commit') or 'the baseline'}:")
+    for key in ("parts", "customers", "seed", "machine"):
+        if baseline.get(key) != results[key]:
+            print(f"\tnote: the baseline ran with {key} "
+                  f"{baseline.get(key)}, this run with {results[key]}")
+    for operation, timing in results["operations"].items():
+        before = baseline["operations"].get(operation)
+        if before is None:
+            continue
+        ratio = timing["mean"] / before["mean"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(operation)
+            flag = "  REGRESSION"
+        print(f"\t{operation}: {before['mean'] * 1e6:.1f}us -> "
+              f"{timing['mean'] * 1e6:.1f}us ({ratio:.2f}x){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split(
+        "\n\n", maxsplit = 1)[0])
+    parser.add_argument("--parts", type = int, default = 100_000,
+                        help = "parts to generate, from 10k to 10M")
+    parser.add_argument("--inventory",
+                        help = "use this inventory instead of generating one")
+    parser.add_argument("--customers", type = int, default = 2000)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--repeat", type = int, default = 5,
+                        help = "runs of the load and workload, the median "
+                               "counting (default: 5)")
+    parser.add_argument("--output", metavar = "FILE",
+                        help = "write the results to this json file")
+    parser.add_argument("--compare", metavar = "BASELINE",
+                        help = "results of an earlier run to compare with")
+    parser.add_argument("--threshold", type = float, default = 0.5,
+                        help = "slowdown of a mean time counted as a "
+                               "regression (default: 0.5)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = args.inventory
+        if json_file is None:
+            json_file = os.path.join(directory, "inventory.json")
+            synthetic.write_inventory(json_file, args.parts, args.seed)
+        catalog = workload.load_catalog(json_file, args.seed)
+        requests = list(workload.sessions(catalog, args.customers,
+                                          args.seed))
+        runs = []
+        rates = []
+        for _ in range(max(args.repeat, 1)):
+            inventory, stock, load = time_load(json_file)
+            operations, rate = time_workload(inventory, stock, requests)
+            runs.append({"create_inventory": load, **operations})
+            rates.append(rate)
+    commands_per_sec = statistics.median(rates)
+
+    results = {"commit": git_commit(), "python": platform.python_version(),
+               "machine": platform.machine(), "parts": len(inventory),
+               "customers": args.customers, "requests": len(requests),
+               "seed": args.seed, "repeat": len(runs),
+               "commands_per_sec": commands_per_sec,
+               "operations": median_timings(runs)}
+    print(f"{len(inventory)} parts, {args.customers} customers, "
+          f"{len(requests)} requests at {commands_per_sec:.0f} commands/sec, "
+          f"median of {len(runs)} runs")
+    for operation, timing in results["operations"].items():
+        print(f"\t{operation}: {timing['count']} calls, "
+              f"mean {timing['mean'] * 1e6:.1f}us")
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as file:
+            json.dump(results, file, indent = 2)
+            file.write("\n")
+    if args.compare:
+        with open(args.compare, encoding = "utf-8") as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
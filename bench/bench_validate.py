@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compares checking builds one at a time with compatibility_build against
+bulk.validate_builds.
+
+Usage: bench/bench_validate.py [number of builds] [number of parts]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bulk
+import functions
+import objects
+import synthetic
+
+# Return random builds over the inventory, as saved quotes would be: the
+# CPU usually fits the motherboard, but some builds break other rules.
+def make_builds(inventory, n, seed = 0):
+    rng = random.Random(seed)
+    ids = {}
+    sockets = {}
+    for part in inventory.values():
+        ids.setdefault(part.type, []).append(part.id)
+        if part.type == "CPU":
+            sockets.setdefault(part.socket, []).append(part.id)
+    builds = []
+    for _ in range(n):
+        motherboard = rng.choice(ids["Motherboard"])
+        cpus = sockets.get(inventory[motherboard].socket)
+        if not cpus or rng.random() < 0.1:
+            cpus = ids["CPU"]
+        build = [motherboard, rng.choice(cpus), rng.choice(ids["PSU"]),
+                 rng.choice(ids["Storage"])]
+        build += [rng.choice(ids["RAM"])] * rng.randint(1, 4)
+        if rng.random() < 0.5:
+            build.append(rng.choice(ids["GPU"]))
+        builds.append(build)
+    return builds
+
+# Check each build the way the build command does: look up its parts,
+# create a Computer and run compatibility_build.
+def one_at_a_time(inventory, builds):
+    results = []
+    for build in builds:
+        parts = {}
+        for part_id in build:
+            part = inventory[part_id]
+            parts.setdefault(part.type, []).append(part)
+        computer = objects.Computer(
+            "", parts["Motherboard"][0], parts["RAM"], parts["CPU"][0],
+            parts["PSU"][0], parts["Storage"][0], None,
+            parts["GPU"][0] if "GPU" in parts else None)
+        try:
+            results.append(functions.compatibility_build(computer).compatible)
+        except functions.PartException:
+            results.append(False)
+    return results
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    parts = int(sys.argv[2]) if len(sys.argv) > 2 else 6000
+    inventory = {item["id"]: functions.create_part(item)
+                 for item in synthetic.make_items(parts)}
+    builds = make_builds(inventory, n)
+    print(f"{n} builds over {parts} parts")
+
+    start = time.perf_counter()
+    expected = one_at_a_time(inventory, builds)
+    baseline = time.perf_counter() - start
+    print(f"\tcompatibility_build one at a time: {baseline:.2f}s "
+          f"({n / baseline:.0f} builds/sec)")
+
+    runs = [("validate_builds, plain Python", {"use_numpy": False})]
+    if bulk.np is not None:
+        runs.append(("validate_builds, NumPy", {}))
+    processes = os.cpu_count() or 1
+    if 1 < processes:
+        runs.append((f"validate_builds, {processes} processes",
+                     {"processes": processes}))
+    for label, options in runs:
+        start = time.perf_counter()
+        verdicts = bulk.validate_builds(inventory, builds, **options)
+        seconds = time.perf_counter() - start
+        if list(map(bool, verdicts.ok)) != expected:
+            raise AssertionError(f"{label} disagrees with "
+                                 "compatibility_build")
+        print(f"\t{label}: {seconds:.2f}s ({n / seconds:.0f} builds/sec, "
+              f"{baseline / seconds:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Drives simulated customers against a storefront server and reports latency.
+
+Usage: bench/loadgen.py [--inventory inventory.json] [--customers N]
+                        [--connections N] [--host HOST] [--port PORT]
+
+With --inventory, a local server.py is started for the run; otherwise the
+server must already be listening on host and port.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Return the requests of one simulated customer's session.
+def customer_script(customer, rng, parts):
+    script = [("budget", {"amount": rng.choice((500, 1500, 5000))}),
+              ("list", {"category": rng.choice(("CPU", "RAM", "GPU"))})]
+    for _ in range(rng.randint(1, 4)):
+        script.append(("purchase", {"part_id": rng.choice(parts)}))
+    script.append(("details", {"part_id": rng.choice(parts)}))
+    script.append(("cart", {}))
+    if rng.random() < 0.3:
+        script.append(("remove", {"items": [script[2][1]["part_id"]]}))
+    script.append(("checkout", {}))
+    return [{"session": customer, "command": command, "args": args}
+            for command, args in script]
+
+class Connection:
+    """A client connection sending one request at a time."""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, request):
+        self.writer.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+# Run one customer's script, borrowing a pooled connection per request, and
+# record each request's latency.
+async def run_customer(pool, script, latencies, failures):
+    for request in script:
+        connection = await pool.get()
+        start = time.perf_counter()
+        try:
+            response = await connection.request(request)
+        finally:
+            latencies.append(time.perf_counter() - start)
+            pool.put_nowait(connection)
+        if response.get("error") and "Invalid request" in response["error"]:
+            failures.append(response)
+
+# Return the value at the given percentile of sorted values.
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def drive(args):
+    pool = asyncio.Queue()
+    for _ in range(args.connections):
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        pool.put_nowait(Connection(reader, writer))
+    # Ask the server which parts it sells.
+    connection = await pool.get()
+    response = await connection.request({"session": "loadgen",
+                                         "command": "list"})
+    parts = response["result"]["parts"]
+    pool.put_nowait(connection)
+    rng = random.Random(args.seed)
+    scripts = [customer_script(f"customer-{number}", rng, parts)
+               for number in range(args.customers)]
+    latencies = []
+    failures = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_customer(pool, script, latencies, failures)
+                           for script in scripts))
+    seconds = time.perf_counter() - start
+    while not pool.empty():
+        pool.get_nowait().writer.close()
+
+    latencies.sort()
+    print(f"{args.customers} customers, {len(latencies)} requests over "
+          f"{args.connections} connections in {seconds:.2f}s "
+          f"({len(latencies) / seconds:.0f} requests/sec)")
+    print(f"\tp50 {percentile(latencies, 0.50) * 1000:.2f}ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms, "
+          f"max {latencies[-1] * 1000:.2f}ms")
+    if failures:
+        print(f"\t{len(failures)} malformed requests")
+
+# Wait until a server accepts connections on host and port.
+async def wait_for_server(host, port, timeout = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            return
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split(
+        "\n", maxsplit = 1)[0])
+    parser.add_argument("--inventory", help = "start a local server with "
+                                              "this inventory")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--customers", type = int, default = 2000)
+    parser.add_argument("--connections", type = int, default = 64)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    server = None
+    if args.inventory:
+        server = subprocess.Popen([sys.executable,
+                                   os.path.join(ROOT, "server.py"),
+                                   args.inventory, "--host", args.host,
+                                   "--port", str(args.port)])
+    try:
+        asyncio.run(wait_for_server(args.host, args.port))
+        asyncio.run(drive(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
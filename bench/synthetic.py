@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic inventory items for the benchmarks, and writes them out
+as inventory.json files.
+
+Sockets follow the mix of a current catalog, so most CPUs find motherboards
+that fit them, and prices are skewed the way real ones are: most parts sell
+near a typical price for their category and a few cost far more. Power draw
+and supplied power grow with price.
+
+Usage: bench/synthetic.py number_of_parts inventory_file
+"""
+
+import json
+import math
+import random
+import sys
+
+CATEGORIES = ("CPU", "GPU", "RAM", "PSU", "Motherboard", "Storage")
+SOCKETS = ("LGA", "PGA", "AM4", "AM5", "LGA1700")
+SOCKET_WEIGHTS = (0.1, 0.05, 0.25, 0.25, 0.35)
+ID_PREFIXES = {"CPU": "CPU", "GPU": "GPU", "RAM": "RAM", "PSU": "PSU",
+               "Motherboard": "MB", "Storage": "STORAGE"}
+# Typical, lowest and highest price of each category. Prices are drawn
+# from a log-normal distribution around the typical price.
+PRICES = {"CPU": (250, 40, 1500), "GPU": (450, 80, 2500),
+          "RAM": (70, 15, 600), "PSU": (110, 35, 500),
+          "Motherboard": (180, 50, 900), "Storage": (90, 20, 800)}
+PRICE_SPREAD = 0.6
+# Most units in stock of a part; one part in fifty is sold out.
+MAX_STOCK = 50
+
+# Return a price for a part of a category.
+def _price(rng, part_type):
+    typical, low, high = PRICES[part_type]
+    price = rng.lognormvariate(math.log(typical), PRICE_SPREAD)
+    return int(min(high, max(low, price)))
+
+# Yield n inventory items spread evenly over the categories, in the same
+# shape as the "item" objects of inventory.json.
+def make_items(n, seed = 0):
+    rng = random.Random(seed)
+    for number in range(n):
+        part_type = CATEGORIES[number % len(CATEGORIES)]
+        price = _price(rng, part_type)
+        item = {"id": f"{ID_PREFIXES[part_type]}_{number // len(CATEGORIES):07d}",
+                "type": part_type,
+                "name": f"Synthetic {part_type} {number}",
+                "price": price}
+        if part_type == "CPU":
+            item["power_draw"] = min(400, 35 + price // 4 +
+                                     rng.randrange(0, 40))
+            item["socket"] = rng.choices(SOCKETS, SOCKET_WEIGHTS)[0]
+        elif part_type == "GPU":
+            item["power_draw"] = min(450, 75 + price // 6 +
+                                     rng.randrange(0, 50))
+            item["overclockable"] = rng.random() < 0.5
+        elif part_type == "RAM":
+            item["power_draw"] = rng.randrange(2, 15)
+            item["capacity"] = rng.choices((4, 8, 16, 32, 64),
+                                           (0.05, 0.2, 0.35, 0.3, 0.1))[0]
+        elif part_type == "PSU":
+            item["power_supplied"] = min(1600, 300 + price * 5 // 50 * 50)
+        elif part_type == "Motherboard":
+            item["power_draw"] = rng.randrange(10, 80)
+            item["socket"] = rng.choices(SOCKETS, SOCKET_WEIGHTS)[0]
+            item["ram_slots"] = rng.choices((2, 4, 8), (0.2, 0.7, 0.1))[0]
+        else:
+            item["capacity"] = rng.choice((256, 512, 1000, 2000, 4000))
+        yield item
+
+# Write n synthetic parts, with stock counts, as an inventory json file,
+# one part at a time so any size fits in memory.
+def write_inventory(path, n, seed = 0):
+    rng = random.Random(seed + 1)
+    with open(path, "w", encoding = "utf-8") as file:
+        file.write('{"inventory": [\n')
+        for number, item in enumerate(make_items(n, seed)):
+            item["stock"] = (0 if rng.random() < 0.02 else
+                             rng.randint(1, MAX_STOCK))
+            if number:
+                file.write(",\n")
+            file.write(json.dumps({"item": item}))
+        file.write("\n]}\n")
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__.strip().rsplit("\n", maxsplit = 1)[-1])
+    n, path = int(sys.argv[1]), sys.argv[2]
+    write_inventory(path, n)
+    print(f"Wrote {n} parts to {path}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Generates customer sessions as batch requests for the benchmarks.
+
+Each customer sets a budget, browses a category and a few parts, checks a
+CPU against a motherboard, buys a few parts and often builds a computer,
+mostly from parts that fit together, and checks it. Some remove an item
+again, and most then look at their cart and check out; a checkout over
+budget or out of stock fails as it would for a real customer.
+
+Usage: bench/workload.py inventory.json number_of_customers [requests file]
+
+The requests are written one per line in the format of
+storefront.py --batch, to standard output unless a file is given.
+"""
+
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import synthetic
+
+# Most parts of a category kept to draw sessions from.
+SAMPLE = 20_000
+
+class Catalog:
+    """A random sample of the parts of each category, with the sockets of
+    CPUs and the sockets and RAM slots of motherboards."""
+    def __init__(self, items = (), seed = 0):
+        self._rng = random.Random(seed)
+        # Category -> sampled items.
+        self.items = {}
+        # Category -> items seen.
+        self._seen = {}
+        self.cpus_by_socket = {}
+        for item in items:
+            self.add(item)
+        self.prepare()
+
+    # Offer an inventory item to the sample, keeping each category's sample
+    # uniform over every item offered.
+    def add(self, item):
+        part_type = item["type"]
+        sample = self.items.setdefault(part_type, [])
+        seen = self._seen[part_type] = self._seen.get(part_type, 0) + 1
+        if len(sample) < SAMPLE:
+            sample.append(item)
+            return
+        slot = self._rng.randrange(seen)
+        if slot < SAMPLE:
+            sample[slot] = item
+
+    # Group the sampled CPUs by socket, once every item has been added.
+    def prepare(self):
+        self.cpus_by_socket = {}
+        for item in self.items.get("CPU", ()):
+            self.cpus_by_socket.setdefault(item["socket"], []).append(item)
+
+    def pick(self, rng, part_type):
+        return rng.choice(self.items[part_type])["id"]
+
+# Return the build arguments of a computer: usually a CPU that fits the
+# motherboard, and as many RAM sticks as it has slots or fewer.
+def _build_args(rng, catalog, computer_id):
+    motherboard = rng.choice(catalog.items["Motherboard"])
+    cpus = catalog.cpus_by_socket.get(motherboard["socket"])
+    if not cpus or rng.random() < 0.1:
+        cpus = catalog.items["CPU"]
+    args = {"computer_id": computer_id, "motherboard": motherboard["id"],
+            "rams": [catalog.pick(rng, "RAM")] * rng.randint(
+                1, motherboard["ram_slots"]),
+            "cpu": rng.choice(cpus)["id"], "psu": catalog.pick(rng, "PSU"),
+            "storage": catalog.pick(rng, "Storage")}
+    if rng.random() < 0.2:
+        args["storage2"] = catalog.pick(rng, "Storage")
+    if rng.random() < 0.6:
+        args["gpu"] = catalog.pick(rng, "GPU")
+    return args
+
+# Return the requests of one customer's session, as (command, args) pairs.
+def session(rng, catalog):
+    requests = [("budget", {"amount": rng.choice((800, 1500, 3000, 6000))}),
+                ("list", {"category": rng.choice(synthetic.CATEGORIES)})]
+    for _ in range(rng.randint(1, 3)):
+        part_type = rng.choice(synthetic.CATEGORIES)
+        requests.append(("details",
+                         {"part_id": catalog.pick(rng, part_type)}))
+    requests.append(("compatibility",
+                     {"part_id1": catalog.pick(rng, "CPU"),
+                      "part_id2": catalog.pick(rng, "Motherboard")}))
+    bought = [catalog.pick(rng, rng.choice(synthetic.CATEGORIES))
+              for _ in range(rng.randint(1, 3))]
+    requests += [("purchase", {"part_id": part_id}) for part_id in bought]
+    if rng.random() < 0.6:
+        requests.append(("build", _build_args(rng, catalog, "PC_1")))
+        requests.append(("compatibility-build", {"computer_id": "PC_1"}))
+    if rng.random() < 0.3:
+        requests.append(("remove", {"items": [rng.choice(bought)]}))
+    requests.append(("cart", {}))
+    if rng.random() < 0.8:
+        requests.append(("checkout", {}))
+    return requests
+
+# Yield the requests of the sessions of n customers, as batch request
+# dictionaries, one customer after another.
+def sessions(catalog, n, seed = 0):
+    rng = random.Random(seed)
+    for number in range(n):
+        customer = f"customer-{number}"
+        for command, args in session(rng, catalog):
+            yield {"customer": customer, "command": command, "args": args}
+
+# Return a Catalog sampled from an inventory json file.
+def load_catalog(json_file, seed = 0):
+    catalog = Catalog(seed = seed)
+    for entry in functions.iter_inventory_entries(json_file):
+        catalog.add(entry["item"])
+    catalog.prepare()
+    return catalog
+
+def main():
+    if len(sys.argv) not in (3, 4):
+        sys.exit(__doc__.strip().split("\n\n")[-2])
+    catalog = load_catalog(sys.argv[1])
+    requests = sessions(catalog, int(sys.argv[2]))
+    output = (open(sys.argv[3], "w", encoding = "utf-8")
+              if len(sys.argv) > 3 else sys.stdout)
+    try:
+        for request in requests:
+            output.write(json.dumps(request) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Defines a cache of computer build results for storefront.py.
+"""
+
+from collections import OrderedDict
+import threading
+from typing import NamedTuple, Tuple
+
+class BuildResult(NamedTuple):
+    """The totals of a set of parts and the rules.Violations they break."""
+    price: int
+    power_draw: int
+    violations: Tuple = ()
+
+# Return the key a build is cached under: its part IDs, with each RAM stick
+# listed, in sorted order, and its number of RAM sticks. Builds that differ
+# only in the order of their parts share a key.
+def build_key(parts, ram_count):
+    return (tuple(sorted(part.id for part in parts if part is not None)),
+            ram_count)
+
+class BuildCache:
+    """Least recently used cache of BuildResults by build key.
+
+    Entries that use a part are dropped by invalidate() when the part
+    changes. Hits, misses, evictions and invalidations are counted so the
+    size can be tuned. The cache can be shared by threads.
+    """
+    def __init__(self, maxsize = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # Part ID -> keys of the cached builds using it.
+        self._keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Return the cached result of a build key, or None on a miss.
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+    # Cache the result of a build key, evicting the least recently used
+    # entry if the cache is full.
+    def put(self, key, result):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if key not in self._entries:
+                for part_id in set(key[0]):
+                    self._keys.setdefault(part_id, set()).add(key)
+                if len(self._entries) >= self.maxsize:
+                    self._drop(next(iter(self._entries)))
+                    self.evictions += 1
+            self._entries[key] = result
+
+    # Remove an entry and its references from the part map. The lock must
+    # be held.
+    def _drop(self, key):
+        del self._entries[key]
+        for part_id in set(key[0]):
+            keys = self._keys[part_id]
+            keys.discard(key)
+            if not keys:
+                del self._keys[part_id]
+
+    # Drop every cached build that uses a part, after the part changed.
+    def invalidate(self, part_id):
+        with self._lock:
+            for key in list(self._keys.get(part_id, ())):
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    # Return the counters and size of the cache.
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations}
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Builds a computer one part at a time, checking each part as it is chosen.
+
+A BuildSession holds the parts chosen so far for each slot of a build. Every
+choice is checked at once against the parts already chosen, with the same
+rules functions.build applies, and the parts that still fit each slot left
+to fill are narrowed to match: a motherboard's socket limits the CPUs and
+its RAM slots limit the sticks, a CPU's socket limits the motherboards, and
+a PSU limits every part to the power it leaves spare. The narrowing is done
+with the sorted indexes of index.InventoryIndex, kept per part type and
+socket for power draw, power supplied and RAM slots, so a step costs a few
+binary searches however large the catalog. Choices can be undone and
+redone.
+"""
+
+import functions
+import rules
+
+# Slots of a build in the order they are filled, with the type of their
+# parts. The "rams" slot holds a list of RAM sticks of one ID.
+SLOTS = {"motherboard": "Motherboard", "rams": "RAM", "cpu": "CPU",
+         "psu": "PSU", "storage": "Storage", "storage2": "Storage",
+         "gpu": "GPU"}
+# Slots that can be left empty.
+OPTIONAL = ("storage2", "gpu")
+
+# Return the power drawn by the part or RAM sticks in a slot.
+def _draw(choice):
+    if choice is None:
+        return 0
+    if isinstance(choice, list):
+        return sum(ram.power_draw for ram in choice)
+    return getattr(choice, "power_draw", 0)
+
+class BuildSession:
+    """The parts chosen so far for a computer, over an InventoryIndex.
+
+    choices maps each slot chosen to its part, a list of RAM sticks for
+    "rams", or None for an optional slot left empty. choose() raises a
+    functions.BuildException with every rule a part breaks, and leaves
+    the session as it was.
+    """
+    def __init__(self, index, computer_id = None):
+        self.index = index
+        self.computer_id = computer_id
+        self.choices = {}
+        # Choices before each step, and choices undone.
+        self._undo = []
+        self._redo = []
+
+    # Return the first slot not chosen yet, or None if every one is.
+    def next_slot(self):
+        for slot in SLOTS:
+            if slot not in self.choices:
+                return slot
+        return None
+
+    # Return the slots not chosen yet.
+    def open_slots(self):
+        return [slot for slot in SLOTS if slot not in self.choices]
+
+    # The socket of the chosen motherboard or CPU, or None.
+    @property
+    def socket(self):
+        part = self.choices.get("motherboard") or self.choices.get("cpu")
+        return None if part is None else part.socket
+
+    # The most RAM sticks the chosen motherboard takes, or None.
+    @property
+    def max_rams(self):
+        motherboard = self.choices.get("motherboard")
+        return None if motherboard is None else motherboard.ram_slots
+
+    # The power drawn by the parts chosen so far.
+    @property
+    def power_draw(self):
+        return sum(_draw(choice) for choice in self.choices.values())
+
+    # The power supplied by the chosen PSU, or None.
+    @property
+    def power_supplied(self):
+        psu = self.choices.get("psu")
+        return None if psu is None else psu.power_supplied
+
+    # The power the chosen PSU has to spare, or None if none is chosen.
+    @property
+    def headroom(self):
+        supplied = self.power_supplied
+        return None if supplied is None else supplied - self.power_draw
+
+    # Return the power left for a slot's part once the parts in the other
+    # slots are counted, or None if no PSU is chosen.
+    def _room_for(self, slot):
+        supplied = self.power_supplied
+        if supplied is None or slot == "psu":
+            return None
+        return supplied - self.power_draw + _draw(self.choices.get(slot))
+
+    # Return the index lookup narrowing a slot, as the arguments of
+    # InventoryIndex.range and count, and a check of the constraint the
+    # lookup leaves out, if any.
+    def _lookup(self, slot):
+        room = self._room_for(slot)
+        if slot == "motherboard":
+            cpu = self.choices.get("cpu")
+            socket = None if cpu is None else cpu.socket
+            sticks = len(self.choices.get("rams") or ()) or None
+            check = (None if room is None else
+                     lambda part: part.power_draw <= room)
+            return ("Motherboard", "ram_slots", sticks, None, socket), check
+        if slot == "cpu":
+            motherboard = self.choices.get("motherboard")
+            socket = None if motherboard is None else motherboard.socket
+            return ("CPU", "power_draw", None, room, socket), None
+        if slot == "rams":
+            # Room for one stick at least; choose() checks the count.
+            return ("RAM", "power_draw", None, room, None), None
+        if slot == "psu":
+            draw = self.power_draw - _draw(self.choices.get("psu"))
+            return ("PSU", "power_supplied", draw, None, None), None
+        if slot == "gpu":
+            return ("GPU", "power_draw", None, room, None), None
+        return ("Storage", "price", None, None, None), None
+
+    # Return the parts that still fit a slot, given the other slots'
+    # choices, or the first limit of them. CPUs, RAM and GPUs come sorted
+    # by power draw, PSUs by power supplied, motherboards by RAM slots and
+    # storage by price.
+    def candidates(self, slot, limit = None):
+        (part_type, field, low, high, socket), check = self._lookup(slot)
+        if check is None:
+            return self.index.range(part_type, field, low, high, socket,
+                                    limit)
+        parts = [part for part in self.index.range(part_type, field, low,
+                                                   high, socket)
+                 if check(part)]
+        return parts if limit is None else parts[:limit]
+
+    # Return the number of parts that still fit a slot.
+    def count(self, slot):
+        lookup, check = self._lookup(slot)
+        if check is None:
+            return self.index.count(*lookup)
+        return len(self.candidates(slot))
+
+    # Return the rules a choice for a slot breaks with the other choices.
+    def violations(self, slot, choice):
+        chosen = dict(self.choices)
+        chosen[slot] = choice
+        motherboard = chosen.get("motherboard")
+        cpu = chosen.get("cpu")
+        rams = chosen.get("rams")
+        psu = chosen.get("psu")
+        found = []
+        if slot in ("motherboard", "cpu") and motherboard and cpu:
+            found.append(rules.socket_violation(motherboard.socket,
+                                                cpu.socket))
+        if slot == "rams":
+            found.append(rules.ram_id_violation(len({ram.id
+                                                     for ram in rams})))
+        if slot in ("motherboard", "rams") and motherboard and rams:
+            found.append(rules.ram_slots_violation(len(rams),
+                                                   motherboard.ram_slots))
+        if psu is not None:
+            found.append(rules.power_violation(
+                sum(_draw(part) for part in chosen.values()),
+                psu.power_supplied))
+        return [violation for violation in found if violation is not None]
+
+    # Choose the part for a slot, a list of RAM sticks for "rams", or None
+    # to leave an optional slot empty, replacing any earlier choice.
+    def choose(self, slot, choice):
+        if slot not in SLOTS:
+            raise functions.PartException(f"{slot} is not a slot of a "
+                                          f"build.\n")
+        if choice is None:
+            if slot not in OPTIONAL:
+                raise functions.PartException(f"A build needs a "
+                                              f"{SLOTS[slot]}.\n")
+        else:
+            parts = choice if slot == "rams" else [choice]
+            if not parts:
+                raise functions.PartException("A build needs RAM.\n")
+            for part in parts:
+                if part.type != SLOTS[slot]:
+                    raise functions.PartException(f"{part.id} is not a "
+                                                  f"{SLOTS[slot]}.\n")
+            violations = self.violations(slot, choice)
+            if violations:
+                raise functions.BuildException(violations)
+        self._undo.append(dict(self.choices))
+        self._redo.clear()
+        self.choices[slot] = list(choice) if slot == "rams" else choice
+
+    # Take back the last choice.
+    def undo(self):
+        if not self._undo:
+            raise functions.PartException("Nothing to undo.\n")
+        self._redo.append(self.choices)
+        self.choices = self._undo.pop()
+
+    # Make the last choice undone again.
+    def redo(self):
+        if not self._redo:
+            raise functions.PartException("Nothing to redo.\n")
+        self._undo.append(self.choices)
+        self.choices = self._redo.pop()
+
+    # Build the computer from the chosen parts and add it to a customer's
+    # cart, as functions.build does, and return it.
+    def build(self, customer, stock = None, cache = None):
+        missing = [part_type for slot, part_type in SLOTS.items()
+                   if slot not in self.choices and slot not in OPTIONAL]
+        if missing:
+            listed = ", a ".join(missing)
+            raise functions.PartException(f"Choose a {listed} first.\n")
+        choices = self.choices
+        return functions.build(customer, self.computer_id,
+                               choices["motherboard"], choices["rams"],
+                               choices["cpu"], choices["psu"],
+                               choices["storage"], choices.get("storage2"),
+                               choices.get("gpu"), stock, cache)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Validates many computer builds at once without touching any cart.
+
+A build is given as a sequence of part IDs in any order, such as a saved
+quote: one motherboard, CPU and PSU, one or two storage drives, any number
+of RAM sticks and an optional GPU. Each distinct part ID is looked up once
+per call, and the totals and rule checks of every build are then computed
+together, with NumPy when it is installed and plain Python otherwise. The
+verdicts come back as columns, a value per build, with violations kept only
+for the builds that fail.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import NamedTuple, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import money
+import objects
+import rules
+
+# Type codes of the parts in a build; any other type is counted as OTHER.
+TYPES = ("Motherboard", "CPU", "RAM", "PSU", "Storage", "GPU")
+MOTHERBOARD, CPU, RAM, PSU, STORAGE, GPU = range(len(TYPES))
+OTHER = len(TYPES)
+_TYPE_CODES = {part_type: code for code, part_type in enumerate(TYPES)}
+
+# Builds per worker task when a process pool is used.
+CHUNK_SIZE = 50_000
+
+class BuildVerdict(NamedTuple):
+    """Whether a build is compatible, its price in cents and power draw, and
+    every violation."""
+    ok: bool
+    price: int
+    power_draw: int
+    violations: Tuple = ()
+
+    def to_dict(self):
+        return {"ok": self.ok, "price": money.to_dollars(self.price),
+                "power_draw": self.power_draw,
+                "violations": [violation.to_dict()
+                               for violation in self.violations]}
+
+class BuildVerdicts:
+    """The verdicts of many builds, in columns.
+
+    ok, price and power_draw hold one value per build, in order: NumPy
+    arrays when the builds were checked with NumPy, lists otherwise.
+    violations maps the position of each build that fails to its
+    violations, so builds that pass cost no object of their own. Indexing
+    or iterating gives a BuildVerdict per build.
+    """
+    def __init__(self, ok, price, power_draw, violations):
+        self.ok = ok
+        self.price = price
+        self.power_draw = power_draw
+        self.violations = violations
+
+    def __len__(self):
+        return len(self.ok)
+
+    def __getitem__(self, position):
+        return BuildVerdict(bool(self.ok[position]), int(self.price[position]),
+                            int(self.power_draw[position]),
+                            self.violations.get(position, ()))
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+    def to_dicts(self):
+        return [verdict.to_dict() for verdict in self]
+
+# Return the verdicts of consecutive chunks of builds as one BuildVerdicts.
+def _concatenate(chunks):
+    if np is not None and isinstance(chunks[0].ok, np.ndarray):
+        join = np.concatenate
+    else:
+        join = _join_lists
+    violations = {}
+    offset = 0
+    for chunk in chunks:
+        violations.update((offset + position, found)
+                          for position, found in chunk.violations.items())
+        offset += len(chunk)
+    return BuildVerdicts(join([chunk.ok for chunk in chunks]),
+                         join([chunk.price for chunk in chunks]),
+                         join([chunk.power_draw for chunk in chunks]),
+                         violations)
+
+# Return lists joined end to end.
+def _join_lists(columns):
+    return list(chain.from_iterable(columns))
+
+class _Table(dict):
+    """Part ID -> row of the lookup table of a call, or None for an unknown
+    ID. A part is looked up in the inventory, if one is given, the first
+    time its ID is seen."""
+    def __init__(self, rows = (), inventory = None):
+        super().__init__(rows)
+        self.inventory = inventory
+
+    def __missing__(self, part_id):
+        part = (None if self.inventory is None else
+                self.inventory.get(part_id))
+        row = self[part_id] = None if part is None else _row(part)
+        return row
+
+class _Positions(dict):
+    """Part ID -> position of its row in rows, the known parts of a table
+    in the order first seen, or -1 for an unknown ID."""
+    def __init__(self, table):
+        super().__init__()
+        self.table = table
+        self.rows = []
+
+    def __missing__(self, part_id):
+        row = self.table[part_id]
+        position = -1
+        if row is not None:
+            position = len(self.rows)
+            self.rows.append(row)
+        self[part_id] = position
+        return position
+
+# Return the row of a part in the lookup table of a call: type code, price,
+# power draw, power supplied, RAM slots and socket.
+def _row(part):
+    return (_TYPE_CODES.get(part.type, OTHER), part.price,
+            getattr(part, "power_draw", 0), getattr(part, "power_supplied", 0),
+            getattr(part, "ram_slots", 0), getattr(part, "socket", None))
+
+# Return the violations of a build with unknown part IDs or the wrong
+# number of parts of some type, or an empty tuple if it has neither.
+def _part_violations(unknown, counts):
+    violations = [rules.Violation("parts", f"{part_id} is not a valid part "
+                                           "ID.")
+                  for part_id in unknown]
+    if (counts[MOTHERBOARD] != 1 or counts[CPU] != 1 or counts[PSU] != 1 or
+            not 1 <= counts[STORAGE] <= 2 or counts[GPU] > 1):
+        violations.append(rules.Violation(
+            "parts", "A build needs one motherboard, one CPU, one PSU, one or "
+                     "two storage drives and at most one GPU."))
+    return tuple(violations)
+
+# Return the violations of the built-in rules by a build's values.
+def _rule_violations(motherboard_socket, cpu_socket, ram_ids, ram_count,
+                     slots, power_draw, supplied):
+    violations = (rules.socket_violation(motherboard_socket, cpu_socket),
+                  rules.ram_id_violation(ram_ids),
+                  rules.ram_slots_violation(ram_count, slots),
+                  rules.power_violation(power_draw, supplied))
+    return tuple(violation for violation in violations
+                 if violation is not None)
+
+# Validate builds one at a time against the lookup table.
+def _validate_python(table, builds):
+    oks = []
+    prices = []
+    draws = []
+    failures = {}
+    for build in builds:
+        counts = [0] * (OTHER + 1)
+        price = power_draw = 0
+        unknown = []
+        ram_ids = set()
+        motherboard = cpu = psu = None
+        for part_id in build:
+            row = table[part_id]
+            if row is None:
+                unknown.append(part_id)
+                continue
+            code = row[0]
+            counts[code] += 1
+            price += row[1]
+            power_draw += row[2]
+            if code == MOTHERBOARD:
+                motherboard = row
+            elif code == CPU:
+                cpu = row
+            elif code == PSU:
+                psu = row
+            elif code == RAM:
+                ram_ids.add(part_id)
+        violations = _part_violations(unknown, counts)
+        if not violations and (
+                motherboard[5] != cpu[5] or 1 < len(ram_ids) or
+                not 0 < counts[RAM] <= motherboard[4] or
+                power_draw > psu[3]):
+            violations = _rule_violations(motherboard[5], cpu[5],
+                                          len(ram_ids), counts[RAM],
+                                          motherboard[4], power_draw, psu[3])
+        if violations:
+            failures[len(oks)] = violations
+        oks.append(not violations)
+        prices.append(price)
+        draws.append(power_draw)
+    return BuildVerdicts(oks, prices, draws, failures)
+
+# Validate builds together with NumPy arrays against the lookup table.
+def _validate_numpy(table, builds):
+    n = len(builds)
+    # One element per part of every build; unknown IDs point at the last
+    # row, which is added after every part is looked up.
+    positions = _Positions(table)
+    lengths = np.fromiter(map(len, builds), np.int64, n)
+    parts = np.fromiter(map(positions.__getitem__, chain.from_iterable(builds)),
+                        np.int64, int(lengths.sum()))
+    rows = positions.rows
+    sockets = {}
+    codes = np.array([row[0] for row in rows] + [OTHER], dtype = np.int64)
+    prices = np.array([row[1] for row in rows] + [0])
+    draws = np.array([row[2] for row in rows] + [0])
+    supplied = np.array([row[3] for row in rows] + [0])
+    slots = np.array([row[4] for row in rows] + [0])
+    socket_codes = np.array([sockets.setdefault(row[5], len(sockets))
+                             for row in rows] + [-1], dtype = np.int64)
+
+    owners = np.repeat(np.arange(n), lengths)
+    known = parts >= 0
+    types = codes[parts]
+
+    counts = np.bincount(owners * (OTHER + 1) + types,
+                         minlength = n * (OTHER + 1)).reshape(n, OTHER + 1)
+    unknown = np.bincount(owners[~known], minlength = n)
+    firsts = np.cumsum(lengths) - lengths
+    price = _sum_by_build(prices[parts], firsts, lengths)
+    power_draw = _sum_by_build(draws[parts], firsts, lengths)
+
+    # The motherboard, CPU and PSU values of each build; builds without
+    # exactly one of each are reported as part violations instead.
+    def values_of(code, *columns):
+        chosen = types == code
+        at = owners[chosen]
+        rows = parts[chosen]
+        found = []
+        for column in columns:
+            values = np.zeros(n, dtype = column.dtype)
+            values[at] = column[rows]
+            found.append(values)
+        return found
+
+    motherboard_socket, ram_slots = values_of(MOTHERBOARD, socket_codes,
+                                              slots)
+    cpu_socket, = values_of(CPU, socket_codes)
+    psu_supplied, = values_of(PSU, supplied)
+    ram_count = counts[:, RAM]
+
+    # A build mixes RAM IDs if any stick differs from its first one. Parts
+    # are grouped by build, so the first stick is where the owner changes.
+    chosen = types == RAM
+    ram_owners = owners[chosen]
+    ram_parts = parts[chosen]
+    starts = np.flatnonzero(np.diff(ram_owners, prepend = -1))
+    first_ram = np.zeros(n, dtype = np.int64)
+    first_ram[ram_owners[starts]] = ram_parts[starts]
+    mixed_ram = np.zeros(n, dtype = bool)
+    mixed_ram[ram_owners[ram_parts != first_ram[ram_owners]]] = True
+
+    parts_ok = ((unknown == 0) & (counts[:, MOTHERBOARD] == 1) &
+                (counts[:, CPU] == 1) & (counts[:, PSU] == 1) &
+                (counts[:, STORAGE] >= 1) & (counts[:, STORAGE] <= 2) &
+                (counts[:, GPU] <= 1))
+    ok = parts_ok & ((motherboard_socket == cpu_socket) & ~mixed_ram &
+                     (ram_count > 0) & (ram_count <= ram_slots) &
+                     (power_draw <= psu_supplied))
+
+    verdicts = BuildVerdicts(ok, price, power_draw, {})
+    if ok.all():
+        return verdicts
+
+    # Describe the failures rule by rule, in rule order, gathering the
+    # values of the builds that break each rule at once. The RAM IDs of a
+    # build are counted only if it mixes them.
+    violations = verdicts.violations
+    for position in np.flatnonzero(~parts_ok).tolist():
+        violations[position] = _part_violations(
+            [part_id for part_id in builds[position]
+             if table[part_id] is None],
+            counts[position].tolist())
+    mixed = mixed_ram[ram_owners]
+    distinct = np.unique(ram_owners[mixed] * len(codes) + ram_parts[mixed])
+    ram_ids = np.bincount(distinct // len(codes), minlength = n)
+    checks = (
+        (motherboard_socket != cpu_socket, rules.socket_violation,
+         (motherboard_socket, cpu_socket)),
+        (mixed_ram, rules.ram_id_violation, (ram_ids,)),
+        ((ram_count == 0) | (ram_count > ram_slots),
+         rules.ram_slots_violation, (ram_count, ram_slots)),
+        (power_draw > psu_supplied, rules.power_violation,
+         (power_draw, psu_supplied)))
+    for broken, violation, columns in checks:
+        at = np.flatnonzero(broken & parts_ok)
+        described = map(violation, *(column[at].tolist()
+                                     for column in columns))
+        for position, found in zip(at.tolist(), described):
+            violations[position] = violations.get(position, ()) + (found,)
+    return verdicts
+
+# Return the sum of per-part values over each build, given the position of
+# each build's first part and its number of parts.
+def _sum_by_build(values, firsts, lengths):
+    # reduceat sums up to the next build's first part; a build with no
+    # parts gets the value at its position, and is set to 0.
+    sums = np.add.reduceat(np.append(values, 0), firsts)
+    sums[lengths == 0] = 0
+    return sums
+
+# Validate a list of builds against the lookup table, with NumPy if asked
+# and installed.
+def _validate_chunk(table, builds, use_numpy = True):
+    if use_numpy and np is not None and builds:
+        return _validate_numpy(table, builds)
+    return _validate_python(table, builds)
+
+# Build the computer a valid build describes, for rules that need one.
+def _computer(inventory, build):
+    parts = {part_type: [] for part_type in TYPES}
+    for part_id in build:
+        part = inventory[part_id]
+        parts.setdefault(part.type, []).append(part)
+    storages = parts["Storage"]
+    return objects.Computer("", parts["Motherboard"][0], parts["RAM"],
+                            parts["CPU"][0], parts["PSU"][0], storages[0],
+                            storages[1] if len(storages) > 1 else None,
+                            parts["GPU"][0] if parts["GPU"] else None)
+
+# Check every build, given as a list or tuple of part IDs, against the
+# inventory and return their BuildVerdicts, in order. Nothing is printed
+# and no cart changes. Builds are split over a pool of that many processes
+# if processes is more than 1 and there are enough of them; use_numpy turns
+# the NumPy path off. Rules registered beyond the built-in ones are checked
+# on a Computer of each build that has the right parts.
+def validate_builds(inventory, builds, processes = None, use_numpy = True):
+    builds = list(builds)
+
+    if processes is not None and 1 < processes and CHUNK_SIZE < len(builds):
+        # Workers get every row they need up front, not the inventory.
+        table = _Table((part_id, _row(inventory[part_id]))
+                       for part_id in set().union(*builds)
+                       if part_id in inventory)
+        chunks = [builds[start:start + CHUNK_SIZE]
+                  for start in range(0, len(builds), CHUNK_SIZE)]
+        with ProcessPoolExecutor(processes) as pool:
+            verdicts = _concatenate(list(pool.map(
+                _validate_chunk, [table] * len(chunks), chunks,
+                [use_numpy] * len(chunks))))
+    else:
+        verdicts = _validate_chunk(_Table(inventory = inventory), builds,
+                                   use_numpy)
+
+    extra = [rule for rule in rules.RULES.values()
+             if rule.id not in rules.BUILT_IN]
+    if extra:
+        for position, build in enumerate(builds):
+            found = verdicts.violations.get(position, ())
+            if any(violation.rule == "parts" for violation in found):
+                continue
+            violations = rules.validate(_computer(inventory, build), extra)
+            if violations:
+                verdicts.ok[position] = False
+                verdicts.violations[position] = found + tuple(violations)
+    return verdicts
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Defines the storefront commands as request handlers, for driving the store
+without the interactive prompts of storefront.py.
+"""
+
+from collections import OrderedDict
+import contextlib
+import threading
+import time
+
+from buildcache import BuildCache
+import bulk
+import functions
+import journal
+import money
+import objects
+import render
+import solver
+from index import InventoryIndex
+from matrix import CompatibilityMatrix
+from search import SearchIndex
+
+class Store:
+    """A loaded inventory with its derived structures and customer sessions.
+
+    If a stock.StockLedger is given, parts are reserved as they enter carts
+    and sold at checkout. A search.SearchIndex already filled while loading
+    can be given; otherwise the inventory is indexed on the first search.
+    Commands hold the lock shared and their session's lock, so commands of
+    different sessions run at once, meeting only on the stock of the parts
+    they share; changes to the inventory hold the lock exclusive, so they
+    are never seen half applied. If a metrics.Metrics is given,
+    each command is timed and the build cache is reported. If a
+    journal.Journal is given as log, changes to carts and budgets and every
+    order are logged to it, and it is kept as journal; restore it into the
+    store before running commands.
+    If a promotions.Promotions is given, carts take its discounts. With a
+    session_ttl, sessions idle for longer than that many seconds, by clock,
+    are dropped and the stock their carts hold is released.
+    """
+    def __init__(self, inventory, stock = None, matrix = True,
+                 build_cache_size = 1024, search = None, metrics = None,
+                 log = None, promotions = None, session_ttl = None,
+                 clock = time.monotonic):
+        self.inventory = inventory
+        self.stock = stock
+        self.promotions = promotions
+        self.index = InventoryIndex(inventory)
+        if search is None:
+            search = SearchIndex()
+            search.defer(inventory)
+        self.search = search
+        self._catalog = None
+        # The matrix is built on first use, and can be skipped.
+        self.use_matrix = matrix
+        self._matrix = None
+        # Results of builds and compatibility checks by their parts.
+        self.build_cache = BuildCache(build_cache_size)
+        self.metrics = metrics
+        self.journal = log
+        if metrics is not None:
+            metrics.watch_cache("build", self.build_cache.stats)
+        # Customer ID -> Session, least recently used first.
+        self.sessions = OrderedDict()
+        self.session_ttl = session_ttl
+        self._clock = clock
+        # Part ID -> carts holding it, shared by every session's cart.
+        self.holders = {}
+        self.lock = SharedLock()
+        # Guards the sessions dict, and the catalog and matrix as they are
+        # built.
+        self._sessions_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    # The catalog for recommendations, built on first use and rebuilt on
+    # first use after a change.
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            with self._build_lock:
+                if self._catalog is None:
+                    self._catalog = solver.Catalog(self.inventory,
+                                                   self.index)
+        return self._catalog
+
+    # The compatibility matrix, or None if it is skipped, built on first use
+    # and rebuilt on first use after a change to the parts it covers.
+    @property
+    def matrix(self):
+        if self._matrix is None and self.use_matrix:
+            with self._build_lock:
+                if self._matrix is None:
+                    self._matrix = CompatibilityMatrix(self.inventory)
+        return self._matrix
+
+    # Update the catalog and the matrix, where they are built, after parts
+    # changed in the index. changed holds (old part, new part) pairs, with
+    # None for a part added or removed.
+    def refresh(self, changed):
+        if self._catalog is not None:
+            self._catalog.refresh({(part.type, getattr(part, "socket", None))
+                                   for pair in changed for part in pair
+                                   if part is not None})
+        if self._matrix is not None:
+            for old, new in changed:
+                self._matrix.update(old, new)
+
+    # Return the session of a customer, creating it on first use, and mark
+    # it used now.
+    def session(self, customer_id, budget = 0):
+        with self._sessions_lock:
+            session = self.sessions.get(customer_id)
+            if session is None:
+                session = self.sessions[customer_id] = Session(
+                    customer_id, budget, self.holders, self.promotions)
+            else:
+                self.sessions.move_to_end(customer_id)
+            session.last_used = self._clock()
+        return session
+
+    # Drop a customer's session and release the stock its cart holds.
+    def drop_session(self, customer_id):
+        with self._sessions_lock:
+            self._drop_session(customer_id)
+
+    def _drop_session(self, customer_id):
+        cart = self.sessions.pop(customer_id).customer.cart
+        if self.stock is not None:
+            for reservation in cart.reservations():
+                self.stock.release(reservation)
+        cart.clear()
+
+    # Drop the sessions idle for longer than session_ttl, oldest first,
+    # logging each to the journal, and return their customer IDs. A session
+    # running a command is left for the next check.
+    def expire_sessions(self):
+        expired = []
+        if self.session_ttl is None:
+            return expired
+        with self._sessions_lock:
+            cutoff = self._clock() - self.session_ttl
+            for customer_id, session in list(self.sessions.items()):
+                if session.last_used > cutoff:
+                    break
+                if not session.lock.acquire(blocking = False):
+                    continue
+                try:
+                    self._drop_session(customer_id)
+                finally:
+                    session.lock.release()
+                if self.journal is not None:
+                    self.journal.append({"customer": customer_id,
+                                         "op": "expire"})
+                expired.append(customer_id)
+        return expired
+
+class SharedLock:
+    """A lock held shared by any number of threads at once, or exclusive by
+    one.
+
+    A thread waiting to hold it exclusive keeps new shared holders out, so a
+    steady stream of commands cannot hold off an inventory reload.
+    """
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    # Hold the lock shared for the body of a with statement.
+    @contextlib.contextmanager
+    def shared(self):
+        with self._condition:
+            while self._exclusive or self._waiting:
+                self._condition.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                if not self._shared:
+                    self._condition.notify_all()
+
+    # Hold the lock exclusive for the body of a with statement.
+    @contextlib.contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._waiting += 1
+            while self._exclusive or self._shared:
+                self._condition.wait()
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+class Session:
+    """A customer and the computers they have built."""
+    def __init__(self, name, budget = 0, holders = None, promotions = None):
+        self.customer = objects.Customer(name, budget,
+                                         objects.Cart(holders, promotions))
+        self.computers = {}
+        self.last_computer = None
+        # When the session was last used, by the store's clock.
+        self.last_used = None
+        # Held while a command runs for the session.
+        self.lock = threading.Lock()
+
+# Return an argument of a request, raising if a required one is missing.
+def _argument(args, name, default = None, required = True):
+    if name in args:
+        return args[name]
+    if required:
+        raise functions.PartException(f"Missing argument {name!r}.")
+    return default
+
+# Log an event of a customer's session to the store's journal, if it keeps
+# one.
+def _record(store, session, event, sync = False):
+    if store.journal is not None:
+        store.journal.append({"customer": session.customer.name, **event},
+                             sync)
+
+# Take a snapshot of the sessions when one is due, writing it in the
+# background. The store's lock is held exclusive while the sessions are
+# copied, so no command is halfway through changing them.
+def _checkpoint(store):
+    if store.journal is None or not store.journal.due():
+        return
+    with store.lock.exclusive():
+        if store.journal.due():
+            store.journal.checkpoint(journal.sessions_state(store),
+                                     background = True)
+
+# Return a summary of a customer's cart, with money in dollars.
+def _cart(customer):
+    return {"parts": dict(customer.cart.counts),
+            "computers": list(customer.cart.computers),
+            "count": customer.cart.count,
+            "discount": money.to_dollars(customer.cart.discount),
+            "total": money.to_dollars(customer.total),
+            "power_draw": customer.cart.power_draw,
+            "budget": money.to_dollars(customer.budget)}
+
+def _help(store, session, args):
+    return None, render.commands(functions.list_commands())
+
+def _list(store, session, args):
+    category = _argument(args, "category", "", required = False)
+    if category not in ["", "CPU", "GPU", "RAM", "PSU", "Motherboard",
+                        "Storage"]:
+        raise functions.PartException(f"{category} is not a valid category.")
+    parts = functions.list_parts(store.inventory, category, store.index)
+    return {"parts": [part.id for part in parts]}, render.parts(parts)
+
+def _details(store, session, args):
+    part_id = str(_argument(args, "part_id")).upper()
+    return {"part_id": part_id}, render.part(functions.details(
+        store.inventory, session.computers.get(part_id, part_id)))
+
+def _compatibility(store, session, args):
+    verdict = functions.compatibility(
+        store.inventory, str(_argument(args, "part_id1")).upper(),
+        str(_argument(args, "part_id2")).upper(), store.matrix)
+    return ({"compatible": verdict.compatible,
+             "violations": [violation.to_dict()
+                            for violation in verdict.violations]},
+            render.compatibility(verdict))
+
+def _build(store, session, args):
+    computer_id = str(_argument(args, "computer_id")).upper()
+    rams = _argument(args, "rams")
+    if isinstance(rams, str):
+        rams = rams.split()
+    if not isinstance(rams, list):
+        raise functions.PartException("rams must be a list of RAM IDs.")
+    rams = functions.validate_parts(store.index, rams, "RAM")
+
+    # Return the part of a type named by an argument, or None if an optional
+    # one is missing or empty.
+    def part(name, part_type, required = True):
+        part_id = _argument(args, name, required = required)
+        if not part_id and not required:
+            return None
+        return functions.validate_part(store.index, part_id, part_type)
+
+    computer = functions.build(
+        session.customer, computer_id, part("motherboard", "Motherboard"),
+        rams, part("cpu", "CPU"), part("psu", "PSU"),
+        part("storage", "Storage"), part("storage2", "Storage", False),
+        part("gpu", "GPU", False), store.stock, store.build_cache)
+    session.computers[computer.id] = computer
+    session.last_computer = computer
+    _record(store, session, {"op": "build",
+                             "computer": journal.computer_state(computer)})
+    return ({"computer_id": computer.id,
+             "price": money.to_dollars(computer.price),
+             "power_draw": computer.power_draw,
+             "total": money.to_dollars(session.customer.total)},
+            render.compatible_build(computer))
+
+def _remove(store, session, args):
+    items = []
+    ids = _argument(args, "items")
+    if isinstance(ids, str):
+        ids = ids.split()
+    for item in ids:
+        item = str(item).upper()
+        items.append(session.computers.get(item, item))
+    if not items:
+        raise functions.PartException("No items to remove.")
+    item, *rest = items
+    removed = functions.remove(session.customer, store.inventory, item,
+                               *rest, stock = store.stock)
+    _record(store, session, {"op": "remove", "items": removed})
+    return _cart(session.customer), render.removed(removed)
+
+def _compatibility_build(store, session, args):
+    computer_id = _argument(args, "computer_id", required = False)
+    if computer_id is None:
+        computer = session.last_computer
+    else:
+        computer = session.computers.get(str(computer_id).upper())
+    if computer is None:
+        raise functions.PartException("Build a computer first.")
+    verdict = functions.compatibility_build(computer, store.build_cache)
+    return ({"compatible": verdict.compatible},
+            render.compatible_build(computer))
+
+def _budget(store, session, args):
+    try:
+        session.customer.set_budget(money.to_cents(_argument(args, "amount"),
+                                                   positive = True))
+    except ValueError as exc:
+        raise functions.PartException(f"Budget must be a number of dollars, "
+                                      f"to the cent: {exc}.") from exc
+    _record(store, session, {"op": "budget",
+                             "amount": session.customer.budget})
+    return {"budget": money.to_dollars(session.customer.budget)}, ""
+
+def _purchase(store, session, args):
+    part_ids = _argument(args, "part_ids", required = False)
+    if part_ids is None:
+        added = functions.purchase(
+            session.customer, store.inventory,
+            str(_argument(args, "part_id")).upper(), store.stock,
+            _argument(args, "quantity", 1, required = False))
+    else:
+        if isinstance(part_ids, str):
+            part_ids = part_ids.split()
+        if isinstance(part_ids, dict):
+            part_ids = {str(part_id).upper(): quantity
+                        for part_id, quantity in part_ids.items()}
+        else:
+            part_ids = [str(part_id).upper() for part_id in part_ids]
+        added = functions.purchase_many(session.customer, store.inventory,
+                                        part_ids, store.stock)
+    _record(store, session, {"op": "add", "parts": added})
+    return _cart(session.customer), render.added(added)
+
+def _cart_command(store, session, args):
+    return _cart(session.customer), render.cart(session.customer)
+
+def _checkout(store, session, args):
+    ordered = _cart(session.customer)
+    sold = (journal.parts_sold(session.customer.cart)
+            if store.journal is not None else None)
+    receipt = functions.checkout(session.customer, store.stock)
+    # The order is on disk before the customer is told it went through.
+    _record(store, session, {"op": "order", "lines": [
+        [item.id, units] for item, units in receipt.lines],
+        "total": receipt.total, "budget": receipt.budget, "sold": sold},
+        sync = True)
+    return ({"ordered": {"parts": ordered["parts"],
+                         "computers": ordered["computers"]},
+             "discount": money.to_dollars(receipt.discount),
+             "total": money.to_dollars(receipt.total),
+             "budget": money.to_dollars(receipt.budget)},
+            render.receipt(receipt))
+
+def _search(store, session, args):
+    try:
+        page = int(_argument(args, "page", 1, required = False))
+        per_page = int(_argument(args, "per_page", 10, required = False))
+    except (TypeError, ValueError) as exc:
+        raise functions.PartException("Page and results per page must be "
+                                      "whole numbers.") from exc
+    results = functions.search(store.search,
+                               str(_argument(args, "query")),
+                               _argument(args, "category", "",
+                                         required = False), page, per_page)
+    return ({"parts": [part.id for part in results.parts],
+             "page": results.page, "more": results.more},
+            render.search_results(results))
+
+def _recommend(store, session, args):
+    objective = _argument(args, "objective", "ram", required = False)
+    builds = functions.recommend(session.customer, store.inventory,
+                                 objective,
+                                 int(_argument(args, "count", 5,
+                                               required = False)),
+                                 store.catalog)
+    return ({"builds": [{"parts": build.part_ids(),
+                         "price": money.to_dollars(build.price),
+                         "power_draw": build.power_draw}
+                        for build in builds]},
+            render.recommendations(
+                builds, solver.OBJECTIVES[objective].description,
+                session.customer.budget))
+
+def _validate(store, session, args):
+    builds = _argument(args, "builds")
+    if not isinstance(builds, list):
+        raise functions.PartException("builds must be a list of builds.")
+    builds = [build.split() if isinstance(build, str) else build
+              for build in builds]
+    if not all(isinstance(build, list) for build in builds):
+        raise functions.PartException("Each build must be a list of part "
+                                      "IDs.")
+    verdicts = bulk.validate_builds(store.inventory,
+                                    [[str(part_id).upper() for part_id in build]
+                                     for build in builds])
+    return {"builds": verdicts.to_dicts()}, ""
+
+def _metrics(store, session, args):
+    if store.metrics is None:
+        raise functions.PartException("Metrics are off; start with "
+                                      "--profile to record them.")
+    fmt = _argument(args, "format", "json", required = False)
+    if fmt == "json":
+        return store.metrics.snapshot(), ""
+    return store.metrics.render(fmt), ""
+
+# Maps each command name to its handler, which returns its structured
+# result and the text it shows.
+COMMANDS = {"help": _help,
+            "list": _list,
+            "details": _details,
+            "compatibility": _compatibility,
+            "build": _build,
+            "remove": _remove,
+            "compatibility-build": _compatibility_build,
+            "budget": _budget,
+            "purchase": _purchase,
+            "cart": _cart_command,
+            "checkout": _checkout,
+            "recommend": _recommend,
+            "search": _search,
+            "validate": _validate,
+            "metrics": _metrics}
+
+# Run one command for a customer and return a result dictionary with
+# whether it succeeded, its structured result or error, and the text it
+# shows. With metrics on, each known command is timed.
+def execute(store, customer_id, command, args = None):
+    if store.metrics is None or command not in COMMANDS:
+        return _execute(store, customer_id, command, args)
+    result = store.metrics.run_command(command, _execute, store, customer_id,
+                                       command, args)
+    if not result["ok"]:
+        store.metrics.error(command)
+    return result
+
+def _execute(store, customer_id, command, args):
+    result = {"customer": customer_id, "command": command}
+    handler = COMMANDS.get(command)
+    output = ""
+    try:
+        if handler is None:
+            raise functions.PartException(f"{command} is not a valid "
+                                          "command.")
+        with store.lock.shared():
+            store.expire_sessions()
+            session = store.session(customer_id)
+            with session.lock:
+                result["result"], output = handler(store, session,
+                                                   args or {})
+    except (functions.PartException, ValueError, TypeError) as exc:
+        result["ok"] = False
+        result["error"] = (exc.value.strip()
+                           if isinstance(exc, functions.PartException)
+                           else str(exc))
+        if isinstance(exc, functions.BuildException):
+            result["violations"] = [violation.to_dict()
+                                    for violation in exc.violations]
+    else:
+        result["ok"] = True
+    result["output"] = output
+    _checkpoint(store)
+    return result
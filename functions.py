@@ -3,10 +3,17 @@
 Defines functions for storefront.py.
 """
 
+from collections import Counter
 import json
-from typing import List
+import re
+import time
+from typing import List, NamedTuple
 
+from buildcache import BuildResult, build_key
+import money
 import objects
+import rules
+import solver
 
 # User-defined Exception for invalid parts.
 class PartException(Exception):
@@ -16,109 +23,242 @@ class PartException(Exception):
     def __str__(self):
         return repr(self.value)
 
-# Takes json file as input and creates an object for each component.
-# Returns a dictionary that maps the part ID to the part's object.
-def create_inventory(json_file):
+# Raised for an incompatible build, with every rules.Violation it has.
+class BuildException(PartException):
+    def __init__(self, violations):
+        super().__init__("\n".join(violation.message
+                                   for violation in violations))
+        self.violations = list(violations)
+
+class Receipt(NamedTuple):
+    """The lines of a submitted order as (item, units), its total, the
+    budget left and what promotions took off, in cents."""
+    lines: List
+    total: int
+    budget: int
+    discount: int = 0
+
+# Maps each part type to its constructor and the fields passed to it after
+# the common id, type, name and price.
+PART_SCHEMAS = {
+    "CPU": (objects.CPU, ("power_draw", "socket")),
+    "GPU": (objects.GPU, ("power_draw", "overclockable")),
+    "RAM": (objects.RAM, ("power_draw", "capacity")),
+    "PSU": (objects.PSU, ("power_supplied",)),
+    "Motherboard": (objects.Motherboard, ("power_draw", "socket",
+                                          "ram_slots")),
+    "Storage": (objects.Storage, ("capacity",)),
+}
+
+# Register a new part type so the loader can construct it.
+def register_part_type(part_type, constructor, fields):
+    PART_SCHEMAS[part_type] = (constructor, tuple(fields))
+
+# Most units of one part a single entry such as RAM_03x4 can stand for.
+MAX_UNITS = 64
+_UNITS = re.compile(r"(.+)X(\d+)")
+
+# Number of characters read from the inventory file at a time.
+READ_SIZE = 1 << 16
+_INVENTORY_KEY = re.compile(r'"inventory"\s*:\s*\[')
+_SEPARATORS = re.compile(r"[\s,]*")
+
+# Yield each entry of the "inventory" array in a json file one at a time,
+# without loading the whole document into memory.
+def iter_inventory_entries(json_file, read_size = READ_SIZE):
+    decoder = json.JSONDecoder()
+    try:
+        file = open(json_file, encoding = "utf-8")
+    except (FileNotFoundError, IsADirectoryError, PermissionError) as exc:
+        raise PartException(f"Cannot open inventory file {json_file}: "
+                            f"{exc.strerror}.") from exc
+
+    with file:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        # Read more of the file into the buffer, dropping what was consumed.
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = file.read(read_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        # Find the opening bracket of the inventory array.
+        while True:
+            match = _INVENTORY_KEY.search(buffer)
+            if match:
+                pos = match.end()
+                break
+            if eof:
+                raise PartException(f"{json_file} has no inventory list.")
+            # Keep a tail in case the key is split across two reads.
+            buffer = buffer[-64:]
+            fill()
+
+        while True:
+            # Skip whitespace and separators between entries.
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    raise PartException(f"{json_file} ended before the "
+                                        "inventory list was closed.")
+                fill()
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                entry, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                if eof:
+                    raise PartException(f"Invalid json in {json_file}: "
+                                        f"{exc.msg}.") from exc
+                # The entry is split across reads, so read more and retry.
+                fill()
+                continue
+            pos = end
+            yield entry
+
+# Yield the item of each entry of the "inventory" array in a json file, as
+# iter_inventory_entries reads them, raising on an entry that is not an
+# object holding an "item" object with an "id".
+def iter_inventory_items(json_file):
+    for number, entry in enumerate(iter_inventory_entries(json_file), 1):
+        item = entry.get("item") if isinstance(entry, dict) else None
+        if not isinstance(item, dict) or "id" not in item:
+            raise PartException(f"Inventory entry {number} is not an "
+                                f"object holding an item with an ID: "
+                                f"{entry!r:.80}.")
+        yield item
+
+# Look up the PART_SCHEMAS entry for an inventory item.
+def part_schema(item):
     try:
-        with open(json_file, encoding = "utf-8") as file:
-            dic = json.load(file)["inventory"]
-    except TypeError as exc:
-        print(f"Problem - {exc}")
-        print(f'{type(exc) = }')
-
-    inventory = {}
-    for entry in dic:
-        item = entry["item"]
-        if "CPU" == item["type"]:
-            inventory[item["id"]] = objects.CPU(item["id"],
-                                                item["type"],
-                                                item["name"],
-                                                item["price"],
-                                                item["power_draw"],
-                                                item["socket"])
-        elif "GPU" == item["type"]:
-            inventory[item["id"]] = objects.GPU(item["id"],
-                                                item["type"],
-                                                item["name"],
-                                                item["price"],
-                                                item["power_draw"],
-                                                item["overclockable"])
-        elif "RAM" == item["type"]:
-            inventory[item["id"]] = objects.RAM(item["id"],
-                                                item["type"],
-                                                item["name"],
-                                                item["price"],
-                                                item["power_draw"],
-                                                item["capacity"])
-        elif "PSU" == item["type"]:
-            inventory[item["id"]] = objects.PSU(item["id"],
-                                                item["type"],
-                                                item["name"],
-                                                item["price"],
-                                                item["power_supplied"])
-        elif "Motherboard" == item["type"]:
-            inventory[item["id"]] = objects.Motherboard(item["id"],
-                                                item["type"],
-                                                item["name"],
-                                                item["price"],
-                                                item["power_draw"],
-                                                item["socket"],
-                                                item["ram_slots"])
-
-        elif "Storage" == item["type"]:
-            inventory[item["id"]] = objects.Storage(item["id"],
-                                                item["type"],
-                                                item["name"],
-                                                item["price"],
-                                                item["capacity"])
+        return PART_SCHEMAS[item["type"]]
+    except KeyError as exc:
+        raise PartException(f"Unknown part type {item.get('type')!r} for "
+                            f"part {item.get('id')!r}.") from exc
+
+# Return the price of an inventory item in cents.
+def part_price(item):
+    try:
+        return money.to_cents(item["price"])
+    except ValueError as exc:
+        raise PartException(f"Part {item.get('id')!r} has an invalid price: "
+                            f"{exc}.") from exc
+
+# Build the object for a single inventory item through PART_SCHEMAS. The
+# price of the item is in dollars, and the part's in cents.
+def create_part(item):
+    constructor, fields = part_schema(item)
+    try:
+        return constructor(item["id"], item["type"], item["name"],
+                           part_price(item),
+                           *(item[field] for field in fields))
+    except KeyError as exc:
+        raise PartException(f"Part {item.get('id')!r} is missing the "
+                            f"{exc.args[0]!r} field.") from exc
+
+# Takes json file as input and creates an object for each component.
+# Returns a dictionary that maps the part ID to the part's object, or an
+# objects.PartStore holding the parts in compact columns if compact is set.
+# Only the given categories are loaded if any are specified. If a stats
+# dictionary is passed, it is filled in with the number of parts loaded, the
+# time taken and the parse throughput. If a stock.StockLedger is passed, the
+# stock count of every part that has one is loaded into it. If a
+# search.SearchIndex is passed as search_index, every part loaded is
+# indexed in it.
+def create_inventory(json_file, categories = None, stats = None,
+                     compact = False, stock = None, search_index = None):
+    start = time.perf_counter()
+    if categories is not None:
+        categories = set(categories)
+        unknown = categories - PART_SCHEMAS.keys()
+        if unknown:
+            raise PartException(f"Unknown categories: "
+                                f"{', '.join(sorted(unknown))}.")
+
+    inventory = objects.PartStore() if compact else {}
+    parsed = 0
+    for item in iter_inventory_items(json_file):
+        parsed += 1
+        if categories is not None and item.get("type") not in categories:
+            # Unknown types are still rejected when filtering.
+            part_schema(item)
+            continue
+        part = create_part(item)
+        inventory[item["id"]] = part
+        if stock is not None and "stock" in item:
+            stock.set(item["id"], item["stock"])
+        if search_index is not None:
+            search_index.add(part)
+    if search_index is not None:
+        search_index.prepare()
+
+    if stats is not None:
+        seconds = time.perf_counter() - start
+        stats["parsed"] = parsed
+        stats["loaded"] = len(inventory)
+        stats["seconds"] = seconds
+        stats["parts_per_sec"] = parsed / seconds if seconds else 0.0
     return inventory
 
-#List all available commands and their function.
+# Return all available commands and their function, by command name.
 def list_commands():
-    commands = {"list": ("List available parts and all their attributes in the "
-                         "specified category."),
-                "details": "Show details for the specified part ID.",
-                "compatibility": ("Check compatibility between specified parts "
-                                  "given their IDs."),
-                "build": ("Build a custom computer with specified parts and "
-                          "add the computer to the shopping cart."),
-                "remove": ("Remove specified part or computer from current "
-                           "shopping cart."),
-                "compatibility-build": ("Check compatibility between all parts "
-                                        "in current build configuration."),
-                "budget": "Set the customer's budget.",
-                "purchase": "Add the specified part to shopping cart.",
-                "cart": "View the current shopping cart.",
-                "checkout": "Complete the purchase and checkout.",
-                "exit": "Exit the program or current command.\n"}
-    print("All available commands:")
-    for key, value in commands.items():
-        print(f"\t{key} - {value}")
-
-# List available parts and all their attributes in the specified category.
-def list_parts(inventory, category = ""):
-    if category == "":
-        for item in inventory.values():
-            print(f"{item.details()}")
-    elif category in ["CPU", "GPU", "RAM", "PSU", "Motherboard", "Storage"]:
-        for item in inventory.values():
-            if category == item.type:
-                print(f"{item.details()}")
+    return {"list": ("List available parts and all their attributes in the "
+                     "specified category."),
+            "details": "Show details for the specified part ID.",
+            "compatibility": ("Check compatibility between specified parts "
+                              "given their IDs."),
+            "build": ("Build a custom computer with specified parts and "
+                      "add the computer to the shopping cart."),
+            "remove": ("Remove specified part or computer from current "
+                       "shopping cart."),
+            "compatibility-build": ("Check compatibility between all parts "
+                                    "in current build configuration."),
+            "budget": "Set the customer's budget.",
+            "purchase": "Add the specified part(s) to shopping cart.",
+            "cart": "View the current shopping cart.",
+            "checkout": "Complete the purchase and checkout.",
+            "recommend": ("Show the best compatible builds within the "
+                          "budget."),
+            "search": ("Search part names and attributes, allowing "
+                       "prefixes and misspellings."),
+            "validate": ("Check many builds against the compatibility "
+                         "rules at once (batch and server mode)."),
+            "metrics": ("Show the recorded call counts and latencies "
+                        "(batch and server mode)."),
+            "exit": "Exit the program or current command.\n"}
 
+# Return the available parts in the specified category, or every part if
+# it is empty. An index.InventoryIndex, if given, avoids scanning the whole
+# inventory.
+def list_parts(inventory, category = "", index = None):
+    if category == "":
+        return list(inventory.values())
+    if category in ["CPU", "GPU", "RAM", "PSU", "Motherboard", "Storage"]:
+        if index is not None:
+            return list(index.parts(category))
+        return [item for item in inventory.values() if category == item.type]
+    return []
 
-# Show details for the specified part ID.
+# Return the specified part by ID, or the computer if one is passed.
 def details(inventory, part_id):
     if isinstance(part_id, objects.Computer):
-        print(f"{part_id.details()}")
-    elif part_id in inventory:
-        print(f"{inventory[part_id].details()}")
-    else:
-        raise PartException("Part not found.\n")
+        return part_id
+    if part_id in inventory:
+        return inventory[part_id]
+    raise PartException("Part not found.\n")
 
-# Check compatibility between specified parts given their IDs.
-def compatibility(inventory, part_id1, part_id2):
+# Check compatibility between specified parts given their IDs and return a
+# rules.Verdict. A matrix.CompatibilityMatrix, if given, answers CPU and
+# motherboard pairs.
+def compatibility(inventory, part_id1, part_id2, matrix = None):
     # Initialize variables.
-    compatible = True
+    violation = None
     if part_id1 not in inventory:
         raise PartException("Part 1 ID is invalid.\n")
     if part_id2 not in inventory:
@@ -129,116 +269,223 @@ def compatibility(inventory, part_id1, part_id2):
     # Verify that the parts follow compatibility rules.
     if (part1.type == "Motherboard" and part2.type == "CPU" or
             part1.type == "CPU" and part2.type == "Motherboard"):
-        compatible = part1.socket == part2.socket
+        cpu, motherboard = ((part_id1, part_id2) if part1.type == "CPU"
+                            else (part_id2, part_id1))
+        if matrix is not None and matrix.covers(cpu, motherboard):
+            compatible = matrix.socket_compatible(cpu, motherboard)
+        else:
+            compatible = part1.socket == part2.socket
         if not compatible:
-            print("Motherboard and CPU must have the same socket type.\n")
+            violation = rules.socket_violation(part1.socket, part2.socket)
     elif part1.type == "RAM" and part2.type == "RAM":
-        compatible = part1.id == part2.id
-        if not compatible:
-            print("All instances of RAM must be the same id.\n")
+        violation = rules.ram_id_violation(len({part1.id, part2.id}))
+
+    if violation is None:
+        return rules.Verdict(True)
+    return rules.Verdict(False, (violation,))
 
-    if compatible:
-        print("Parts are compatible.\n")
-    return compatible
+# Return the part of the given type that an ID names, raising a
+# PartException if there is none. The ID is checked against the per-type ID
+# sets of an index.InventoryIndex, so each check is O(1) whatever the size
+# of the catalog.
+def validate_part(index, part_id, part_type):
+    part_id = str(part_id).strip().upper()
+    if not index.contains(part_type, part_id):
+        raise PartException(f"{part_id} is not a valid {part_type} ID.\n")
+    return index.inventory[part_id]
+
+# Return the parts of the given type listed in entries, each a part ID or
+# an ID with a number of units, such as RAM_03x4 for four RAM_03. An entry
+# that is an ID as written is always one unit of it.
+def validate_parts(index, entries, part_type):
+    parts = []
+    for entry in entries:
+        part_id = str(entry).strip().upper()
+        units = 1
+        if not index.contains(part_type, part_id):
+            match = _UNITS.fullmatch(part_id)
+            if match is None or not index.contains(part_type, match[1]):
+                raise PartException(f"{part_id} is not a valid {part_type} "
+                                    "ID.\n")
+            part_id, units = match[1], int(match[2])
+            if not 1 <= units <= MAX_UNITS:
+                raise PartException(f"The number of units in {entry} must "
+                                    f"be between 1 and {MAX_UNITS}.\n")
+        parts.extend([index.inventory[part_id]] * units)
+    return parts
+
+# Reserve the given units of each part ID and return the reservations by
+# part ID. If any part is out of stock, what was already reserved is
+# released before raising.
+def reserve(stock, counts):
+    reservations = {}
+    try:
+        for part_id, quantity in counts.items():
+            reservations[part_id] = stock.reserve(part_id, quantity)
+    except PartException:
+        for reservation in reservations.values():
+            stock.release(reservation)
+        raise
+    return reservations
 
 # Build a custom computer with specified parts and add the computer to
-# the shopping cart.
+# the shopping cart. If a stock.StockLedger is passed, its parts are
+# reserved. If a buildcache.BuildCache is passed, the totals and
+# compatibility of the same parts are reused from it.
 def build(customer: objects.Customer, cid, motherboard: objects.Motherboard,
           rams: List[objects.RAM], cpu: objects.CPU, psu: objects.PSU,
           storage: objects.Storage, storage2: objects.Storage = None,
-          gpu: objects.GPU = None):
+          gpu: objects.GPU = None, stock = None, cache = None):
+    if cid in customer.cart.computers:
+        raise PartException(f"{cid} is already in the cart.\n")
+    key = result = None
+    if cache is not None:
+        key = build_key([motherboard, *rams, cpu, psu, storage, storage2,
+                         gpu], len(rams))
+        result = cache.get(key)
     computer = objects.Computer(cid, motherboard, rams, cpu, psu, storage,
-                                storage2, gpu)
-    compatibility_build(computer)
-    customer.cart.append(computer)
-    customer.total += computer.price
+                                storage2, gpu,
+                                None if result is None else result[:2])
+    _report_build(computer, cache, key, result)
+    reservations = ()
+    if stock is not None:
+        reservations = reserve(stock, Counter(part.id for part
+                                              in computer.parts())).values()
+    customer.cart.add_computer(computer, reservations)
     return computer
 
-# Remove specified part(s) or computer(s) from current shopping cart.
-def remove(customer: objects.Customer, inventory, item, *items):
-    if isinstance(item, objects.Computer):
-        customer.cart.remove(item)
-        customer.total -= item.price
-        print(f"{item} removed from cart.\n")
-    elif item in inventory:
-        if inventory[item] in customer.cart:
-            customer.cart.remove(inventory[item])
-            customer.total -= inventory[item].price
-            print(f"{item} removed from cart.\n")
-        else:
-            raise PartException(f"{item} not in cart.\n")
-    else:
-        raise PartException(f"{item} is not a valid part ID.\n")
-
-    for extra in items:
+# Remove specified part(s) or computer(s) from current shopping cart,
+# releasing their reserved stock if a stock.StockLedger is passed. Every
+# item is checked before any is removed. Return the removed items as
+# (ID, units) pairs.
+def remove(customer: objects.Customer, inventory, item, *items,
+           stock = None):
+    cart = customer.cart
+    counts = Counter()
+    computers = []
+    for extra in (item,) + items:
         if isinstance(extra, objects.Computer):
-            customer.cart.remove(extra)
-            customer.total -= extra.price
-            print(f"{extra} removed from cart.\n")
-        elif extra in inventory:
-            if inventory[extra] in customer.cart:
-                customer.cart.remove(inventory[extra])
-                customer.total -= inventory[extra].price
-                print(f"{extra} removed from cart.\n")
-            else:
+            extra = extra.id
+            if extra not in cart.computers:
+                raise PartException(f"{extra} not in cart.\n")
+        if extra in cart.computers:
+            if extra in computers:
                 raise PartException(f"{extra} not in cart.\n")
+            computers.append(extra)
+        elif extra in inventory:
+            counts[extra] += 1
         else:
             raise PartException(f"{extra} is not a valid part ID.\n")
+    for part_id, quantity in counts.items():
+        if cart.counts[part_id] < quantity:
+            raise PartException(f"{part_id} not in cart.\n")
 
-# Check compatibility between all parts in current build configuration.
-def compatibility_build(computer):
-    # Initialize variables.
-    ram_ids = set()
-
-    for ram in computer.rams:
-        ram_ids.add(ram)
-
-    # Check motherboard and CPU socket types.
-    if computer.motherboard.socket != computer.cpu.socket:
-        raise PartException(("Motherboard and CPU must have the same socket "
-                            "type."))
-
-    # Check RAM IDs.
-    if 1 < len(ram_ids):
-        raise PartException("All instances of RAM must be the same id.")
-
-    # Check number of RAMs.
-    if (0 == len(computer.rams) or
-            len(computer.rams) > computer.motherboard.ram_slots):
-        raise PartException(f"The number of RAMs ({len(computer.rams)}) cannot "
-               "exceed the number of RAM slots "
-               f"({computer.motherboard.ram_slots}).")
-
-    # Check power draw.
-    if computer.power_draw > computer.psu.power_supplied:
-        raise PartException("The total power draw from all components, "
-               f"{computer.power_draw}W, should be less than "
-               "or equal to the power supplied by the PSU, "
-               f"{computer.psu.power_supplied}W.")
-
-    print((f"The parts in the current build configuration of {computer} "
-              "are compatible.\n"))
-    return True
-
-# Add the specified part to shopping cart.
-def purchase(customer: objects.Customer, inventory, part_id):
+    released = []
+    for computer_id in computers:
+        released.extend(cart.remove_computer(computer_id))
+    for part_id, quantity in counts.items():
+        released.extend(cart.remove(part_id, quantity))
+    if stock is not None:
+        for reservation, quantity in released:
+            stock.release(reservation, quantity)
+    return ([(computer_id, 1) for computer_id in computers] +
+            list(counts.items()))
+
+# Check compatibility between all parts in current build configuration and
+# return a rules.Verdict, raising a BuildException with every rule the
+# build breaks instead if it is incompatible. If a
+# buildcache.BuildCache is passed, the result for the same parts is reused
+# instead of checked again.
+def compatibility_build(computer, cache = None):
+    key = result = None
+    if cache is not None:
+        key = build_key(computer.parts(), len(computer.rams))
+        result = cache.get(key)
+    return _report_build(computer, cache, key, result)
+
+# Validate a computer unless its result came from the cache, cache the
+# result, and raise if the parts are incompatible.
+def _report_build(computer, cache, key, result):
+    if result is None:
+        result = BuildResult(computer.price, computer.power_draw,
+                             tuple(rules.validate(computer)))
+        if cache is not None:
+            cache.put(key, result)
+    if result.violations:
+        raise BuildException(result.violations)
+    return rules.Verdict(True)
+
+# Add the specified part to shopping cart, reserving it if a
+# stock.StockLedger is passed. Return the added part as an (ID, units)
+# pair in a list.
+def purchase(customer: objects.Customer, inventory, part_id, stock = None,
+             quantity = 1):
     if part_id not in inventory:
         raise PartException("Part not found.\n")
-    customer.cart.append(inventory[part_id])
-    customer.total += inventory[part_id].price
-    print(f"{part_id} added to cart.\n")
+    return purchase_many(customer, inventory, {part_id: quantity}, stock)
+
+# Add many parts to shopping cart in one call, given as part IDs or as a
+# mapping of part ID to units. Nothing is added unless every part is valid
+# and, if a stock.StockLedger is passed, in stock. Return the added parts
+# as (ID, units) pairs.
+def purchase_many(customer: objects.Customer, inventory, part_ids,
+                  stock = None):
+    counts = Counter(part_ids)
+    for part_id, quantity in counts.items():
+        if part_id not in inventory:
+            raise PartException(f"{part_id} is not a valid part ID.\n")
+        if (not isinstance(quantity, int) or isinstance(quantity, bool) or
+                quantity < 1):
+            raise PartException("Quantity must be a whole number of at "
+                                "least 1.\n")
+    reservations = {}
+    if stock is not None:
+        reservations = reserve(stock, counts)
+    for part_id, quantity in counts.items():
+        held = reservations.get(part_id)
+        customer.cart.add(inventory[part_id], quantity,
+                          () if held is None else (held,))
+    return list(counts.items())
 
-# Complete the purchase and checkout.
-def checkout(customer: objects.Customer):
+# Complete the purchase and checkout, and return its Receipt. The total is
+# summed afresh from the cart's lines rather than taken from its running
+# total. If a stock.StockLedger is passed, the reserved stock is committed,
+# and nothing is sold if any part ran out.
+def checkout(customer: objects.Customer, stock = None):
     if not customer.cart:
-        print("Cannot checkout, your cart is empty.\n")
-    elif customer.budget < customer.total:
-        print("Cannot checkout, items in cart are over the budget.\n")
-    else:
-        customer.budget -= customer.total
-        print("Order submitted. Your order is on the way.")
-        for item in customer.cart:
-            print(f"\t{item}")
-        print(f"Your total is ${customer.total}.00.\n")
-        customer.cart.clear()
-        customer.total = 0
+        raise PartException("Cannot checkout, your cart is empty.\n")
+    total = customer.cart.line_totals.total()
+    if customer.budget < total:
+        raise PartException("Cannot checkout, items in cart are over the "
+                            "budget.\n")
+    if stock is not None:
+        try:
+            stock.commit(customer.cart.reservations())
+        except PartException as exc:
+            raise PartException(f"Cannot checkout, {exc.value}") from exc
+    customer.budget -= total
+    receipt = Receipt(list(customer.cart.lines()), total, customer.budget,
+                      customer.cart.line_totals.discount())
+    customer.cart.clear()
+    return receipt
+
+# Return a search.SearchPage of the parts matching a query in a
+# search.SearchIndex, of one category if given.
+def search(index, query, category = "", page = 1, per_page = 10):
+    if category not in ["", "CPU", "GPU", "RAM", "PSU", "Motherboard",
+                        "Storage"]:
+        raise PartException(f"{category} is not a valid category.\n")
+    if not isinstance(page, int) or page < 1 or \
+            not isinstance(per_page, int) or per_page < 1:
+        raise PartException("Page and results per page must be whole "
+                            "numbers of at least 1.\n")
+    return index.search(query, category or None, page, per_page)
+
+# Return the best compatible builds within the customer's budget, ranked by
+# the named objective from solver.OBJECTIVES.
+def recommend(customer: objects.Customer, inventory, objective = "ram",
+              count = 5, catalog = None):
+    if objective not in solver.OBJECTIVES:
+        raise PartException(f"{objective} is not a valid objective.\n")
+    return solver.recommend(inventory, customer.budget, objective, count,
+                            catalog)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Defines secondary indexes over the inventory for storefront.py.
+"""
+
+from bisect import bisect_left, bisect_right
+
+# Numeric fields that get a sorted index in every category that has them.
+SORTED_FIELDS = ("price", "power_draw", "capacity", "ram_slots",
+                 "power_supplied")
+
+# Entries per block of a _SortedIndex; a block is split when it doubles.
+_BLOCK = 512
+
+class _SortedIndex:
+    """Part IDs kept sorted by the value of one field.
+
+    Keys and IDs are kept in blocks of at most 2 * _BLOCK entries, with the
+    largest key of each block, so an insert or delete shifts the entries of
+    one block rather than of the whole index. Ties are kept in the order the
+    parts were added, after parts sorted by ID when the index was made.
+    """
+    __slots__ = ("_keys", "_ids", "_maxes", "_starts", "_len")
+
+    def __init__(self, pairs = ()):
+        pairs = sorted(pairs)
+        self._keys = [[key for key, _ in pairs[start:start + _BLOCK]]
+                      for start in range(0, len(pairs), _BLOCK)]
+        self._ids = [[part_id for _, part_id in pairs[start:start + _BLOCK]]
+                     for start in range(0, len(pairs), _BLOCK)]
+        self._maxes = [keys[-1] for keys in self._keys]
+        # Position of the first entry of each block, made again on the first
+        # lookup after a change.
+        self._starts = None
+        self._len = len(pairs)
+
+    def insert(self, key, part_id):
+        if not self._keys:
+            self._keys.append([key])
+            self._ids.append([part_id])
+            self._maxes.append(key)
+        else:
+            block = min(bisect_right(self._maxes, key), len(self._maxes) - 1)
+            keys = self._keys[block]
+            pos = bisect_right(keys, key)
+            keys.insert(pos, key)
+            self._ids[block].insert(pos, part_id)
+            self._maxes[block] = keys[-1]
+            if len(keys) > 2 * _BLOCK:
+                ids = self._ids[block]
+                self._keys[block + 1:block + 1] = [keys[_BLOCK:]]
+                self._ids[block + 1:block + 1] = [ids[_BLOCK:]]
+                del keys[_BLOCK:], ids[_BLOCK:]
+                self._maxes[block:block + 1] = [keys[-1],
+                                                 self._keys[block + 1][-1]]
+        self._starts = None
+        self._len += 1
+
+    def delete(self, key, part_id):
+        block = bisect_left(self._maxes, key)
+        while True:
+            keys = self._keys[block]
+            start = bisect_left(keys, key)
+            end = bisect_right(keys, key)
+            if part_id in self._ids[block][start:end]:
+                break
+            block += 1
+        pos = self._ids[block].index(part_id, start, end)
+        del keys[pos]
+        del self._ids[block][pos]
+        if keys:
+            self._maxes[block] = keys[-1]
+        else:
+            del self._keys[block], self._ids[block], self._maxes[block]
+        self._starts = None
+        self._len -= 1
+
+    # Return the position of the first entry of each block.
+    def _block_starts(self):
+        if self._starts is None:
+            self._starts = starts = []
+            position = 0
+            for keys in self._keys:
+                starts.append(position)
+                position += len(keys)
+        return self._starts
+
+    # Return the position of the first key at or above a key, or above it
+    # if right is true.
+    def _locate(self, key, right):
+        find = bisect_right if right else bisect_left
+        block = find(self._maxes, key)
+        if block == len(self._maxes):
+            return self._len
+        return self._block_starts()[block] + find(self._keys[block], key)
+
+    # Return the (start, end) positions of the keys between low and high,
+    # both inclusive.
+    def _bounds(self, low, high):
+        start = 0 if low is None else self._locate(low, False)
+        end = self._len if high is None else self._locate(high, True)
+        return start, end
+
+    # Return the IDs whose key is between low and high, both inclusive, the
+    # first limit of them if a limit is given.
+    def range(self, low = None, high = None, limit = None):
+        start, end = self._bounds(low, high)
+        if limit is not None:
+            end = min(end, start + limit)
+        if start >= end:
+            return []
+        starts = self._block_starts()
+        block = bisect_right(starts, start) - 1
+        found = []
+        while len(found) < end - start:
+            offset = starts[block]
+            found += self._ids[block][max(start - offset, 0):end - offset]
+            block += 1
+        return found
+
+    # Return the number of keys between low and high, both inclusive.
+    def count(self, low = None, high = None):
+        start, end = self._bounds(low, high)
+        return max(0, end - start)
+
+    def __len__(self):
+        return self._len
+
+class InventoryIndex:
+    """Secondary indexes over an inventory by type, socket and numeric fields.
+
+    Build it once after loading the inventory, then add and remove parts
+    through it so the inventory and the indexes stay consistent. Nothing is
+    indexed until the first lookup. An inventory opened from a snapshot is
+    then indexed one type, socket or field at a time from the snapshot's
+    sorted tables, as each is first looked up; any other inventory is
+    indexed whole on the first lookup.
+    """
+    def __init__(self, inventory):
+        self.inventory = inventory
+        # Part type -> part IDs, as dicts to keep the inventory's order.
+        self._by_type = {}
+        # Socket -> part type -> part IDs.
+        self._by_socket = {}
+        # (part type, socket or None, field) -> _SortedIndex.
+        self._sorted = {}
+        self._snapshot = (inventory if hasattr(inventory, "sorted_table")
+                          else None)
+        # Whether the whole inventory is indexed, or need not be.
+        self._loaded = self._snapshot is not None
+
+    # Index the whole inventory, on the first lookup of an inventory that is
+    # not a snapshot. Lookups made at the same time may each index it; it is
+    # marked loaded only once it is, so none reads it half indexed.
+    def _load(self):
+        pairs = {}
+        for part in self.inventory.values():
+            self._by_type.setdefault(part.type, {})[part.id] = None
+            socket = getattr(part, "socket", None)
+            if socket is not None:
+                self._by_socket.setdefault(socket, {}).setdefault(
+                    part.type, {})[part.id] = None
+            for key, value in self._sort_keys(part):
+                pairs.setdefault(key, []).append((value, part.id))
+        for key, values in pairs.items():
+            self._sorted[key] = _SortedIndex(values)
+        self._loaded = True
+
+    # Return the IDs of the parts of a type, and of one socket if given, as
+    # a dict, loading them from the snapshot on first use.
+    def _ids(self, part_type, socket = None):
+        if not self._loaded:
+            self._load()
+        by_type = (self._by_type if socket is None else
+                   self._by_socket.setdefault(socket, {}))
+        ids = by_type.get(part_type)
+        if ids is None:
+            ids = by_type[part_type] = dict.fromkeys(
+                () if self._snapshot is None else
+                self._snapshot.category_ids(part_type, socket))
+        return ids
+
+    # Return the sorted index of a key, loading it from the snapshot on
+    # first use.
+    def _sorted_index(self, key):
+        if not self._loaded:
+            self._load()
+        index = self._sorted.get(key)
+        if index is None:
+            index = self._sorted[key] = _SortedIndex(
+                () if self._snapshot is None else
+                self._snapshot.sorted_table(*key))
+        return index
+
+    # Yield the sorted index keys a part belongs to with its value for each.
+    @staticmethod
+    def _sort_keys(part):
+        socket = getattr(part, "socket", None)
+        for field in SORTED_FIELDS:
+            value = getattr(part, field, None)
+            if value is None:
+                continue
+            yield (part.type, None, field), value
+            if socket is not None:
+                yield (part.type, socket, field), value
+
+    # Add a part to the inventory and the indexes, replacing any part that
+    # has the same ID.
+    def add(self, part):
+        if part.id in self.inventory:
+            self.remove(part.id)
+        socket = getattr(part, "socket", None)
+        keys = list(self._sort_keys(part))
+        # Load what the part belongs to before the inventory has it.
+        type_ids = self._ids(part.type)
+        socket_ids = None if socket is None else self._ids(part.type, socket)
+        indexes = [(self._sorted_index(key), value) for key, value in keys]
+        self.inventory[part.id] = part
+        type_ids[part.id] = None
+        if socket_ids is not None:
+            socket_ids[part.id] = None
+        for index, value in indexes:
+            index.insert(value, part.id)
+
+    # Remove a part from the inventory and the indexes and return it.
+    def remove(self, part_id):
+        part = self.inventory[part_id]
+        for key, value in self._sort_keys(part):
+            self._sorted_index(key).delete(value, part_id)
+        socket = getattr(part, "socket", None)
+        if socket is not None:
+            del self._ids(part.type, socket)[part_id]
+        del self._ids(part.type)[part_id]
+        del self.inventory[part_id]
+        return part
+
+    # Return whether a part ID is of the given type, in O(1), or O(log n)
+    # over a snapshot.
+    def contains(self, part_type, part_id):
+        part = self.inventory.get(part_id)
+        return part is not None and part.type == part_type
+
+    # Return the IDs of every part of the given type.
+    def ids(self, part_type):
+        return list(self._ids(part_type))
+
+    # Return every part of the given type.
+    def parts(self, part_type):
+        return [self.inventory[part_id] for part_id in self._ids(part_type)]
+
+    # Return the parts with the given socket, optionally of one type only.
+    def with_socket(self, socket, part_type = None):
+        types = ([part_type] if part_type is not None else
+                 [kind for kind, kind_socket in self._socket_kinds()
+                  if kind_socket == socket])
+        return [self.inventory[part_id] for kind in types
+                for part_id in self._ids(kind, socket)]
+
+    # Return the parts of a type whose field is between low and high, both
+    # inclusive, sorted by that field, or the first limit of them. Limit
+    # the search to one socket if given. Runs in O(log n + k) for k results.
+    def range(self, part_type, field = "price", low = None, high = None,
+              socket = None, limit = None):
+        index = self._sorted_index((part_type, socket, field))
+        return [self.inventory[part_id]
+                for part_id in index.range(low, high, limit)]
+
+    # Return the number of parts range() would return, in O(log n).
+    def count(self, part_type, field = "price", low = None, high = None,
+              socket = None):
+        return self._sorted_index((part_type, socket, field)).count(low,
+                                                                     high)
+
+    # Return the parts that share a socket with the given CPU or
+    # motherboard: motherboards for a CPU and CPUs for a motherboard.
+    def compatible(self, part_id):
+        part = self.inventory[part_id]
+        other = {"CPU": "Motherboard", "Motherboard": "CPU"}.get(part.type)
+        if other is None:
+            return []
+        return self.with_socket(part.socket, other)
+
+    # Return the (part type, socket) pairs of the indexed parts with a
+    # socket.
+    def _socket_kinds(self):
+        if not self._loaded:
+            self._load()
+        kinds = {}
+        if self._snapshot is not None:
+            kinds = dict.fromkeys(self._snapshot.socket_kinds())
+        for socket, by_type in self._by_socket.items():
+            for part_type in by_type:
+                kinds[part_type, socket] = None
+        return list(kinds)
+
+    # Return the sockets of the indexed parts.
+    def sockets(self):
+        sockets = {}
+        for part_type, socket in self._socket_kinds():
+            if self._ids(part_type, socket):
+                sockets[socket] = None
+        return list(sockets)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Keeps carts and orders across restarts with an append-only write-ahead log.
+
+A journal is a directory holding
+    log.jsonl       one event per line: a budget set, parts added or
+                    removed, a computer built, an order placed, or a
+                    session dropped after sitting idle
+    snapshot.json   the sessions, units sold and order count as of an
+                    event, written in place of the log before it
+    orders.jsonl    every order placed, never compacted
+Budgets and totals are logged in cents. Events are numbered, and buffered
+until group_size of them are waiting or max_delay seconds have passed; the
+whole group is then written and synced to disk at once. An order is synced
+before its checkout returns, taking any events waiting with it. Every
+snapshot_every events, a snapshot of the live sessions replaces the log, so
+restoring reads the snapshot and only the events after it. The sessions
+are copied as of an event, and the snapshot can then be written and the
+log cut back to the events after it in the background.
+
+Restoring rebuilds the carts from the inventory loaded at startup: parts
+are reserved again, parts no longer sold are dropped, and units sold
+through the journal are taken out of the stock counts, which are assumed
+to predate the journal.
+"""
+
+from collections import Counter
+import json
+import os
+import threading
+
+import functions
+
+# Bytes read at a time from the end of the orders file.
+_CHUNK = 65536
+# Fields of a computer, in the order objects.Computer takes them.
+_COMPUTER_FIELDS = ("motherboard", "rams", "cpu", "psu", "storage",
+                    "storage2", "gpu")
+
+# Return a computer as its ID and the IDs of its parts.
+def computer_state(computer):
+    state = {"id": computer.id}
+    for field in _COMPUTER_FIELDS:
+        value = getattr(computer, field)
+        if field == "rams":
+            state[field] = [ram.id for ram in value]
+        else:
+            state[field] = None if value is None else value.id
+    return state
+
+# Return the units of each part in a cart, counting the parts of its
+# computers.
+def parts_sold(cart):
+    sold = Counter(cart.counts)
+    for computer in cart.computers.values():
+        sold.update(part.id for part in computer.parts())
+    return dict(sold)
+
+# Return the budget and cart of every session of a commands.Store, for a
+# snapshot. Sessions with an empty cart and no budget are left out.
+def sessions_state(store):
+    sessions = {}
+    for customer_id, session in store.sessions.items():
+        customer = session.customer
+        if not customer.cart and not customer.budget:
+            continue
+        sessions[customer_id] = {
+            "budget": customer.budget,
+            "parts": dict(customer.cart.counts),
+            "computers": [computer_state(computer) for computer
+                          in customer.cart.computers.values()]}
+    return sessions
+
+# Put a computer back in a session's cart, if its parts are still sold and
+# in stock.
+def _restore_computer(store, session, state):
+    try:
+        parts = [[store.inventory[part_id] for part_id in state["rams"]]
+                 if field == "rams" else None if state[field] is None
+                 else store.inventory[state[field]]
+                 for field in _COMPUTER_FIELDS]
+        computer = functions.build(session.customer, state["id"], *parts,
+                                   stock = store.stock)
+    except (KeyError, functions.PartException):
+        return
+    session.computers[computer.id] = computer
+    session.last_computer = computer
+
+# Put units of a part back in a session's cart, if it is still sold and in
+# stock.
+def _restore_part(store, session, part_id, units):
+    try:
+        functions.purchase(session.customer, store.inventory, part_id,
+                           store.stock, units)
+    except functions.PartException:
+        pass
+
+class Journal:
+    """A write-ahead log of cart changes and orders in a directory.
+
+    append() numbers and buffers events, writing them in groups with one
+    fsync per group, from the appending thread when a group fills and from
+    a background thread when max_delay passes. restore() replays the
+    snapshot and log into a commands.Store and opens the log for appending,
+    and checkpoint() snapshots the sessions, in the background if asked.
+    """
+    def __init__(self, directory, group_size = 64, max_delay = 0.01,
+                 snapshot_every = 10_000):
+        self.directory = directory
+        self.group_size = group_size
+        self.max_delay = max_delay
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        # Encoded events and orders not written yet.
+        self._pending = []
+        self._pending_orders = []
+        # Number of the last event appended, and events since the snapshot.
+        self.seq = 0
+        self._since_snapshot = 0
+        # Units sold through the journal by part ID, and orders placed.
+        self.sold = Counter()
+        self.orders = 0
+        self.fsyncs = 0
+        self._log = None
+        self._orders = None
+        self._stop = threading.Event()
+        self._thread = None
+        # Thread writing a snapshot, if one is.
+        self._checkpointer = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    # Replay the snapshot and the log after it into a store, open the log
+    # for appending and start the background flusher. Return the number of
+    # events replayed.
+    def restore(self, store):
+        os.makedirs(self.directory, exist_ok = True)
+        snapshot = {"seq": 0, "sold": {}, "orders": 0, "sessions": {}}
+        try:
+            with open(self._path("snapshot.json"), encoding = "utf-8") as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            pass
+        self.seq = snapshot["seq"]
+        self.sold = Counter(snapshot["sold"])
+        self.orders = snapshot["orders"]
+        if store.stock is not None:
+            for part_id, units in self.sold.items():
+                if store.stock.available(part_id) is not None:
+                    store.stock.adjust(part_id, -units)
+        for customer_id, state in snapshot["sessions"].items():
+            session = store.session(customer_id, state["budget"])
+            for part_id, units in state["parts"].items():
+                _restore_part(store, session, part_id, units)
+            for computer in state["computers"]:
+                _restore_computer(store, session, computer)
+
+        replayed = 0
+        orders = []
+        for event in self._read_log():
+            if event["seq"] <= self.seq:
+                continue
+            self.seq = event["seq"]
+            self._apply(store, event)
+            if event["op"] == "order":
+                orders.append(event)
+            replayed += 1
+        self._since_snapshot = replayed
+
+        # Record orders the log holds but the orders file missed.
+        last = self._last_order()
+        self._orders = self._open_appending("orders.jsonl")
+        lines = [json.dumps(order) + "\n" for order in orders
+                 if order["seq"] > last]
+        if lines:
+            self._orders.write("".join(lines))
+            self._orders.flush()
+        self._log = self._open_appending("log.jsonl")
+        self._thread = threading.Thread(target = self._flush_periodically,
+                                        daemon = True)
+        self._thread.start()
+        return replayed
+
+    # Yield the events of the log in order, cutting off a last line left
+    # half written by a crash.
+    def _read_log(self):
+        path = self._path("log.jsonl")
+        if not os.path.exists(path):
+            return
+        offset = 0
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated event")
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                offset += len(line)
+                yield event
+        if offset != os.path.getsize(path):
+            os.truncate(path, offset)
+
+    # Return the number of the last event in the orders file, cutting off a
+    # last line left half written. The file is read backwards a chunk at a
+    # time, only as far as the start of its last whole line.
+    def _last_order(self):
+        path = self._path("orders.jsonl")
+        if not os.path.exists(path):
+            return 0
+        size = position = os.path.getsize(path)
+        # End of the last whole line, and the chunks of it read so far.
+        end = None
+        chunks = []
+        with open(path, "rb") as file:
+            while position > 0:
+                step = min(_CHUNK, position)
+                position -= step
+                file.seek(position)
+                chunk = file.read(step)
+                if end is None:
+                    newline = chunk.rfind(b"\n")
+                    if newline < 0:
+                        continue
+                    end = position + newline + 1
+                    chunk = chunk[:newline]
+                start = chunk.rfind(b"\n")
+                chunks.append(chunk[start + 1:])
+                if start >= 0:
+                    break
+        if end is None:
+            end = 0
+        if end != size:
+            os.truncate(path, end)
+        line = b"".join(reversed(chunks))
+        return json.loads(line)["seq"] if line.strip() else 0
+
+    def _open_appending(self, name):
+        return open(self._path(name), "a", encoding = "utf-8")
+
+    # Apply a logged event to the sessions of a store.
+    def _apply(self, store, event):
+        if event["op"] == "expire":
+            if event["customer"] in store.sessions:
+                store.drop_session(event["customer"])
+            return
+        session = store.session(event["customer"])
+        customer = session.customer
+        op = event["op"]
+        if op == "budget":
+            customer.set_budget(event["amount"])
+        elif op == "add":
+            for part_id, units in event["parts"]:
+                _restore_part(store, session, part_id, units)
+        elif op == "build":
+            _restore_computer(store, session, event["computer"])
+        elif op == "remove":
+            for item_id, units in event["items"]:
+                try:
+                    functions.remove(customer, store.inventory, item_id,
+                                     *[item_id] * (units - 1),
+                                     stock = store.stock)
+                except functions.PartException:
+                    pass
+        elif op == "order":
+            if store.stock is not None:
+                try:
+                    store.stock.commit(customer.cart.reservations())
+                except functions.PartException:
+                    pass
+            customer.budget = event["budget"]
+            customer.cart.clear()
+            self.sold.update(event["sold"])
+            self.orders += 1
+
+    # Add an event, as a dictionary with an "op" and the "customer" it
+    # belongs to, and return its number. With sync, the event and every
+    # event waiting with it are on disk before this returns.
+    def append(self, event, sync = False):
+        with self._lock:
+            self.seq += 1
+            self._since_snapshot += 1
+            line = json.dumps({"seq": self.seq, **event}) + "\n"
+            self._pending.append(line)
+            if event["op"] == "order":
+                self._pending_orders.append(line)
+                self.sold.update(event["sold"])
+                self.orders += 1
+            if sync or len(self._pending) >= self.group_size:
+                self._flush()
+            return self.seq
+
+    # Write and sync the waiting events. The lock must be held.
+    def _flush(self):
+        if not self._pending:
+            return
+        self._log.write("".join(self._pending))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self.fsyncs += 1
+        self._pending.clear()
+        if self._pending_orders:
+            # The log is synced first, so restore can fill in any order
+            # lost from here.
+            self._orders.write("".join(self._pending_orders))
+            self._orders.flush()
+            self._pending_orders.clear()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.max_delay):
+            with self._lock:
+                self._flush()
+
+    # Write every waiting event now.
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    # Return whether enough events were appended since the last snapshot
+    # to write another, and no snapshot is being written.
+    def due(self):
+        return (self._since_snapshot >= self.snapshot_every and
+                (self._checkpointer is None or
+                 not self._checkpointer.is_alive()))
+
+    # Write a snapshot of the sessions, as returned by sessions_state, as of
+    # the last event appended, and drop the events before it from the log.
+    # The sessions are taken as they are now; with background, the snapshot
+    # is written by a thread of its own while events keep being appended.
+    def checkpoint(self, sessions, background = False):
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+            self._checkpointer = None
+        with self._lock:
+            self._flush()
+            snapshot = {"seq": self.seq, "sold": dict(self.sold),
+                        "orders": self.orders, "sessions": sessions}
+            # Events after the snapshot start here in the log.
+            offset = os.fstat(self._log.fileno()).st_size
+            self._since_snapshot = 0
+        if background:
+            self._checkpointer = threading.Thread(
+                target = self._write_snapshot, args = (snapshot, offset))
+            self._checkpointer.start()
+        else:
+            self._write_snapshot(snapshot, offset)
+
+    # Sync the directory, so files replaced in it stay replaced.
+    def _sync_directory(self):
+        if hasattr(os, "O_DIRECTORY"):
+            descriptor = os.open(self.directory, os.O_DIRECTORY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+    # Write a snapshot, then replace the log with the events from an offset
+    # of it on, those appended since the snapshot was taken.
+    def _write_snapshot(self, snapshot, offset):
+        temporary = self._path("snapshot.json.tmp")
+        with open(temporary, "w", encoding = "utf-8") as file:
+            json.dump(snapshot, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._path("snapshot.json"))
+        self._sync_directory()
+        # Events up to the snapshot are skipped by restore, so a crash
+        # before the log is replaced loses nothing.
+        with self._lock:
+            self._flush()
+            with open(self._path("log.jsonl"), "rb") as file:
+                file.seek(offset)
+                events = file.read()
+            temporary = self._path("log.jsonl.tmp")
+            with open(temporary, "wb") as file:
+                file.write(events)
+                file.flush()
+                os.fsync(file.fileno())
+            self._log.close()
+            os.replace(temporary, self._path("log.jsonl"))
+            self._sync_directory()
+            self._log = self._open_appending("log.jsonl")
+
+    # Write every waiting event, stop the background flusher and close the
+    # files.
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+            self._checkpointer = None
+        with self._lock:
+            if self._log is not None:
+                self._flush()
+                self._log.close()
+                self._orders.close()
+                self._log = self._orders = None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Defines precomputed compatibility tables for storefront.py.
+"""
+
+from array import array
+
+class CompatibilityMatrix:
+    """CPU/motherboard compatibility of an inventory.
+
+    Sockets are interned as small integer codes, one per CPU row and one
+    per motherboard column, so whether CPU c fits motherboard m is a
+    comparison of two codes and the tables grow with the number of parts,
+    not with CPUs times motherboards. Rows and columns follow cpu_ids and
+    motherboard_ids. update() keeps the matrix in step with parts added,
+    changed and removed, a row or column at a time.
+    """
+    def __init__(self, inventory):
+        parts = {}
+        for part in inventory.values():
+            if part.type in ("CPU", "Motherboard"):
+                parts.setdefault(part.type, []).append(part)
+        cpus = parts.get("CPU", [])
+        motherboards = parts.get("Motherboard", [])
+        self.cpu_ids = [cpu.id for cpu in cpus]
+        self.motherboard_ids = [motherboard.id for motherboard in motherboards]
+        self._cpus = {part_id: row for row, part_id in enumerate(self.cpu_ids)}
+        self._motherboards = {part_id: column for column, part_id
+                              in enumerate(self.motherboard_ids)}
+        # Socket -> code, and the code of each row and column.
+        self._codes = {}
+        self.cpu_sockets = array("H", (self._code(cpu.socket)
+                                       for cpu in cpus))
+        self.motherboard_sockets = array("H", (self._code(motherboard.socket)
+                                               for motherboard
+                                               in motherboards))
+
+    # Return the code of a socket, giving it one if it is new.
+    def _code(self, socket):
+        return self._codes.setdefault(socket, len(self._codes))
+
+    # Return the row or column list, position map and socket codes of a
+    # part's type, or None if the matrix has no rows or columns for it.
+    def _axis(self, part):
+        if part.type == "CPU":
+            return self.cpu_ids, self._cpus, self.cpu_sockets
+        if part.type == "Motherboard":
+            return (self.motherboard_ids, self._motherboards,
+                    self.motherboard_sockets)
+        return None
+
+    # Update the matrix after a part changed: old is the part as it was, or
+    # None if it was added, and new the part as it is, or None if it was
+    # removed. A removed row or column is replaced by the last one. Other
+    # parts are not in the matrix.
+    def update(self, old, new):
+        if old is not None and self._axis(old) is not None:
+            ids, positions, codes = self._axis(old)
+            position = positions.pop(old.id)
+            last = len(ids) - 1
+            if position != last:
+                ids[position] = ids[last]
+                codes[position] = codes[last]
+                positions[ids[position]] = position
+            del ids[last], codes[last]
+        if new is not None and self._axis(new) is not None:
+            ids, positions, codes = self._axis(new)
+            positions[new.id] = len(ids)
+            ids.append(new.id)
+            codes.append(self._code(new.socket))
+
+    # Return whether the matrix covers both parts.
+    def covers(self, cpu_id, motherboard_id):
+        return cpu_id in self._cpus and motherboard_id in self._motherboards
+
+    # Return whether a CPU and a motherboard have the same socket.
+    def socket_compatible(self, cpu_id, motherboard_id):
+        return (self.cpu_sockets[self._cpus[cpu_id]] ==
+                self.motherboard_sockets[self._motherboards[motherboard_id]])
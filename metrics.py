@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Records where the storefront spends its time, when asked to.
+
+Metrics are off unless the --profile flag or the STOREFRONT_PROFILE
+environment variable turns them on. When on, they count the calls and
+latencies of each command and of the hot paths in functions.py, render.py
+and bulk.py, note how long the inventory took to load and read the hit rate
+of the caches. They are written as json or Prometheus text when the program
+exits, and the batch and server "metrics" command returns them on request.
+One command or hot path can also be run under cProfile or tracemalloc, the
+first time it is called, with the report included in the metrics.
+
+When metrics are off nothing is wrapped or timed, and a command only checks
+that the store has no Metrics.
+
+Latencies are in seconds.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+import cProfile
+import functools
+import io
+import json
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+import bulk
+import functions
+import render
+
+FORMATS = ("json", "prometheus")
+CAPTURE_TOOLS = ("cprofile", "tracemalloc")
+# Functions timed as hot paths, by module.
+HOT_PATHS = ((functions, ("list_parts", "details", "compatibility", "build",
+                          "remove", "compatibility_build", "purchase",
+                          "purchase_many", "checkout", "search",
+                          "recommend")),
+             (render, ("show", "commands", "parts", "part", "compatibility",
+                       "compatible_build", "added", "removed", "cart",
+                       "receipt", "search_results", "recommendations")),
+             (bulk, ("validate_builds",)))
+# Lines of a capture report.
+CAPTURE_LINES = 25
+# Quantiles reported for each latency histogram.
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Upper bounds of the histogram buckets, from a microsecond to a minute,
+# growing by an eighth of a doubling so a quantile is off by at most 9%.
+_BOUNDS = [1e-6 * 2 ** (i / 8) for i in range(8 * 26)]
+
+class Histogram:
+    """Counts of latencies in buckets, with their total and maximum."""
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Return the upper bound of the bucket holding a quantile, or the
+    # largest latency if that is lower.
+    def quantile(self, fraction):
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if bucket < len(_BOUNDS):
+                    return min(_BOUNDS[bucket], self.max)
+                break
+        return self.max
+
+    # Return the count, total, maximum and quantiles as a dictionary.
+    def summary(self):
+        result = {"count": self.count, "total": self.total, "max": self.max}
+        for fraction in QUANTILES:
+            result[f"p{fraction * 100:g}"] = (self.quantile(fraction)
+                                              if self.count else 0.0)
+        return result
+
+class Metrics:
+    """Command and hot path latencies, gauges and cache statistics.
+
+    Commands are timed by run_command, hot paths once instrument() has
+    wrapped them, and restore() unwraps them again. A capture target, a
+    command name such as "checkout" or a hot path such as
+    "functions.checkout", is run under the capture tool the first time it
+    is called instead of being timed.
+    """
+    def __init__(self, fmt = "json", output = None, capture = None,
+                 capture_with = "cprofile"):
+        if fmt not in FORMATS:
+            raise functions.PartException(f"{fmt} is not a metrics format.")
+        if capture_with not in CAPTURE_TOOLS:
+            raise functions.PartException(f"{capture_with} is not a capture "
+                                          "tool.")
+        self.format = fmt
+        self.output = output
+        self.capture = capture
+        self.capture_with = capture_with
+        self.capture_report = None
+        self.started = time.time()
+        # Command name -> calls, including those of the interactive
+        # storefront, which are counted but not timed.
+        self.calls = Counter()
+        self.errors = Counter()
+        # Command name -> Histogram.
+        self.commands = {}
+        # "module.function" -> Histogram.
+        self.hot_paths = {}
+        self.gauges = {}
+        # Cache name -> function returning its stats.
+        self._caches = {}
+        # (module, name, original function) of each wrapped hot path.
+        self._wrapped = []
+        # Guards the counts and histograms, as commands run on many threads.
+        self._lock = threading.Lock()
+
+    # Wrap the functions of HOT_PATHS so each call is timed.
+    def instrument(self):
+        for module, names in HOT_PATHS:
+            for name in names:
+                original = getattr(module, name)
+                setattr(module, name, self._timed(
+                    f"{module.__name__}.{name}", original))
+                self._wrapped.append((module, name, original))
+
+    def _timed(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            return self._call(self.hot_paths, name, func, args, kwargs)
+        return timed
+
+    # Put back the functions wrapped by instrument().
+    def restore(self):
+        for module, name, original in reversed(self._wrapped):
+            setattr(module, name, original)
+        self._wrapped.clear()
+
+    # Set a gauge, such as the seconds the inventory took to load.
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    # Report the statistics of a cache, read from stats() when the metrics
+    # are written. Its stats must include hits and misses.
+    def watch_cache(self, name, stats):
+        self._caches[name] = stats
+
+    # Count a command whose latency is not measured.
+    def count(self, command):
+        with self._lock:
+            self.calls[command] += 1
+
+    # Run a command with func(*args), timing it, and return its result.
+    def run_command(self, command, func, *args):
+        with self._lock:
+            self.calls[command] += 1
+        return self._call(self.commands, command, func, args, {})
+
+    # Count a command that failed.
+    def error(self, command):
+        with self._lock:
+            self.errors[command] += 1
+
+    def _call(self, table, name, func, args, kwargs):
+        if name == self.capture and self.capture_report is None:
+            return self._captured(func, args, kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                histogram = table.get(name)
+                if histogram is None:
+                    histogram = table[name] = Histogram()
+                histogram.record(seconds)
+
+    # Run the capture target under the capture tool and keep its report.
+    # The captured call is not timed, since the tool slows it down.
+    def _captured(self, func, args, kwargs):
+        self.capture_report = ""
+        if self.capture_with == "tracemalloc":
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                before = tracemalloc.take_snapshot()
+            else:
+                tracemalloc.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                after = tracemalloc.take_snapshot()
+                if tracing:
+                    stats = after.compare_to(before, "lineno")
+                else:
+                    tracemalloc.stop()
+                    stats = after.statistics("lineno")
+                self.capture_report = "".join(
+                    f"{stat}\n" for stat in stats[:CAPTURE_LINES])
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            report = io.StringIO()
+            pstats.Stats(profiler, stream = report).sort_stats(
+                "cumulative").print_stats(CAPTURE_LINES)
+            self.capture_report = report.getvalue()
+
+    # Return every metric as a dictionary.
+    def snapshot(self):
+        commands = {}
+        for command, calls in sorted(self.calls.items()):
+            histogram = self.commands.get(command)
+            commands[command] = {"calls": calls,
+                                 "errors": self.errors[command]}
+            if histogram is not None:
+                commands[command]["latency"] = histogram.summary()
+        result = {"uptime": time.time() - self.started,
+                  "gauges": dict(self.gauges), "commands": commands,
+                  "hot_paths": {name: histogram.summary() for name, histogram
+                                in sorted(self.hot_paths.items())},
+                  "caches": {name: stats() for name, stats
+                             in sorted(self._caches.items())}}
+        if self.capture is not None:
+            result["capture"] = {"target": self.capture,
+                                 "tool": self.capture_with,
+                                 "report": self.capture_report}
+        return result
+
+    # Return the metrics as text in a format of FORMATS.
+    def render(self, fmt = None):
+        fmt = fmt or self.format
+        if fmt not in FORMATS:
+            raise functions.PartException(f"{fmt} is not a metrics format.")
+        if fmt == "json":
+            return json.dumps(self.snapshot(), indent = 2) + "\n"
+        return _prometheus(self.snapshot())
+
+    # Write the metrics to the output file, or standard error if there is
+    # none.
+    def dump(self):
+        text = self.render()
+        if self.output:
+            with open(self.output, "w", encoding = "utf-8") as file:
+                file.write(text)
+        else:
+            sys.stderr.write(text)
+
+    # Add the options that turn metrics on to an argparse parser. Their
+    # defaults come from the STOREFRONT_PROFILE, STOREFRONT_PROFILE_OUTPUT and
+    # STOREFRONT_CAPTURE environment variables.
+    @staticmethod
+    def add_arguments(parser):
+        environ = os.environ
+        parser.add_argument("--profile", nargs = "?", const = "json",
+                            choices = FORMATS, metavar = "FORMAT",
+                            default = environ.get("STOREFRONT_PROFILE") or None,
+                            help = "record command latencies and write them "
+                                   "as json (the default) or prometheus on "
+                                   "exit")
+        parser.add_argument("--profile-output", metavar = "FILE",
+                            default = environ.get("STOREFRONT_PROFILE_OUTPUT"),
+                            help = "write metrics to this file instead of "
+                                   "standard error")
+        parser.add_argument("--capture", metavar = "TARGET",
+                            default = environ.get("STOREFRONT_CAPTURE"),
+                            help = "profile the first run of a command or hot "
+                                   "path, such as checkout or "
+                                   "functions.compatibility_build")
+        parser.add_argument("--capture-with", choices = CAPTURE_TOOLS,
+                            default = "cprofile",
+                            help = "the tool to capture with (default: "
+                                   "cprofile)")
+
+    # Return the instrumented Metrics asked for by the options of
+    # add_arguments, or None if metrics are off.
+    @classmethod
+    def from_args(cls, args):
+        if args.profile is None and args.capture is None:
+            return None
+        # STOREFRONT_PROFILE=1 asks for the default format.
+        fmt = args.profile if args.profile in FORMATS else "json"
+        metrics = cls(fmt, args.profile_output, args.capture,
+                      args.capture_with)
+        metrics.instrument()
+        return metrics
+
+# Return a label value escaped for Prometheus text.
+def _label(value):
+    return (str(value).replace("\\", "\\\\").replace("\"", "\\\"")
+            .replace("\n", "\\n"))
+
+# Return the lines of a Prometheus summary of latencies by label.
+def _summary(metric, help_text, label, latencies):
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+    for name, latency in latencies.items():
+        labels = f"{label}=\"{_label(name)}\""
+        for fraction in QUANTILES:
+            value = latency[f"p{fraction * 100:g}"]
+            lines.append(f"{metric}{{{labels},quantile=\"{fraction:g}\"}} "
+                         f"{value!r}")
+        total, count = latency["total"], latency["count"]
+        lines.append(f"{metric}_sum{{{labels}}} {total!r}")
+        lines.append(f"{metric}_count{{{labels}}} {count}")
+    return lines
+
+# Return a snapshot of the metrics as Prometheus text.
+def _prometheus(snapshot):
+    uptime = snapshot["uptime"]
+    lines = ["# HELP storefront_uptime_seconds Seconds since metrics began.",
+             "# TYPE storefront_uptime_seconds gauge",
+             f"storefront_uptime_seconds {uptime!r}"]
+    for name, value in snapshot["gauges"].items():
+        lines += [f"# TYPE storefront_{name} gauge",
+                  f"storefront_{name} {value!r}"]
+    commands = snapshot["commands"]
+    for metric, key, help_text in (
+            ("storefront_commands_total", "calls", "Commands run."),
+            ("storefront_command_errors_total", "errors", "Commands failed.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f"{metric}{{command=\"{_label(command)}\"}} {counts[key]}"
+                  for command, counts in commands.items()]
+    lines += _summary("storefront_command_seconds", "Command latency.",
+                      "command", {command: counts["latency"] for command, counts
+                                  in commands.items() if "latency" in counts})
+    lines += _summary("storefront_call_seconds", "Hot path latency.",
+                      "function", snapshot["hot_paths"])
+    for metric, key, kind in (("storefront_cache_hits_total", "hits",
+                               "counter"),
+                              ("storefront_cache_misses_total", "misses",
+                               "counter"),
+                              ("storefront_cache_hit_ratio", "hit_rate",
+                               "gauge")):
+        lines.append(f"# TYPE {metric} {kind}")
+        lines += [f"{metric}{{cache=\"{_label(name)}\"}} {stats[key]!r}"
+                  for name, stats in snapshot["caches"].items()]
+    capture = snapshot.get("capture")
+    if capture:
+        target, tool = capture["target"], capture["tool"]
+        lines.append(f"# capture of {target} with {tool}:")
+        lines += [f"# {line}" for line in capture["report"].splitlines()]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Holds money as whole cents, so prices, totals and budgets add up exactly.
+
+Amounts are turned into cents once, where they come in: when the inventory
+is loaded and when a budget is set. Everything after that is integer
+arithmetic, and an amount only becomes dollars again when it is shown to a
+customer or returned in a json result.
+"""
+
+from array import array
+from decimal import Decimal
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CENTS = 100
+# Fewest cart lines summed with NumPy; shorter carts are summed in Python,
+# which is faster for them.
+VECTOR_MIN = 100
+_INT64_MAX = (1 << 63) - 1
+# Largest amount taken in, a billion dollars, so that totals over any cart
+# stay far inside 64 bits.
+MAX_CENTS = 10 ** 9 * CENTS
+
+# Return an amount of dollars, given as an int, a float or a string such as
+# "19.99" or "$19.99", in cents. Raise ValueError if it is not a number, has
+# a fraction of a cent, or is below zero or above MAX_CENTS; with positive
+# set, zero is refused too, as for a budget.
+def to_cents(amount, positive = False):
+    if isinstance(amount, bool):
+        raise ValueError(f"{amount!r} is not an amount of money")
+    if isinstance(amount, int):
+        cents = amount * CENTS
+    else:
+        if isinstance(amount, float):
+            # The shortest repr is the decimal the float was written as.
+            text = repr(amount)
+        elif isinstance(amount, str):
+            text = amount.strip().removeprefix("$")
+        else:
+            raise ValueError(f"{amount!r} is not an amount of money")
+        try:
+            cents = Decimal(text) * CENTS
+        except ArithmeticError as exc:
+            raise ValueError(f"{amount!r} is not an amount of money") from exc
+        if not cents.is_finite():
+            raise ValueError(f"{amount!r} is not an amount of money")
+        if cents != cents.to_integral_value():
+            raise ValueError(f"{amount!r} is not a whole number of cents")
+    if cents < 0 or (positive and cents == 0):
+        raise ValueError(f"{amount!r} is not above zero" if positive else
+                         f"{amount!r} is below zero")
+    if cents > MAX_CENTS:
+        raise ValueError(f"{amount!r} is above "
+                         f"{format_cents(MAX_CENTS)}")
+    return int(cents)
+
+# Return an amount in cents as dollars for a json result: an int for whole
+# dollars, and otherwise the float nearest to the amount.
+def to_dollars(cents):
+    return cents // CENTS if cents % CENTS == 0 else cents / CENTS
+
+# Return an amount in cents as text, such as $19.99 or -$5.00.
+def format_cents(cents):
+    sign = "-" if cents < 0 else ""
+    dollars, cents = divmod(abs(cents), CENTS)
+    return f"{sign}${dollars}.{cents:02d}"
+
+class LineTotals:
+    """The price in cents, the units and the discount in cents of each line
+    of a cart, in arrays of 64-bit integers, so the cart's total is summed
+    in one pass.
+
+    Lines are keyed by anything hashable, such as a part ID or a computer.
+    A line set to no units gives its slot to the next new line.
+    """
+    __slots__ = ("_slots", "_free", "prices", "units", "discounts")
+
+    def __init__(self):
+        # Key -> slot in the arrays, and slots of lines set to no units.
+        self._slots = {}
+        self._free = []
+        self.prices = array("q")
+        self.units = array("q")
+        self.discounts = array("q")
+
+    def __len__(self):
+        return len(self._slots)
+
+    # Set the price, units and discount of a line, adding it if it is new
+    # and dropping it if it has no units.
+    def set(self, key, price, units, discount = 0):
+        slot = self._slots.get(key)
+        if not units:
+            if slot is not None:
+                del self._slots[key]
+                self._free.append(slot)
+                self.prices[slot] = self.units[slot] = 0
+                self.discounts[slot] = 0
+            return
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self.prices)
+                self.prices.append(0)
+                self.units.append(0)
+                self.discounts.append(0)
+            self._slots[key] = slot
+        self.prices[slot] = price
+        self.units[slot] = units
+        self.discounts[slot] = discount
+
+    # Return the sum of the discounts of every line.
+    def discount(self):
+        return sum(self.discounts)
+
+    # Return the sum of the price times the units of every line, less the
+    # discounts. Long carts are summed with NumPy when it is installed,
+    # unless the total might not fit in 64 bits.
+    def total(self):
+        if np is None or len(self.prices) < VECTOR_MIN:
+            return (sum(map(operator.mul, self.prices, self.units)) -
+                    self.discount())
+        prices = np.frombuffer(self.prices, np.int64)
+        units = np.frombuffer(self.units, np.int64)
+        if int(np.abs(prices).max()) * int(units.sum()) > _INT64_MAX:
+            return (sum(map(operator.mul, self.prices, self.units)) -
+                    self.discount())
+        return (int(np.dot(prices, units)) -
+                int(np.frombuffer(self.discounts, np.int64).sum()))
@@ -3,31 +3,285 @@
 Defines objects for storefront.py.
 """
 
+from array import array
+from collections import Counter
+from collections.abc import MutableMapping
+import sys
 from typing import List
 
+import money
+
+# Key of the line of line totals holding the bundles of loose parts.
+_LOOSE_BUNDLES = ("bundles",)
 
 class Customer:
-    """Class representing a customer."""
-    def __init__(self, name, budget):
+    """Class representing a customer. The budget is in cents."""
+    def __init__(self, name, budget, cart = None):
         self.name = name
         self.budget = budget
-        self.cart = []
-        self.total = 0
+        self.cart = Cart() if cart is None else cart
 
-    # Set the customer's budget.
+    # The price of everything in the cart, in cents, after discounts.
+    @property
+    def total(self):
+        return self.cart.total
+
+    # Set the customer's budget, in cents.
     def set_budget(self, amount):
         self.budget = amount
 
-    # View the current shopping cart.
-    def view_cart(self):
-        print("Shopping Cart:")
-        for item in self.cart:
-            print(f"\t{item}")
-        print(f"Total: ${self.total}.00")
-        print(f"Your budget: ${self.budget:.2f}\n")
+class Cart:
+    """Units of parts and built computers in a shopping cart.
+
+    Parts are counted by ID, so adding or removing units of a part costs the
+    same however many lines the cart holds, and the total price in cents,
+    power draw and item count are kept up to date as the cart changes. The
+    price and units of each line are also kept in a money.LineTotals, to sum
+    the total afresh at checkout. Stock reservations can be kept with the
+    items they hold.
+
+    Carts sharing a holders dictionary record in it which carts hold each
+    part ID, so a part that changes can be repriced in just those carts.
+
+    With a promotions.Promotions, the discount of a line is worked out again
+    whenever the line changes, and the total is kept net of the discounts.
+    Loose CPUs and motherboards that bundles cover are counted by bundle,
+    and a bundle is priced again from its counts when one of its lines
+    changes.
+    """
+    def __init__(self, holders = None, promotions = None):
+        self._holders = holders
+        self.promotions = promotions
+        self._reset()
+
+    def _reset(self):
+        # Part ID -> units in the cart, and part ID -> part.
+        self.counts = Counter()
+        self.parts = {}
+        # Computer ID -> Computer.
+        self.computers = {}
+        # Part ID -> [reservation, units] pairs, and computer ID ->
+        # reservations of its parts.
+        self.part_reservations = {}
+        self.computer_reservations = {}
+        self.line_totals = money.LineTotals()
+        # Part ID or computer -> discount of its line, if it has one.
+        self._discounts = {}
+        # The loose CPUs and motherboards bundles cover, and the price of
+        # their lines less the lines' discounts.
+        self._loose = (None if self.promotions is None else
+                       self.promotions.loose_bundles())
+        self._loose_value = 0
+        self.total = 0
+        self.discount = 0
+        self.power_draw = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, item_id):
+        return item_id in self.counts or item_id in self.computers
+
+    # Return each part and computer in the cart with its number of units.
+    def lines(self):
+        for part_id, count in self.counts.items():
+            yield self.parts[part_id], count
+        for computer in self.computers.values():
+            yield computer, 1
+
+    # Count a line of the cart holding a part ID in the holders dictionary.
+    def _hold(self, part_id):
+        if self._holders is not None:
+            carts = self._holders.setdefault(part_id, {})
+            carts[self] = carts.get(self, 0) + 1
+
+    # Undo _hold for a line of the cart that no longer holds a part ID. The
+    # part's entry is kept even when no cart holds it, so carts of other
+    # sessions can add to it at the same time.
+    def _unhold(self, part_id):
+        if self._holders is not None:
+            carts = self._holders[part_id]
+            carts[self] -= 1
+            if not carts[self]:
+                del carts[self]
+
+    # Set the discount of a line of units of a part or of a computer, and
+    # return it.
+    def _discount(self, key, units):
+        if self.promotions is None:
+            return 0
+        if not units:
+            discount = 0
+        elif isinstance(key, Computer):
+            discount = self.promotions.computer_discount(key)
+        else:
+            discount = self.promotions.line_discount(self.parts[key], units)
+        change = discount - self._discounts.pop(key, 0)
+        if discount:
+            self._discounts[key] = discount
+        self.discount += change
+        self.total -= change
+        return discount
+
+    # Take the loose units of a part out of the bundle counts, with sign -1,
+    # or count them again, with sign 1, if a bundle covers the part. Return
+    # whether one does.
+    def _count_loose(self, part_id, sign):
+        units = self.counts.get(part_id)
+        if self._loose is None or not units:
+            return False
+        if not self._loose.add(self.parts[part_id], sign * units):
+            return False
+        self._loose_value += sign * (self.parts[part_id].price * units -
+                                     self._discounts.get(part_id, 0))
+        return True
+
+    # Set the discount of the loose CPUs and motherboards bundles pair,
+    # which never takes their lines below nothing.
+    def _price_bundles(self):
+        discount = min(self._loose.discount, self._loose_value)
+        change = discount - self._discounts.pop(_LOOSE_BUNDLES, 0)
+        if discount:
+            self._discounts[_LOOSE_BUNDLES] = discount
+        self.line_totals.set(_LOOSE_BUNDLES, 0, 1 if discount else 0,
+                             discount)
+        self.discount += change
+        self.total -= change
+
+    # Add units of a part, with the stock reservations holding them.
+    def add(self, part, quantity = 1, reservations = ()):
+        if part.id not in self.counts:
+            self._hold(part.id)
+        bundled = self._count_loose(part.id, -1)
+        self.counts[part.id] += quantity
+        self.parts[part.id] = part
+        for reservation in reservations:
+            self.part_reservations.setdefault(part.id, []).append(
+                [reservation, reservation.quantity])
+        self.total += part.price * quantity
+        count = self.counts[part.id]
+        self.line_totals.set(part.id, part.price, count,
+                             self._discount(part.id, count))
+        if self._count_loose(part.id, 1) or bundled:
+            self._price_bundles()
+        self.power_draw += getattr(part, "power_draw", 0) * quantity
+        self.count += quantity
+
+    # Remove units of a part and return the (reservation, units) pairs that
+    # held them, newest first.
+    def remove(self, part_id, quantity = 1):
+        if self.counts[part_id] < quantity:
+            raise KeyError(part_id)
+        part = self.parts[part_id]
+        bundled = self._count_loose(part_id, -1)
+        self.counts[part_id] -= quantity
+        self.total -= part.price * quantity
+        count = self.counts[part_id]
+        self.line_totals.set(part_id, part.price, count,
+                             self._discount(part_id, count))
+        if self._count_loose(part_id, 1) or bundled:
+            self._price_bundles()
+        if not count:
+            del self.counts[part_id]
+            del self.parts[part_id]
+            self._unhold(part_id)
+        self.power_draw -= getattr(part, "power_draw", 0) * quantity
+        self.count -= quantity
+        released = []
+        held = self.part_reservations.get(part_id, [])
+        while quantity and held:
+            units = min(quantity, held[-1][1])
+            released.append((held[-1][0], units))
+            held[-1][1] -= units
+            quantity -= units
+            if not held[-1][1]:
+                held.pop()
+        if not held:
+            self.part_reservations.pop(part_id, None)
+        return released
+
+    # Add a built computer, with the stock reservations holding its parts.
+    def add_computer(self, computer, reservations = ()):
+        self.computers[computer.id] = computer
+        for part_id in {part.id for part in computer.parts()}:
+            self._hold(part_id)
+        if reservations:
+            self.computer_reservations[computer.id] = list(reservations)
+        self.total += computer.price
+        self.line_totals.set(computer, computer.price, 1,
+                             self._discount(computer, 1))
+        self.power_draw += computer.power_draw
+        self.count += 1
+
+    # Remove a computer and return the stock reservations of its parts.
+    def remove_computer(self, computer_id):
+        computer = self.computers.pop(computer_id)
+        for part_id in {part.id for part in computer.parts()}:
+            self._unhold(part_id)
+        self.line_totals.set(computer, computer.price, 0)
+        self._discount(computer, 0)
+        self.total -= computer.price
+        self.power_draw -= computer.power_draw
+        self.count -= 1
+        return [(reservation, reservation.quantity) for reservation
+                in self.computer_reservations.pop(computer_id, [])]
+
+    # Return every stock reservation held by the cart.
+    def reservations(self):
+        held = [reservation for pairs in self.part_reservations.values()
+                for reservation, _ in pairs]
+        for reservations in self.computer_reservations.values():
+            held.extend(reservations)
+        return held
+
+    # Replace a part with a changed part of the same ID, wherever the cart
+    # holds it, and update the running totals.
+    def reprice(self, part):
+        if part.id in self.counts:
+            old = self.parts[part.id]
+            count = self.counts[part.id]
+            bundled = self._count_loose(part.id, -1)
+            self.parts[part.id] = part
+            self.total += (part.price - old.price) * count
+            self.line_totals.set(part.id, part.price, count,
+                                 self._discount(part.id, count))
+            if self._count_loose(part.id, 1) or bundled:
+                self._price_bundles()
+            self.power_draw += (getattr(part, "power_draw", 0) -
+                                getattr(old, "power_draw", 0)) * count
+        for computer in self.computers.values():
+            price, power_draw = computer.price, computer.power_draw
+            if computer.replace(part):
+                self.total += computer.price - price
+                self.line_totals.set(computer, computer.price, 1,
+                                     self._discount(computer, 1))
+                self.power_draw += computer.power_draw - power_draw
+
+    # Remove every unit of a part and every computer built with it, and
+    # return the (reservation, units) pairs that held them.
+    def discard(self, part_id):
+        released = []
+        if part_id in self.counts:
+            released.extend(self.remove(part_id, self.counts[part_id]))
+        for computer in list(self.computers.values()):
+            if any(part.id == part_id for part in computer.parts()):
+                released.extend(self.remove_computer(computer.id))
+        return released
+
+    # Empty the cart.
+    def clear(self):
+        for part_id in self.counts:
+            self._unhold(part_id)
+        for computer in self.computers.values():
+            for part_id in {part.id for part in computer.parts()}:
+                self._unhold(part_id)
+        self._reset()
 
 class Component:
-    """Class representing a computer component."""
+    """Class representing a computer component, priced in cents."""
+    __slots__ = ("id", "type", "name", "price")
+
     def __init__(self, component_id, component_type, name, price):
         self.id = component_id
         self.type = component_type
@@ -38,12 +292,15 @@ class Component:
         return (f"ID: {self.id}\n"
                 f"\tType: {self.type}\n"
                 f"\tName: {self.name}\n"
-                f"\tPrice: ${self.price}.00\n")
+                f"\tPrice: {money.format_cents(self.price)}\n")
 
     def __str__(self):
         return f"{self.id}"
 
 class CPU(Component):
+    """Class representing a CPU."""
+    __slots__ = ("power_draw", "socket")
+
     def __init__(self, cpu_id, cpu_type, name, price, power_draw, socket):
         super().__init__(cpu_id, cpu_type, name, price)
         self.power_draw = power_draw
@@ -54,6 +311,9 @@ class CPU(Component):
                                     f"\tSocket: {self.socket}\n")
 
 class GPU(Component):
+    """Class representing a GPU."""
+    __slots__ = ("power_draw", "overclockable")
+
     def __init__(self, gpu_id, gpu_type, name, price, power_draw,
                  overclockable):
         super().__init__(gpu_id, gpu_type, name, price)
@@ -65,6 +325,9 @@ class GPU(Component):
                                     f"\tOverclockable: {self.overclockable}\n")
 
 class RAM(Component):
+    """Class representing a stick of RAM."""
+    __slots__ = ("power_draw", "capacity")
+
     def __init__(self, ram_id, ram_type, name, price, power_draw, capacity):
         super().__init__(ram_id, ram_type, name, price)
         self.power_draw = power_draw
@@ -75,6 +338,9 @@ class RAM(Component):
                                     f"\tCapacity: {self.capacity}GB\n")
 
 class PSU(Component):
+    """Class representing a power supply."""
+    __slots__ = ("power_supplied",)
+
     def __init__(self, psu_id, psu_type, name, price, power_supplied):
         super().__init__(psu_id, psu_type, name, price)
         self.power_supplied = power_supplied
@@ -83,6 +349,9 @@ class PSU(Component):
         return super().details() + f"\tPower Supplied: {self.power_supplied}W\n"
 
 class Motherboard(Component):
+    """Class representing a motherboard."""
+    __slots__ = ("power_draw", "socket", "ram_slots")
+
     def __init__(self, mb_id, mb_type, name, price, power_draw, socket,
                  ram_slots):
         super().__init__(mb_id, mb_type, name, price)
@@ -96,6 +365,9 @@ class Motherboard(Component):
                                     f"\tRam Slots: {self.ram_slots}\n")
 
 class Storage(Component):
+    """Class representing a storage drive."""
+    __slots__ = ("capacity",)
+
     def __init__(self, storage_id, storage_type, name, price, capacity):
         super().__init__(storage_id, storage_type, name, price)
         self.capacity = capacity
@@ -103,11 +375,204 @@ class Storage(Component):
     def details(self):
         return super().details() + f"\tCapacity: {self.capacity}GB\n"
 
+# Array typecodes for the numeric fields kept by PartStore. Socket strings are
+# interned and stored as indexes into the store's string table; any other
+# field is kept in a plain list.
+_COLUMN_TYPECODES = {"price": "q", "power_draw": "l", "capacity": "l",
+                     "power_supplied": "l", "ram_slots": "H",
+                     "overclockable": "b"}
+_INTERNED_FIELDS = {"socket"}
+
+class _PackedStrings:
+    """List-like sequence of strings packed into one UTF-8 buffer."""
+    __slots__ = ("_data", "_starts", "_lengths")
+
+    def __init__(self):
+        self._data = bytearray()
+        self._starts = array("Q")
+        self._lengths = array("L")
+
+    def append(self, value):
+        encoded = value.encode("utf-8")
+        self._starts.append(len(self._data))
+        self._lengths.append(len(encoded))
+        self._data += encoded
+
+    # Replacing a string appends the new value; the old bytes are not reused.
+    def __setitem__(self, index, value):
+        encoded = value.encode("utf-8")
+        self._starts[index] = len(self._data)
+        self._lengths[index] = len(encoded)
+        self._data += encoded
+
+    def __getitem__(self, index):
+        start = self._starts[index]
+        return self._data[start:start + self._lengths[index]].decode("utf-8")
+
+    def __len__(self):
+        return len(self._starts)
+
+class _Category:
+    """Columns holding every part of one type in a PartStore. The rows of
+    deleted parts hold None as their ID until a new part reuses them."""
+    __slots__ = ("type", "component_class", "fields", "ids", "names",
+                 "columns", "free")
+
+    def __init__(self, component_class, part_type):
+        self.type = part_type
+        self.component_class = component_class
+        # Fields in constructor order, after the id, type and name.
+        self.fields = tuple(field for klass in reversed(component_class.__mro__)
+                            for field in getattr(klass, "__slots__", ())
+                            if field not in ("id", "type", "name"))
+        self.ids = []
+        self.names = _PackedStrings()
+        self.columns = {}
+        for field in self.fields:
+            if field in _COLUMN_TYPECODES:
+                self.columns[field] = array(_COLUMN_TYPECODES[field])
+            elif field in _INTERNED_FIELDS:
+                self.columns[field] = array("H")
+            else:
+                self.columns[field] = []
+        # Rows of deleted parts, to reuse.
+        self.free = []
+
+class PartStore(MutableMapping):
+    """Columnar store mapping part IDs to parts.
+
+    Numeric fields of each category are kept in typed arrays and socket
+    strings are interned, so a large catalog costs a few bytes per field
+    instead of a full object per part. Looking up a part builds a new
+    Component from its row, so a part looked up stays as it was when the
+    store changes. Deleting a part frees its row for the next part of its
+    type.
+    """
+    # Number of low bits of a location code holding the category number.
+    _CATEGORY_BITS = 4
+
+    def __init__(self, parts = ()):
+        self.strings = []
+        self._string_ids = {}
+        self._categories = []
+        self._category_numbers = {}
+        self._locations = {}
+        for part in parts:
+            self.add(part)
+
+    # Return the string table index of value, adding it if needed.
+    def intern(self, value):
+        index = self._string_ids.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(sys.intern(value))
+            self._string_ids[value] = index
+        return index
+
+    # Copy a component into the store's columns.
+    def add(self, part: Component):
+        if part.id in self._locations:
+            raise KeyError(f"{part.id} is already in the store.")
+        number = self._category_numbers.get(part.type)
+        if number is None:
+            number = len(self._categories)
+            if number >= 1 << self._CATEGORY_BITS:
+                raise ValueError("Too many part categories.")
+            self._categories.append(_Category(type(part), part.type))
+            self._category_numbers[part.type] = number
+        category = self._categories[number]
+
+        if category.free:
+            row = category.free.pop()
+            category.ids[row] = part.id
+            category.names[row] = part.name
+        else:
+            row = len(category.ids)
+            category.ids.append(part.id)
+            category.names.append(part.name)
+            for column in category.columns.values():
+                column.append(0)
+        self._write(category, row, part)
+        self._locations[part.id] = row << self._CATEGORY_BITS | number
+
+    # Copy the fields of a part after its name into a row of its category.
+    def _write(self, category, row, part):
+        for field in category.fields:
+            value = getattr(part, field)
+            if field in _INTERNED_FIELDS:
+                value = self.intern(value)
+            category.columns[field][row] = value
+
+    # Return the IDs of every part of the given type, by row, with None at
+    # the rows of deleted parts.
+    def ids(self, part_type):
+        number = self._category_numbers.get(part_type)
+        if number is None:
+            return []
+        return self._categories[number].ids
+
+    # Return the numeric column of a field for every part of the given type,
+    # by row as ids() lists them.
+    def column(self, part_type, field):
+        return self._categories[self._category_numbers[part_type]].columns[
+            field]
+
+    # Store a part under its ID, overwriting the fields of an existing part
+    # of the same type, or replacing a part of another type.
+    def __setitem__(self, part_id, part: Component):
+        if part_id != part.id:
+            raise KeyError(f"{part_id} does not match part ID {part.id}.")
+        if (part_id in self._locations and
+                self._locate(part_id)[0].type != part.type):
+            del self[part_id]
+        if part_id not in self._locations:
+            self.add(part)
+            return
+        category, row = self._locate(part_id)
+        category.names[row] = part.name
+        self._write(category, row, part)
+
+    # Return the category and row of a part.
+    def _locate(self, part_id):
+        code = self._locations[part_id]
+        return (self._categories[code & ((1 << self._CATEGORY_BITS) - 1)],
+                code >> self._CATEGORY_BITS)
+
+    def __getitem__(self, part_id):
+        category, row = self._locate(part_id)
+        values = []
+        for field in category.fields:
+            value = category.columns[field][row]
+            if field in _INTERNED_FIELDS:
+                value = self.strings[value]
+            elif _COLUMN_TYPECODES.get(field) == "b":
+                value = bool(value)
+            values.append(value)
+        return category.component_class(part_id, category.type,
+                                        category.names[row], *values)
+
+    # Remove a part, freeing its row. Its name stays in the packed names
+    # until the row is reused.
+    def __delitem__(self, part_id):
+        category, row = self._locate(part_id)
+        del self._locations[part_id]
+        category.ids[row] = None
+        category.free.append(row)
+
+    def __contains__(self, part_id):
+        return part_id in self._locations
+
+    def __iter__(self):
+        return iter(self._locations)
+
+    def __len__(self):
+        return len(self._locations)
+
 class Computer():
     """Class representing a computer."""
     def __init__(self, cid, motherboard: Motherboard, rams: List[RAM],
                  cpu: CPU, psu: PSU, storage: Storage, storage2: Storage = None,
-                 gpu: GPU = None):
+                 gpu: GPU = None, totals = None):
         self.id = cid
         self.motherboard = motherboard
         self.rams = rams
@@ -117,7 +582,15 @@ class Computer():
         self.storage2 = storage2
         self.gpu = gpu
 
-        # Calculate total power draw and total price.
+        # Use the (price, power draw) given, such as from a build cache, or
+        # add them up.
+        if totals is None:
+            self._add_up()
+        else:
+            self.price, self.power_draw = totals
+
+    # Calculate total power draw and total price.
+    def _add_up(self):
         self.power_draw = self.motherboard.power_draw + self.cpu.power_draw
         self.price = self.motherboard.price + self.cpu.price + self.psu.price \
                      + self.storage.price
@@ -130,6 +603,34 @@ class Computer():
             self.power_draw += self.gpu.power_draw
             self.price += self.gpu.price
 
+    # Swap in a changed part for every part with its ID, recalculating the
+    # totals. Return whether the computer had the part.
+    def replace(self, part):
+        found = False
+        for field in ("motherboard", "cpu", "psu", "storage", "storage2",
+                      "gpu"):
+            current = getattr(self, field)
+            if current is not None and current.id == part.id:
+                setattr(self, field, part)
+                found = True
+        if any(ram.id == part.id for ram in self.rams):
+            self.rams = [part if ram.id == part.id else ram
+                         for ram in self.rams]
+            found = True
+        if found:
+            self._add_up()
+        return found
+
+    # Return every part in the computer, with each RAM stick listed.
+    def parts(self):
+        parts = [self.motherboard, *self.rams, self.cpu, self.psu,
+                 self.storage]
+        if self.storage2:
+            parts.append(self.storage2)
+        if self.gpu:
+            parts.append(self.gpu)
+        return parts
+
     def details(self):
         dets = (f"ID: {self.id}\n"
                f"\tMotherboard: {self.motherboard.id}\n"
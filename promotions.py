@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Takes promotions off carts: percentages off, multi-buys, and bundles of a
+CPU with a motherboard, read from a json file such as
+
+    {"promotions": [
+        {"name": "10% off GPUs", "type": "percent", "percent": 10,
+         "parts": {"category": "GPU"}},
+        {"name": "RAM 3 for 2", "type": "multibuy", "buy": 3, "pay": 2,
+         "parts": {"category": "RAM"}},
+        {"name": "AM5 bundle", "type": "bundle", "amount": 50,
+         "cpu": {"socket": "AM5"}, "motherboard": {"socket": "AM5"}}]}
+
+Parts are picked by "category", "socket" and a list of "ids", each
+optional; a part must match all of those given. Amounts are in dollars.
+
+Percentages and multi-buys are offers on the units of a cart line: the
+units of a loose part, or the units of one part within a computer. Offers
+do not stack; where several cover a line, the one saving the most applies.
+A bundle comes off each computer built with a CPU and a motherboard it
+covers, as an amount or a percent of their prices, on top of the offers on
+its parts; where several bundles cover a computer, the one saving the most
+applies. Loose CPUs and motherboards in a cart are paired off by bundles
+too, each pair by the best bundle covering both, dividing units that
+several bundles cover between them to save the most. A line never costs
+less than nothing, nor do the loose lines bundles pair.
+
+The rules are compiled into a table of offers for each kind of part, by
+type and socket, and for each part named by ID, so a cart line is repriced
+with one lookup and a little integer arithmetic, whatever the number of
+promotions.
+"""
+
+import bisect
+import json
+from typing import NamedTuple, Tuple
+
+import functions
+import money
+
+# Fields a selector of parts can have.
+_SELECTOR_FIELDS = {"category", "socket", "ids"}
+# Side of a bundle of each type of part it pairs.
+_BUNDLE_SIDES = {"CPU": 0, "Motherboard": 1}
+
+class Offers(NamedTuple):
+    """The promotions covering a kind of part: its best percent off, in
+    hundredths of a percent, its multi-buys as (buy, pay) pairs, and a bit
+    for each bundle whose CPU or motherboard it can be."""
+    percent: int
+    multibuys: Tuple
+    bundles: int
+
+_NO_OFFERS = Offers(0, (), 0)
+
+class _Bundle(NamedTuple):
+    name: str
+    amount: int
+    percent: int
+
+# Return a percentage, such as 12.5, in hundredths of a percent.
+def _hundredths(rule, name):
+    try:
+        # A percent has the same digits as an amount of dollars.
+        hundredths = money.to_cents(rule["percent"])
+    except ValueError as exc:
+        raise functions.PartException(f"Promotion {name!r} needs a percent "
+                                      f"to at most two places.") from exc
+    if not 0 < hundredths <= 100 * 100:
+        raise functions.PartException(f"Promotion {name!r} needs a percent "
+                                      f"above 0 and at most 100.")
+    return hundredths
+
+# Return a selector of parts with its IDs as a set, checking its fields.
+def _selector(rule, field, name, category = None):
+    selector = rule.get(field, {})
+    if not isinstance(selector, dict) or selector.keys() - _SELECTOR_FIELDS:
+        raise functions.PartException(f"Promotion {name!r} picks parts by "
+                                      f"category, socket and ids only.")
+    selector = dict(selector)
+    if category is not None:
+        if selector.get("category", category) != category:
+            raise functions.PartException(f"Promotion {name!r} needs a "
+                                          f"{category} for its {field}.")
+        selector["category"] = category
+    if selector.get("category", category) not in (*functions.PART_SCHEMAS,
+                                                  None):
+        raise functions.PartException(f"Promotion {name!r} picks an unknown "
+                                      f"category {selector['category']!r}.")
+    if "ids" in selector:
+        if not isinstance(selector["ids"], list):
+            raise functions.PartException(f"Promotion {name!r} needs a list "
+                                          f"of part IDs.")
+        selector["ids"] = {str(part_id).upper() for part_id
+                           in selector["ids"]}
+    return selector
+
+# Return whether a selector picks a part of a kind, given as its type and
+# socket, and its ID if the part is named by a promotion.
+def _matches(selector, part_type, socket, part_id):
+    return (selector.get("category", part_type) == part_type and
+            selector.get("socket", socket) == socket and
+            ("ids" not in selector or part_id in selector["ids"]))
+
+class Promotions:
+    """A list of promotions compiled for repricing cart lines.
+
+    line_discount() and computer_discount() return what a line of a cart
+    saves, in cents, and loose_bundles() counts what a cart's loose CPUs
+    and motherboards save together; objects.Cart keeps the discount of
+    each line as the cart changes. Tables are compiled for every kind of
+    part when the promotions are made, and for the parts named by ID when
+    an inventory is given; anything else is compiled the first time it is
+    looked up.
+    """
+    def __init__(self, rules, inventory = None):
+        # (selector, hundredths of a percent) and (selector, buy, pay).
+        self._percents = []
+        self._multibuys = []
+        # Bundles, with a (CPU selector, motherboard selector) for each.
+        self.bundles = []
+        self._bundle_selectors = []
+        for rule in rules:
+            self._add(rule)
+        self.names = [rule["name"] for rule in rules]
+        selectors = [selector for selector, *_ in self._percents +
+                     self._multibuys]
+        selectors += [selector for pair in self._bundle_selectors
+                      for selector in pair]
+        # Sockets no selector names share one table.
+        self._sockets = {selector["socket"] for selector in selectors
+                         if "socket" in selector}
+        self._ids = set().union(*(selector.get("ids", ())
+                                  for selector in selectors))
+        # (type, socket) -> Offers, and (part ID, type, socket) -> Offers.
+        self._kinds = {}
+        self._named = {}
+        for part_type in functions.PART_SCHEMAS:
+            for socket in (*self._sockets, None):
+                self._kinds[part_type, socket] = self._compile(
+                    part_type, socket, None)
+        for part_id in self._ids:
+            if inventory is not None and part_id in inventory:
+                self.offers(inventory[part_id])
+
+    def __len__(self):
+        return len(self.names)
+
+    # Check a promotion and add it to the lists it belongs in.
+    def _add(self, rule):
+        if not isinstance(rule, dict) or not isinstance(rule.get("name"),
+                                                        str):
+            raise functions.PartException("Every promotion needs a name.")
+        name = rule["name"]
+        kind = rule.get("type")
+        if kind == "percent":
+            self._percents.append((_selector(rule, "parts", name),
+                                   _hundredths(rule, name)))
+        elif kind == "multibuy":
+            buy, pay = rule.get("buy"), rule.get("pay")
+            if not (isinstance(buy, int) and isinstance(pay, int) and
+                    0 < pay < buy):
+                raise functions.PartException(f"Promotion {name!r} needs "
+                                              f"whole numbers to buy and "
+                                              f"pay for, paying for fewer.")
+            self._multibuys.append((_selector(rule, "parts", name), buy,
+                                    pay))
+        elif kind == "bundle":
+            if ("amount" in rule) == ("percent" in rule):
+                raise functions.PartException(f"Promotion {name!r} needs "
+                                              f"an amount or a percent.")
+            amount = percent = 0
+            if "amount" in rule:
+                try:
+                    amount = money.to_cents(rule["amount"], positive = True)
+                except ValueError as exc:
+                    raise functions.PartException(
+                        f"Promotion {name!r} needs an amount of dollars, to "
+                        f"the cent.") from exc
+            else:
+                percent = _hundredths(rule, name)
+            self.bundles.append(_Bundle(name, amount, percent))
+            self._bundle_selectors.append(
+                (_selector(rule, "cpu", name, "CPU"),
+                 _selector(rule, "motherboard", name, "Motherboard")))
+        else:
+            raise functions.PartException(f"Promotion {name!r} has an "
+                                          f"unknown type {kind!r}.")
+
+    # Return the Offers for a kind of part, and a part ID if it is named.
+    def _compile(self, part_type, socket, part_id):
+        percent = max((hundredths for selector, hundredths in self._percents
+                       if _matches(selector, part_type, socket, part_id)),
+                      default = 0)
+        multibuys = tuple(sorted({(buy, pay) for selector, buy, pay
+                                  in self._multibuys
+                                  if _matches(selector, part_type, socket,
+                                              part_id)}))
+        bundles = 0
+        side = {"CPU": 0, "Motherboard": 1}.get(part_type)
+        if side is not None:
+            for bit, selectors in enumerate(self._bundle_selectors):
+                if _matches(selectors[side], part_type, socket, part_id):
+                    bundles |= 1 << bit
+        if not (percent or multibuys or bundles):
+            return _NO_OFFERS
+        return Offers(percent, multibuys, bundles)
+
+    # Return the Offers covering a part.
+    def offers(self, part):
+        socket = getattr(part, "socket", None)
+        if socket not in self._sockets:
+            socket = None
+        if part.id not in self._ids:
+            offers = self._kinds.get((part.type, socket))
+            if offers is None:
+                offers = self._kinds[part.type, socket] = self._compile(
+                    part.type, socket, None)
+            return offers
+        key = (part.id, part.type, socket)
+        offers = self._named.get(key)
+        if offers is None:
+            offers = self._named[key] = self._compile(part.type, socket,
+                                                      part.id)
+        return offers
+
+    # Return what units of a part save, in cents, from the best offer on
+    # them.
+    def line_discount(self, part, units):
+        offers = self.offers(part)
+        if not units or offers is _NO_OFFERS:
+            return 0
+        price = part.price
+        # Round half a cent up.
+        best = (price * units * offers.percent + 5000) // 10000
+        for buy, pay in offers.multibuys:
+            best = max(best, units // buy * (buy - pay) * price)
+        return min(best, price * units)
+
+    # Return what a computer saves, in cents: the offers on its parts, by
+    # part ID, and its best bundle.
+    def computer_discount(self, computer):
+        units = {}
+        parts = {}
+        for part in computer.parts():
+            units[part.id] = units.get(part.id, 0) + 1
+            parts[part.id] = part
+        discount = sum(self.line_discount(parts[part_id], count)
+                       for part_id, count in units.items())
+        cpu, motherboard = computer.cpu, computer.motherboard
+        bundles = (self.offers(cpu).bundles &
+                   self.offers(motherboard).bundles)
+        best = 0
+        while bundles:
+            bit = bundles & -bundles
+            bundles ^= bit
+            bundle = self.bundles[bit.bit_length() - 1]
+            best = max(best, bundle.amount or
+                       ((cpu.price + motherboard.price) * bundle.percent +
+                        5000) // 10000)
+        return min(discount + best, computer.price)
+
+    # Return a LooseBundles for the loose parts of a cart.
+    def loose_bundles(self):
+        return LooseBundles(self)
+
+class LooseBundles:
+    """The loose CPUs and motherboards of a cart that bundles cover, and
+    what their bundles save, in cents.
+
+    Units and prices are counted by side and by the bundles covering them,
+    as a bit mask, and bundles that share a unit are priced together, so a
+    change reprices just the bundles its part is linked to. A bundle no
+    unit shares with another pairs as many units as the side with fewer
+    has, the dearest units of the other side making up the pairs, and
+    takes a percent off the pairs' prices together. Linked bundles divide
+    their units between them to save the most, as _pair_off works out.
+    """
+    def __init__(self, promotions):
+        self.promotions = promotions
+        # (bundle bits, side) -> price -> units, the prices in order, and
+        # [units, price of the units].
+        self._units = {}
+        self._prices = {}
+        self._totals = {}
+        # Bits of linked bundles -> what their pairs save.
+        self._discounts = {}
+        self.discount = 0
+
+    # Count units of a part, or take them off if units is negative, and
+    # return whether a bundle covers it.
+    def add(self, part, units):
+        side = _BUNDLE_SIDES.get(part.type)
+        bundles = 0 if side is None else self.promotions.offers(part).bundles
+        if not bundles:
+            return False
+        key = (bundles, side)
+        counts = self._units.setdefault(key, {})
+        prices = self._prices.setdefault(key, [])
+        totals = self._totals.setdefault(key, [0, 0])
+        price = part.price
+        if price not in counts:
+            counts[price] = 0
+            bisect.insort(prices, price)
+        counts[price] += units
+        if not counts[price]:
+            del counts[price]
+            del prices[bisect.bisect_left(prices, price)]
+        totals[0] += units
+        totals[1] += price * units
+        if not totals[0]:
+            del self._units[key], self._prices[key], self._totals[key]
+        # The bundles linked to the part's may have split or joined.
+        linked = self._linked(bundles)
+        for group in [group for group in self._discounts if group & linked]:
+            self.discount -= self._discounts.pop(group)
+        while linked:
+            group = self._linked(linked & -linked)
+            linked &= ~group
+            discount = self._price(group)
+            if discount:
+                self._discounts[group] = discount
+                self.discount += discount
+        return True
+
+    # Return the bits of the given bundles and of every bundle linked to
+    # them by units they share.
+    def _linked(self, bundles):
+        grown = True
+        while grown:
+            grown = False
+            for mask, _ in self._units:
+                if mask & bundles and mask | bundles != bundles:
+                    bundles |= mask
+                    grown = True
+        return bundles
+
+    # Return the price of the dearest units of one side of a bundle.
+    def _dearest(self, key, wanted):
+        units, total = self._totals[key]
+        counts = self._units[key]
+        prices = self._prices[key]
+        # Sum whichever are fewer: the dearest units wanted, or the cheapest
+        # units left over, to take off the total.
+        cheapest = units - wanted < wanted
+        left = units - wanted if cheapest else wanted
+        summed = 0
+        for price in (prices if cheapest else reversed(prices)):
+            if not left:
+                break
+            taken = min(left, counts[price])
+            summed += price * taken
+            left -= taken
+        return total - summed if cheapest else summed
+
+    # Return what the pairs of linked bundles save.
+    def _price(self, group):
+        if group & (group - 1):
+            return self._pair_linked(group)
+        pairs = min(self._totals.get((group, 0), (0,))[0],
+                    self._totals.get((group, 1), (0,))[0])
+        if not pairs:
+            return 0
+        bundle = self.promotions.bundles[group.bit_length() - 1]
+        if bundle.amount:
+            return pairs * bundle.amount
+        # Round half a cent up.
+        return ((self._dearest((group, 0), pairs) +
+                 self._dearest((group, 1), pairs)) * bundle.percent +
+                5000) // 10000
+
+    # Return what the pairs of several linked bundles save, pairing each
+    # CPU and motherboard by the best bundle covering both.
+    def _pair_linked(self, group):
+        sides = ([], [])
+        for (mask, side), counts in self._units.items():
+            if mask & group:
+                sides[side].extend((units, (mask, price))
+                                   for price, units in counts.items())
+        bundles = self.promotions.bundles
+
+        # Return the most a pair saves, in hundredths of a cent, and the
+        # bundle saving it, or None if no bundle covers both.
+        def saving(cpu, motherboard):
+            shared = cpu[0] & motherboard[0]
+            best = None
+            while shared:
+                bit = shared & -shared
+                shared ^= bit
+                number = bit.bit_length() - 1
+                bundle = bundles[number]
+                saved = (bundle.amount * 10000 if bundle.amount else
+                         (cpu[1] + motherboard[1]) * bundle.percent)
+                if best is None or saved > best[0]:
+                    best = (saved, number)
+            return best
+
+        saved = _pair_off(sides[0], sides[1], saving)
+        # Round half a cent up, once for each bundle.
+        return sum((hundredths + 5000) // 10000
+                   for hundredths in saved.values())
+
+# Pair off units of CPUs and motherboards, given as (units, key) lists, to
+# save the most, where saving(CPU key, motherboard key) returns what a pair
+# saves and the bundle saving it, or None if they cannot pair. Return what
+# the pairs of each bundle save. The pairing is a flow from the CPUs to the
+# motherboards, grown along the path saving the most while one saves
+# anything.
+def _pair_off(cpus, motherboards, saving):
+    # Nodes are the source, the sink, the CPUs and the motherboards, and
+    # edges [node, capacity, saving, position of the reverse edge, bundle].
+    graph = [[] for _ in range(2 + len(cpus) + len(motherboards))]
+
+    def link(start, end, capacity, saved = 0, bundle = None):
+        graph[start].append([end, capacity, saved, len(graph[end]), bundle])
+        graph[end].append([start, 0, -saved, len(graph[start]) - 1, None])
+
+    for row, (units, _) in enumerate(cpus):
+        link(0, 2 + row, units)
+    for column, (units, _) in enumerate(motherboards):
+        link(2 + len(cpus) + column, 1, units)
+    for row, (cpu_units, cpu) in enumerate(cpus):
+        for column, (board_units, motherboard) in enumerate(motherboards):
+            paired = saving(cpu, motherboard)
+            if paired is not None:
+                link(2 + row, 2 + len(cpus) + column,
+                     min(cpu_units, board_units), *paired)
+    while True:
+        # The path saving the most, found as Bellman-Ford would; paths
+        # taken so far leave no cycle that saves anything.
+        best = [None] * len(graph)
+        best[0] = 0
+        via = [None] * len(graph)
+        grown = True
+        while grown:
+            grown = False
+            for node, edges in enumerate(graph):
+                if best[node] is None:
+                    continue
+                for position, (end, capacity, saved, *_) in enumerate(edges):
+                    if capacity and (best[end] is None or
+                                     best[node] + saved > best[end]):
+                        best[end] = best[node] + saved
+                        via[end] = (node, position)
+                        grown = True
+        if best[1] is None or best[1] <= 0:
+            break
+        path = []
+        node = 1
+        while node:
+            node, position = via[node]
+            path.append(graph[node][position])
+        flow = min(edge[1] for edge in path)
+        for edge in path:
+            edge[1] -= flow
+            graph[edge[0]][edge[3]][1] += flow
+    saved = {}
+    for edges in graph:
+        for end, _, value, reverse, bundle in edges:
+            if bundle is not None:
+                saved[bundle] = (saved.get(bundle, 0) +
+                                 graph[end][reverse][1] * value)
+    return saved
+
+# Load the promotions of a json file, compiling them for the parts of an
+# inventory if one is given.
+def load_promotions(json_file, inventory = None):
+    try:
+        with open(json_file, encoding = "utf-8") as file:
+            rules = json.load(file)["promotions"]
+    except OSError as exc:
+        raise functions.PartException(f"Cannot read promotions from "
+                                      f"{json_file}: {exc.strerror}.") from exc
+    except (ValueError, KeyError, TypeError) as exc:
+        raise functions.PartException(f"{json_file} does not hold a list of "
+                                      f"promotions.") from exc
+    if not isinstance(rules, list):
+        raise functions.PartException(f"{json_file} does not hold a list of "
+                                      f"promotions.")
+    return Promotions(rules, inventory)
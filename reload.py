@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Watches an inventory for changes and applies them to a running store.
+
+Two sources are watched. When inventory.json itself changes, it is read
+again and compared with the live inventory, and only the parts that were
+added, removed or changed are applied. A delta file, by default
+inventory.delta.jsonl beside it, can be appended to instead; each line is
+either {"item": {...}}, adding or replacing a part just as in
+inventory.json, or {"remove": "PART_ID"}. Only the lines appended since the
+last check are read, so applying a delta costs as much as the change rather
+than the catalog.
+
+Changes are applied holding the store's lock exclusive, so commands see
+either the old inventory or the new one. The index is updated in place,
+carts holding a changed part are repriced, carts holding a removed part
+drop it along with any computer built from it, cached builds using either
+are dropped, and the search index follows. The recommendation catalog and compatibility
+matrix, where they are built, are updated for the changed parts only.
+"""
+
+import json
+import os
+import sys
+import threading
+
+import functions
+
+# Return the delta file path used for a json inventory file.
+def delta_path(json_file):
+    return os.path.splitext(json_file)[0] + ".delta.jsonl"
+
+# Return a file's modification time and size, or None if it is missing.
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+# Return whether a part already matches an inventory item.
+def _same(part, item):
+    try:
+        constructor, fields = functions.part_schema(item)
+        return (isinstance(part, constructor) and part.name == item["name"] and
+                part.price == functions.part_price(item) and
+                all(getattr(part, field) == item[field] for field in fields))
+    except (KeyError, functions.PartException):
+        return False
+
+class InventoryWatcher:
+    """Applies changes to an inventory's json and delta files to a store."""
+    def __init__(self, store, json_file, delta_file = None, interval = 1.0):
+        self.store = store
+        self.json_file = json_file
+        self.delta_file = delta_path(json_file) if delta_file is None \
+            else delta_file
+        self.interval = interval
+        self._json_signature = _signature(json_file)
+        self._delta_offset = 0
+        # Part ID -> the stock count last read for it, so a new count can be
+        # applied as a difference without disturbing reservations.
+        self._stock = {}
+        if self._json_signature is not None:
+            for item in functions.iter_inventory_items(json_file):
+                if "stock" in item:
+                    self._stock[item["id"]] = item["stock"]
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Read the whole json file again and return the parts that differ from
+    # the live inventory, as part ID -> new part or None if removed, and
+    # the stock count of every part.
+    def _diff_json(self):
+        inventory = self.store.inventory
+        changes = {}
+        counts = {}
+        seen = set()
+        for item in functions.iter_inventory_items(self.json_file):
+            seen.add(item["id"])
+            if "stock" in item:
+                counts[item["id"]] = item["stock"]
+            part = inventory.get(item["id"])
+            if part is None or not _same(part, item):
+                changes[item["id"]] = functions.create_part(item)
+        for part_id in inventory:
+            if part_id not in seen:
+                changes[part_id] = None
+        return changes, counts
+
+    # Read the lines appended to the delta file since the last check and
+    # return its changes and stock counts in the form of _diff_json.
+    def _read_delta(self):
+        changes = {}
+        counts = {}
+        with open(self.delta_file, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() < self._delta_offset:
+                # The file was truncated or replaced, so read it again.
+                self._delta_offset = 0
+            file.seek(self._delta_offset)
+            data = file.read()
+        # Leave a line that is still being written for the next check.
+        data = data[:data.rfind(b"\n") + 1]
+        start = self._delta_offset
+        self._delta_offset += len(data)
+        for number, line in enumerate(data.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                change = json.loads(line)
+                if "remove" in change:
+                    changes[str(change["remove"])] = None
+                    continue
+                item = change["item"]
+                changes[item["id"]] = functions.create_part(item)
+                if "stock" in item:
+                    counts[item["id"]] = item["stock"]
+            except (ValueError, KeyError, TypeError,
+                    functions.PartException) as exc:
+                print(f"Skipped a change in {self.delta_file} at byte "
+                      f"{start}, line {number}: {exc}", file = sys.stderr)
+        return changes, counts
+
+    # Apply changes and stock counts to the store, holding its lock
+    # exclusive.
+    def apply(self, changes, counts = None):
+        store = self.store
+        with store.lock.exclusive():
+            changed = []
+            for part_id, part in changes.items():
+                old = store.inventory.get(part_id)
+                if part is None and old is None:
+                    continue
+                changed.append((old, part))
+                carts = list(store.holders.get(part_id, ()))
+                store.build_cache.invalidate(part_id)
+                if part is None:
+                    store.index.remove(part_id)
+                    store.search.remove(part_id)
+                    self._stock.pop(part_id, None)
+                    for cart in carts:
+                        for reservation, units in cart.discard(part_id):
+                            if store.stock is not None:
+                                store.stock.release(reservation, units)
+                    store.holders.pop(part_id, None)
+                else:
+                    store.index.add(part)
+                    store.search.add(part)
+                    for cart in carts:
+                        cart.reprice(part)
+            for part_id, count in (counts or {}).items():
+                previous = self._stock.get(part_id)
+                if previous == count or store.stock is None:
+                    continue
+                if previous is None:
+                    store.stock.set(part_id, count)
+                else:
+                    store.stock.adjust(part_id, count - previous)
+                self._stock[part_id] = count
+            if changed:
+                store.refresh(changed)
+
+    # Check both files once and apply what changed. Return the number of
+    # parts added, removed or changed.
+    def poll(self):
+        applied = 0
+        signature = _signature(self.json_file)
+        if signature is not None and signature != self._json_signature:
+            changes, counts = self._diff_json()
+            self._json_signature = signature
+            self.apply(changes, counts)
+            applied += len(changes)
+        if os.path.exists(self.delta_file):
+            changes, counts = self._read_delta()
+            self.apply(changes, counts)
+            applied += len(changes)
+        return applied
+
+    # Poll every interval seconds on a background thread until stopped.
+    def start(self):
+        def run():
+            while True:
+                try:
+                    applied = self.poll()
+                except (OSError, functions.PartException) as exc:
+                    message = exc.value if isinstance(
+                        exc, functions.PartException) else exc
+                    print(f"Inventory not reloaded: {message}",
+                          file = sys.stderr)
+                else:
+                    if applied:
+                        print(f"Reloaded {applied} changed parts.",
+                              file = sys.stderr)
+                if self._stop.wait(self.interval):
+                    return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target = run, daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
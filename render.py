@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Turns the results of the functions in functions.py into the text shown to a
+customer.
+
+The functions in functions.py return parts, verdicts and receipts without
+printing anything. Each function here formats one of those results as a
+string, so the interactive storefront and the batch and server commands can
+write it out in one go, or not at all.
+"""
+
+import sys
+
+import money
+
+# Write rendered text to a file, standard output by default, in one write.
+def show(text, file = None):
+    (sys.stdout if file is None else file).write(text)
+
+# Return the list of commands and their descriptions.
+def commands(descriptions):
+    return "All available commands:\n" + "".join(
+        f"\t{key} - {value}\n" for key, value in descriptions.items())
+
+# Return the details of each part or computer, one block per item.
+def parts(items):
+    return "".join([f"{item.details()}\n" for item in items])
+
+# Return the details of a single part or computer.
+def part(item):
+    return f"{item.details()}\n"
+
+# Return the verdict of a compatibility check between two parts.
+def compatibility(verdict):
+    if verdict.compatible:
+        return "Parts are compatible.\n\n"
+    return "".join(f"{violation.message}\n\n"
+                   for violation in verdict.violations)
+
+# Return the message for a computer whose build is compatible.
+def compatible_build(computer):
+    return (f"The parts in the current build configuration of {computer} "
+            "are compatible.\n\n")
+
+# Names of the slots of a buildsession.BuildSession.
+_SLOT_NAMES = {"motherboard": "Motherboards", "rams": "RAM", "cpu": "CPUs",
+               "psu": "PSUs", "storage": "Storage", "storage2": "Storage",
+               "gpu": "GPUs"}
+# Most part IDs shown for a slot of a build session.
+_SLOT_EXAMPLES = 5
+
+# Return the state of a buildsession.BuildSession after a step: the power
+# drawn, with the headroom left once a PSU is chosen, and the parts that
+# still fit each slot left to fill.
+def build_session(session):
+    power = f"Power draw: {session.power_draw}W"
+    if session.headroom is not None:
+        power += (f" of {session.power_supplied}W, {session.headroom}W "
+                  f"headroom")
+    lines = [power + "\n"]
+    for slot in session.open_slots():
+        if slot == "storage2" and "storage" not in session.choices:
+            continue
+        count = session.count(slot)
+        ids = ", ".join(part.id for part
+                        in session.candidates(slot, _SLOT_EXAMPLES))
+        more = ", ..." if _SLOT_EXAMPLES < count else ""
+        line = f"\t{_SLOT_NAMES[slot]} that fit: {count}"
+        if slot == "cpu" and session.socket is not None:
+            line += f" for the {session.socket} socket"
+        if slot == "rams" and session.max_rams is not None:
+            line += f", up to {session.max_rams} sticks"
+        lines.append(f"{line} ({ids}{more})\n" if count else f"{line}\n")
+    return "".join(lines) + "\n"
+
+# Return the lines for items, as (ID, units) pairs, added to the cart.
+def added(items):
+    return "".join(f"{item_id} x{units} added to cart.\n\n" if 1 < units else
+                   f"{item_id} added to cart.\n\n" for item_id, units in items)
+
+# Return the lines for items, as (ID, units) pairs, removed from the cart.
+def removed(items):
+    return "".join(f"{item_id} x{units} removed from cart.\n\n"
+                   if 1 < units else f"{item_id} removed from cart.\n\n"
+                   for item_id, units in items)
+
+# Return one tab-indented line per cart line, with its units if more than 1.
+def _lines(lines):
+    return "".join(f"\t{item} x{count}\n" if 1 < count else f"\t{item}\n"
+                   for item, count in lines)
+
+# Return a customer's shopping cart with any discounts, its total and their
+# budget.
+def cart(customer):
+    discount = customer.cart.discount
+    discounts = (f"Discounts: {money.format_cents(-discount)}\n"
+                 if discount else "")
+    return (f"Shopping Cart:\n{_lines(customer.cart.lines())}{discounts}"
+            f"Total: {money.format_cents(customer.total)}\n"
+            f"Your budget: {money.format_cents(customer.budget)}\n\n")
+
+# Return the confirmation of a submitted order from its functions.Receipt.
+def receipt(order):
+    saving = (f", saving {money.format_cents(order.discount)}"
+              if order.discount else "")
+    return (f"Order submitted. Your order is on the way.\n"
+            f"{_lines(order.lines)}"
+            f"Your total is {money.format_cents(order.total)}{saving}.\n\n")
+
+# Return a search.SearchPage as one line per part, with a note if more
+# pages follow.
+def search_results(results):
+    if not results.parts:
+        return ("No parts match your search.\n\n" if results.page == 1 else
+                "No more parts match your search.\n\n")
+    first = (results.page - 1) * results.per_page + 1
+    lines = "".join(f"\t{number}. {part.id} - {part.name}, "
+                    f"{money.format_cents(part.price)}\n"
+                    for number, part in enumerate(results.parts, first))
+    more = "More results follow.\n" if results.more else ""
+    return f"{lines}{more}\n"
+
+# Return the recommended builds for an objective of solver.OBJECTIVES,
+# within a budget.
+def recommendations(builds, description, budget):
+    if not builds:
+        return "No compatible build fits your budget.\n\n"
+    lines = []
+    for number, build in enumerate(builds, 1):
+        ids = [build.motherboard.id, build.cpu.id,
+               f"{build.ram.id} x{build.ram_count}", build.psu.id,
+               build.storage.id]
+        if build.storage2:
+            ids.append(build.storage2.id)
+        if build.gpu:
+            ids.append(build.gpu.id)
+        parts_list = ", ".join(ids)
+        lines.append(f"\t{number}. {money.format_cents(build.price)}, "
+                     f"{build.power_draw}W: {parts_list}\n")
+    builds_list = "".join(lines)
+    return (f"Best builds for {description.lower()} within "
+            f"{money.format_cents(budget)}:\n"
+            f"{builds_list}\n")
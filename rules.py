@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Defines the compatibility rules for computer builds.
+
+Each rule is a check that looks at a computer and returns a Violation, or
+None if the computer follows it. validate() runs every registered rule in
+one pass, so a build with several problems reports all of them at once. New
+rules are added with register_rule without changing the existing checks.
+"""
+
+from typing import Callable, NamedTuple, Optional, Tuple
+
+class Violation(NamedTuple):
+    """A broken rule, with how far off the build is where that is a number.
+
+    margin is how much the build would have to change to follow the rule,
+    in unit, such as 150 and "W" for a PSU short by 150W.
+    """
+    rule: str
+    message: str
+    margin: Optional[float] = None
+    unit: Optional[str] = None
+
+    def to_dict(self):
+        return self._asdict()
+
+class Verdict(NamedTuple):
+    """Whether parts are compatible, with the Violations if they are not."""
+    compatible: bool
+    violations: Tuple = ()
+
+class Rule(NamedTuple):
+    """A named compatibility check."""
+    id: str
+    description: str
+    check: Callable
+
+# Maps each rule ID to its Rule, in the order the rules are checked.
+RULES = {}
+
+# Register a rule so validate() checks it. A rule with an existing ID
+# replaces it.
+def register_rule(rule_id, description, check):
+    RULES[rule_id] = Rule(rule_id, description, check)
+
+# Return every violation of the registered rules by a computer, in rule
+# order. An empty list means the computer is compatible.
+def validate(computer, rules = None):
+    violations = []
+    for rule in (RULES.values() if rules is None else rules):
+        violation = rule.check(computer)
+        if violation is not None:
+            violations.append(violation)
+    return violations
+
+# The checks below take plain values, so bulk validation can share them
+# without building Computer objects.
+
+# Return the violation of a motherboard and CPU socket pair, if any.
+def socket_violation(motherboard_socket, cpu_socket):
+    if motherboard_socket != cpu_socket:
+        return Violation("socket", "Motherboard and CPU must have the same "
+                                   "socket type.")
+    return None
+
+# Return the violation of a build with RAM sticks of this many IDs, if any.
+def ram_id_violation(ram_ids):
+    if 1 < ram_ids:
+        return Violation("ram-id", "All instances of RAM must be the same id.",
+                         ram_ids - 1, "RAM IDs")
+    return None
+
+# Return the violation of count RAM sticks on a motherboard with the given
+# RAM slots, if any.
+def ram_slots_violation(count, slots):
+    if 0 == count or count > slots:
+        return Violation("ram-slots", f"The number of RAMs ({count}) cannot "
+                                      "exceed the number of RAM slots "
+                                      f"({slots}).",
+                         count - slots if count else 1, "RAM sticks")
+    return None
+
+# Return the violation of a build drawing more power than supplied, if any.
+def power_violation(power_draw, supplied):
+    if power_draw > supplied:
+        return Violation("power", "The total power draw from all components, "
+                                  f"{power_draw}W, should be less than or "
+                                  "equal to the power supplied by the PSU, "
+                                  f"{supplied}W.",
+                         power_draw - supplied, "W")
+    return None
+
+def _socket(computer):
+    return socket_violation(computer.motherboard.socket, computer.cpu.socket)
+
+def _ram_id(computer):
+    return ram_id_violation(len({ram.id for ram in computer.rams}))
+
+def _ram_slots(computer):
+    return ram_slots_violation(len(computer.rams),
+                               computer.motherboard.ram_slots)
+
+def _power(computer):
+    return power_violation(computer.power_draw, computer.psu.power_supplied)
+
+register_rule("socket", "Motherboard and CPU must have the same socket type.",
+              _socket)
+register_rule("ram-id", "All instances of RAM must be the same id.", _ram_id)
+register_rule("ram-slots", "The number of instances of RAM must be between 1 "
+                           "and the ram_slots on the Motherboard.", _ram_slots)
+register_rule("power", "The total power_draw of all components should be less "
+                       "than or equal to the power_supplied of the PSU.",
+              _power)
+
+# IDs of the rules above, which bulk validation checks without them.
+BUILT_IN = tuple(RULES)
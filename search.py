@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Defines a full-text search index over part names and attributes.
+
+Each part is indexed under the words of its ID, name and type, its socket,
+its capacity as "16gb" and "overclockable" if it is. A query matches the
+parts that have every one of its words, each either exactly, as a prefix of
+an indexed word, or, if neither finds anything, as a misspelling close to
+one by shared trigrams. Parts are ranked by how well the words match, exact
+before prefix before fuzzy, closer misspellings first, then in catalog
+order, and returned a page at a time.
+
+A query scans the parts of its rarest word, best matches first, and stops as
+soon as the page it asked for can no longer change, so the cost follows the
+page rather than the number of matches.
+
+An inventory opened from a snapshot can be indexed in a background thread
+while the storefront starts serving, so the first search does not wait for
+the whole inventory to be indexed.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+import heapq
+import re
+import threading
+from typing import List, NamedTuple
+
+import functions
+
+# Weights of a query word matching an indexed word. A fuzzy match weighs
+# FUZZY times its trigram similarity.
+EXACT, PREFIX, FUZZY = 3, 2, 1
+# Most indexed words a query word is expanded to by prefix or trigrams.
+MAX_EXPANSIONS = 32
+# Least trigram similarity for a fuzzy match.
+FUZZY_THRESHOLD = 0.3
+# Removed parts are dropped from the postings once they are this fraction of
+# the part numbers, and at least _MIN_COMPACT of them.
+COMPACT_FRACTION = 0.25
+_MIN_COMPACT = 1024
+# Parts indexed at a time by a background build, between which changes and
+# searches can take the lock.
+_CHUNK = 1024
+
+_WORDS = re.compile(r"[^\W_]+")
+_QUERY_WORDS = re.compile(r"\w+")
+
+class SearchPage(NamedTuple):
+    """One page of search results, best first, and whether more follow."""
+    parts: List
+    page: int
+    per_page: int
+    more: bool
+
+# Return the words a part is indexed under. The fields of its type are
+# looked up in functions.PART_SCHEMAS rather than tried on the part.
+def _tokens(part):
+    text = f"{part.name} {part.type}".lower()
+    # Most names are plain words, which split() finds faster than _WORDS.
+    tokens = set(text.split() if text.replace(" ", "").isalnum()
+                 else _WORDS.findall(text))
+    tokens.add(part.id.lower())
+    fields = functions.PART_SCHEMAS.get(part.type, (None, ()))[1]
+    if "socket" in fields:
+        tokens.add(str(part.socket).lower())
+    if "capacity" in fields:
+        tokens.add(f"{part.capacity}gb")
+    if "overclockable" in fields and part.overclockable is True:
+        tokens.add("overclockable")
+    return tokens
+
+# Return the trigrams of a word, padded so its start and end count.
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Inverted index of words to parts, with a trigram index of words.
+
+    Parts are numbered in the order they are added, and each word maps to
+    the numbers of the parts that have it: a single number while only one
+    part has it, then an array. Removed parts leave their numbers behind,
+    skipped when found, until there are enough of them that the parts left
+    are numbered again and the postings rewritten without them. Only words
+    made of letters are split into trigrams, since a near miss of a model
+    number or ID is a different part.
+    """
+    def __init__(self, parts = ()):
+        # Part number -> part, or None once removed.
+        self._parts = []
+        # Part ID -> part number.
+        self._numbers = {}
+        # Word -> part number or array of part numbers, in number order.
+        self._postings = {}
+        # Trigram -> words made of letters that have it.
+        self._trigrams = {}
+        # The words in sorted order for prefix matching, or None until the
+        # next query sorts them.
+        self._sorted = None
+        # An inventory to index on first use instead of now.
+        self._pending = None
+        # The thread indexing an inventory in the background, and the IDs
+        # removed while it runs, which it must not index, or None.
+        self._builder = None
+        self._skipped = None
+        # Numbers of removed parts still in the postings.
+        self._removed = 0
+        # Held by add, remove and a background build.
+        self._lock = threading.Lock()
+        for part in parts:
+            self.add(part)
+
+    def __len__(self):
+        self._ensure()
+        return len(self._numbers)
+
+    # Index every part of an inventory on the first query instead of now,
+    # so opening a snapshot stays fast. Changes made through add and remove
+    # until then are already in the inventory. With background, the parts
+    # are indexed by a thread started now instead, and changes made through
+    # add and remove meanwhile are applied as they come; the first query
+    # waits for the thread if it has not finished.
+    def defer(self, inventory, background = False):
+        if not background:
+            self._pending = inventory
+            return
+        self._skipped = set()
+        self._builder = threading.Thread(target = self._build,
+                                         args = (inventory,), daemon = True,
+                                         name = "search-index")
+        self._builder.start()
+
+    # Index the parts of an inventory a chunk at a time, skipping parts
+    # already added or removed through add and remove.
+    def _build(self, inventory):
+        while True:
+            try:
+                part_ids = list(inventory)
+                break
+            except RuntimeError:
+                # The inventory changed while being listed; list it again.
+                continue
+        for start in range(0, len(part_ids), _CHUNK):
+            with self._lock:
+                for part_id in part_ids[start:start + _CHUNK]:
+                    if part_id in self._numbers or part_id in self._skipped:
+                        continue
+                    part = inventory.get(part_id)
+                    if part is not None:
+                        self._add(part)
+        with self._lock:
+            self._skipped = None
+
+    def _ensure(self):
+        if self._builder is not None:
+            self._builder.join()
+            self._builder = None
+        if self._pending is not None:
+            inventory, self._pending = self._pending, None
+            for part in inventory.values():
+                self.add(part)
+
+    # Add a part, replacing any part that has the same ID.
+    def add(self, part):
+        if self._pending is not None:
+            return
+        with self._lock:
+            self._add(part)
+
+    def _add(self, part):
+        if part.id in self._numbers:
+            self._remove(part.id)
+        number = len(self._parts)
+        self._parts.append(part)
+        self._numbers[part.id] = number
+        words = self._postings
+        for token in _tokens(part):
+            postings = words.get(token)
+            if postings is None:
+                words[token] = number
+                self._new_word(token)
+            elif isinstance(postings, int):
+                words[token] = array("I", (postings, number))
+            else:
+                postings.append(number)
+
+    def _new_word(self, token):
+        if self._sorted is not None:
+            insort(self._sorted, token)
+        if token.isalpha():
+            for trigram in _trigrams(token):
+                self._trigrams.setdefault(trigram, []).append(token)
+
+    # Remove a part by ID, if it is indexed.
+    def remove(self, part_id):
+        if self._pending is not None:
+            return
+        with self._lock:
+            if self._skipped is not None:
+                self._skipped.add(part_id)
+            self._remove(part_id)
+
+    def _remove(self, part_id):
+        number = self._numbers.pop(part_id, None)
+        if number is None:
+            return
+        self._parts[number] = None
+        self._removed += 1
+        if self._removed >= max(_MIN_COMPACT,
+                                COMPACT_FRACTION * len(self._parts)):
+            self._compact()
+
+    # Number the parts left again, in the same order, and rewrite the
+    # postings without the removed parts, dropping words no part has.
+    def _compact(self):
+        renumbered = array("l", [-1]) * len(self._parts)
+        parts = []
+        for number, part in enumerate(self._parts):
+            if part is not None:
+                renumbered[number] = len(parts)
+                parts.append(part)
+        self._parts = parts
+        self._numbers = {part.id: number for number, part in enumerate(parts)}
+        self._removed = 0
+        dropped = []
+        for token, postings in self._postings.items():
+            numbers = [renumbered[number] for number
+                       in ((postings,) if isinstance(postings, int)
+                           else postings)
+                       if renumbered[number] >= 0]
+            if not numbers:
+                dropped.append(token)
+            else:
+                self._postings[token] = (numbers[0] if len(numbers) == 1
+                                         else array("I", numbers))
+        for token in dropped:
+            del self._postings[token]
+            if token.isalpha():
+                for trigram in _trigrams(token):
+                    tokens = self._trigrams[trigram]
+                    tokens.remove(token)
+                    if not tokens:
+                        del self._trigrams[trigram]
+        if dropped:
+            self._sorted = None
+
+    # Sort the words for prefix matching now rather than on the first query.
+    def prepare(self):
+        self._ensure()
+        if self._sorted is None:
+            self._sorted = sorted(self._postings)
+
+    # Return the indexed words a query word matches, by weight: itself, the
+    # words it is a prefix of, or failing both the words closest to it by
+    # trigrams.
+    def _expand(self, word):
+        matches = {}
+        if word in self._postings:
+            matches[word] = EXACT
+        start = bisect_left(self._sorted, word)
+        for token in self._sorted[start:start + MAX_EXPANSIONS + 1]:
+            if not token.startswith(word):
+                break
+            matches.setdefault(token, PREFIX)
+        if matches or not word.isalpha():
+            return matches
+        trigrams = _trigrams(word)
+        shared = Counter(token for trigram in trigrams
+                         for token in self._trigrams.get(trigram, ()))
+        scored = []
+        for token, count in shared.items():
+            similarity = count / (len(trigrams) + len(_trigrams(token)) -
+                                  count)
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((similarity, token))
+        for similarity, token in heapq.nlargest(MAX_EXPANSIONS, scored):
+            matches[token] = FUZZY * similarity
+        return matches
+
+    # Return the part numbers that have a word, in number order.
+    def _numbers_of(self, token):
+        postings = self._postings[token]
+        return (postings,) if isinstance(postings, int) else postings
+
+    # Return a page of the parts matching a query, of one category if given.
+    # Pages are numbered from 1.
+    def search(self, query, category = None, page = 1, per_page = 10):
+        self.prepare()
+        words = list(dict.fromkeys(_QUERY_WORDS.findall(query.lower())))
+        if not words:
+            raise functions.PartException("Enter words to search for.\n")
+        expansions = [self._expand(word) for word in words]
+        if not all(expansions):
+            return SearchPage([], page, per_page, False)
+
+        # Scan the word with the fewest parts, check the others on each part
+        # found, and stop once the wanted page is settled.
+        driver = min(range(len(words)), key = lambda position: sum(
+            len(self._numbers_of(token)) for token in expansions[position]))
+        others = expansions[:driver] + expansions[driver + 1:]
+        best_others = [max(weights.values()) for weights in others]
+        wanted = page * per_page + 1
+        found = []
+        seen = set()
+        settled = False
+        for weight in sorted(set(expansions[driver].values()),
+                             reverse = True):
+            tokens = [token for token, token_weight
+                      in expansions[driver].items() if token_weight == weight]
+            # No part from here on can score above the bound, so parts
+            # already found above it keep their place. It is added up in the
+            # same order as scores, so a part that matches the other words
+            # as well as they can be matched scores exactly the bound.
+            bound = weight
+            for best in best_others:
+                bound += best
+            above = sum(1 for score, _ in found if -score > bound)
+            hits = 0
+            for number in heapq.merge(*(self._numbers_of(token)
+                                        for token in tokens)):
+                if number in seen:
+                    continue
+                seen.add(number)
+                part = self._parts[number]
+                if part is None or (category and part.type != category):
+                    continue
+                score = weight
+                tokens_of_part = _tokens(part)
+                for weights in others:
+                    best = max((weights.get(token, 0)
+                                for token in tokens_of_part), default = 0)
+                    if not best:
+                        break
+                    score += best
+                else:
+                    found.append((-score, number))
+                    if score == bound:
+                        hits += 1
+                        if above + hits >= wanted:
+                            settled = True
+                            break
+            if settled:
+                break
+        ranked = heapq.nsmallest(wanted, found)
+        start = (page - 1) * per_page
+        return SearchPage([self._parts[number] for _, number
+                           in ranked[start:start + per_page]],
+                          page, per_page, len(ranked) == wanted)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Serves the storefront commands over TCP to many customers at once.
+
+The inventory is loaded once and shared by every session. Clients send one
+json request per line, such as
+    {"session": "abc", "command": "purchase", "args": {"part_id": "CPU_01"}}
+and get one json result per line back, in the format of batch mode plus the
+session ID and any "id" the request carried. Commands run on a pool of
+threads, each holding its session's lock, so two commands of one session
+never interleave while those of different sessions run at once, meeting
+only on the stock of the parts they share. A session idle for
+longer than --session-ttl is dropped, and the stock its cart held is
+released.
+
+With --workers N, sessions are spread over N worker processes by a hash of
+their ID, and this process only routes request lines to them, reading the
+session ID from the start of the line where it can rather than parsing the
+whole request. Every worker opens the same compiled snapshot of the
+inventory, so its pages are mapped once for all of them, and reads its
+indexes from the snapshot as they are first used rather than building them
+on start. The stock counts are kept in shared memory. Only stock is
+shared: carts, reservations and journals stay in the worker that serves the
+session, and orders are committed against the shared counts. A worker
+runs its commands one at a time, in the order they arrive.
+"""
+
+import argparse
+import asyncio
+import atexit
+import collections
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import sys
+import time
+import zlib
+
+import commands
+import functions
+from journal import Journal
+from metrics import Metrics
+import promotions
+from reload import InventoryWatcher
+import snapshot
+from search import SearchIndex
+from stock import SharedStock, SharedStockLedger, StockLedger
+
+# Longest request line accepted, in bytes.
+MAX_LINE = 1 << 20
+# Longest response line read back from a worker, in bytes.
+MAX_RESPONSE = 1 << 32
+# The line a worker sends once it is ready for requests.
+_READY = b"ready\n"
+# The start of a request line that begins with its session ID as a plain
+# string, as in the module docstring.
+_SESSION_PREFIX = re.compile(rb'\s*\{\s*"session"\s*:\s*"([^"\\]*)"\s*[,}]')
+
+# Run one request line and return the response line.
+def handle_line(store, line):
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("a request must be a json object")
+    except ValueError as exc:
+        return {"ok": False, "error": f"Invalid request: {exc}"}
+    session_id = str(request.get("session", ""))
+    result = commands.execute(store, session_id, request.get("command"),
+                              request.get("args"))
+    result["session"] = session_id
+    if "id" in request:
+        result["id"] = request["id"]
+    return result
+
+# Return a response as a json line.
+def _encode(response):
+    return (json.dumps(response) + "\n").encode("utf-8")
+
+# The response to requests whose worker has stopped.
+_STOPPED = _encode({"ok": False, "error": "The worker serving this session "
+                                          "has stopped."})
+
+# Serve requests from one client connection until it closes. respond is a
+# coroutine function taking a request line and returning the response line.
+async def serve_client(respond, reader, writer):
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except (asyncio.LimitOverrunError, ValueError):
+                writer.write(_encode({"ok": False,
+                                      "error": "Request is too long."}))
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+            writer.write(await respond(line))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+# Start serving the store on host and port and return the asyncio server.
+# Requests are handled on threads, so a checkout waiting on the journal
+# holds up no other session.
+async def start_server(store, host = "127.0.0.1", port = 8765):
+    async def respond(line):
+        return _encode(await asyncio.to_thread(handle_line, store, line))
+    return await asyncio.start_server(
+        lambda reader, writer: serve_client(respond, reader, writer),
+        host, port, limit = MAX_LINE)
+
+async def serve(store, host, port):
+    server = await start_server(store, host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Serving {len(store.inventory)} parts on {address[0]}:"
+          f"{address[1]}", file = sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+# Return the number of the worker serving a request line, from a hash of
+# its session ID. A line that starts with its session ID, and names no
+# other, is routed without being parsed; any other line is parsed. A line
+# that is not a valid request goes to the first worker, which answers it
+# with an error.
+def shard_of(line, workers):
+    match = _SESSION_PREFIX.match(line)
+    if match is not None and line.count(b'"session"') == 1:
+        return zlib.crc32(match[1]) % workers
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return 0
+    if not isinstance(request, dict):
+        return 0
+    session_id = str(request.get("session", ""))
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+# Serve the request lines the router sends over a socket until it shuts the
+# socket down. Runs in each worker process, on the inventory snapshot and
+# the stock counts every worker shares.
+def serve_shard(number, args, snapshot_file, shared, sock):
+    # An interrupt stops the router, which then stops the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    inventory = snapshot.SnapshotInventory(snapshot_file)
+    stock = SharedStockLedger(shared, inventory.position, inventory.stock)
+    search = SearchIndex()
+    search.defer(inventory, background = True)
+    metrics = Metrics.from_args(args)
+    if metrics is not None and metrics.output:
+        metrics.output = f"{metrics.output}.{number}"
+    journal = (Journal(os.path.join(args.journal, f"shard-{number}"))
+               if args.journal else None)
+    offers = (promotions.load_promotions(args.promotions, inventory)
+              if args.promotions else None)
+    store = commands.Store(inventory, stock, search = search,
+                           metrics = metrics, log = journal,
+                           promotions = offers,
+                           session_ttl = args.session_ttl or None)
+    try:
+        if journal is not None:
+            start = time.perf_counter()
+            replayed = journal.restore(store)
+            print(f"Worker {number} restored {len(store.sessions)} sessions "
+                  f"from the journal, replaying {replayed} events in "
+                  f"{time.perf_counter() - start:.3f}s.", file = sys.stderr)
+        with sock.makefile("rb") as requests, \
+                sock.makefile("wb") as responses:
+            responses.write(_READY)
+            responses.flush()
+            for line in requests:
+                responses.write(_encode(handle_line(store, line)))
+                responses.flush()
+    finally:
+        if journal is not None:
+            journal.close()
+        if metrics is not None:
+            metrics.dump()
+        stock.close()
+        sock.close()
+
+class Shard:
+    """A worker process and the connection requests are routed to it over.
+
+    The worker answers requests in the order they arrive, so each response
+    read back goes to the oldest request still waiting.
+    """
+    def __init__(self, process, sock):
+        self.process = process
+        self.socket = sock
+        self._reader = None
+        self._writer = None
+        self._waiting = collections.deque()
+        self._responses = None
+
+    # Connect to the worker and wait until it is ready for requests.
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            sock = self.socket, limit = MAX_RESPONSE)
+        if await self._reader.readline() != _READY:
+            raise functions.PartException("A worker failed to start.")
+        self._responses = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self):
+        while True:
+            try:
+                line = await self._reader.readline()
+            except ConnectionError:
+                line = b""
+            if not line:
+                break
+            self._waiting.popleft().set_result(line)
+        while self._waiting:
+            self._waiting.popleft().set_result(_STOPPED)
+
+    # Send a request line to the worker and return its response line.
+    async def request(self, line):
+        if self._responses.done():
+            return _STOPPED
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append(future)
+        self._writer.write(line.rstrip(b"\r\n") + b"\n")
+        await self._writer.drain()
+        return await future
+
+    # Tell the worker no more requests are coming, and wait until it has
+    # answered the ones it has and stopped.
+    async def close(self):
+        if self._responses is None:
+            return
+        if not self._writer.is_closing():
+            self._writer.write_eof()
+        await self._responses
+        self._writer.close()
+
+async def serve_shards(shards, host, port, parts):
+    for shard in shards:
+        await shard.open()
+
+    async def respond(line):
+        return await shards[shard_of(line, len(shards))].request(line)
+
+    # Stop on SIGTERM as on an interrupt, so the workers finish first.
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        server = await asyncio.start_server(
+            lambda reader, writer: serve_client(respond, reader, writer),
+            host, port, limit = MAX_LINE)
+        address = server.sockets[0].getsockname()
+        print(f"Serving {parts} parts on {address[0]}:{address[1]} with "
+              f"{len(shards)} workers", file = sys.stderr)
+        async with server:
+            await server.serve_forever()
+    finally:
+        for shard in shards:
+            await shard.close()
+
+# Check that a journal directory was kept by the same number of workers,
+# since restored sessions would otherwise land in workers that do not serve
+# them, and record the number on first use.
+def _check_journal(directory, workers):
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, "workers")
+    try:
+        with open(path, encoding = "utf-8") as file:
+            recorded = int(file.read())
+    except FileNotFoundError:
+        with open(path, "w", encoding = "utf-8") as file:
+            file.write(f"{workers}\n")
+        return
+    if recorded != workers:
+        raise functions.PartException(f"The journal in {directory} was kept "
+                                      f"by {recorded} workers; start with "
+                                      f"--workers {recorded}.")
+
+# Serve with worker processes, each running the sessions hashed to it, over
+# one snapshot of the inventory and shared stock counts.
+def serve_sharded(args):
+    try:
+        Metrics.from_args(args)
+        snapshot_file = snapshot.current_snapshot(args.inventory)
+        inventory = snapshot.SnapshotInventory(snapshot_file)
+        if args.journal:
+            _check_journal(args.journal, args.workers)
+        if args.promotions:
+            # Each worker compiles its own; this only checks the file.
+            promotions.load_promotions(args.promotions)
+    except functions.PartException as exc:
+        sys.exit(f"Error: {exc.value}")
+    parts = len(inventory)
+    inventory.close()
+    shared = SharedStock(parts)
+    shards = []
+    try:
+        for number in range(args.workers):
+            router_end, worker_end = socket.socketpair()
+            process = multiprocessing.Process(
+                target = serve_shard,
+                args = (number, args, snapshot_file, shared, worker_end))
+            process.start()
+            worker_end.close()
+            shards.append(Shard(process, router_end))
+        asyncio.run(serve_shards(shards, args.host, args.port, parts))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except functions.PartException as exc:
+        sys.exit(f"Error: {exc.value}")
+    finally:
+        for shard in shards:
+            # Workers forked later hold copies of the socket, so it is shut
+            # down rather than only closed for the worker to see the end.
+            with contextlib.suppress(OSError):
+                shard.socket.shutdown(socket.SHUT_WR)
+            shard.process.join()
+        shared.close()
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split(
+        "\n", maxsplit = 1)[0])
+    parser.add_argument("inventory", help = "inventory json file")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--watch", action = "store_true",
+                        help = "apply changes to the inventory and its "
+                               "delta file while serving")
+    parser.add_argument("--delta", metavar = "FILE",
+                        help = "delta file to watch (default: "
+                               "INVENTORY.delta.jsonl)")
+    parser.add_argument("--journal", metavar = "DIRECTORY",
+                        help = "keep carts and orders in a journal in this "
+                               "directory, restoring them on start")
+    parser.add_argument("--workers", type = int, default = 1,
+                        help = "worker processes to spread sessions over "
+                               "(default: 1)")
+    parser.add_argument("--promotions", metavar = "FILE",
+                        help = "take the promotions in this json file off "
+                               "carts")
+    parser.add_argument("--session-ttl", type = float, default = 1800,
+                        metavar = "SECONDS",
+                        help = "drop sessions idle for this long, releasing "
+                               "their carts' stock; 0 keeps them (default: "
+                               "1800)")
+    Metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.session_ttl < 0:
+        parser.error("--session-ttl must be at least 0")
+    if args.workers > 1:
+        if args.watch:
+            parser.error("--watch needs a single worker, since the workers "
+                         "share a read-only inventory")
+        serve_sharded(args)
+        return
+
+    stock = StockLedger()
+    search = SearchIndex()
+    offers = None
+    try:
+        metrics = Metrics.from_args(args)
+        start = time.perf_counter()
+        inventory = snapshot.load_inventory(args.inventory, stock = stock,
+                                            search = search)
+        if args.promotions:
+            offers = promotions.load_promotions(args.promotions, inventory)
+    except functions.PartException as exc:
+        sys.exit(f"Error: {exc.value}")
+    if metrics is not None:
+        metrics.set("inventory_load_seconds", time.perf_counter() - start)
+        metrics.set("inventory_parts", len(inventory))
+        atexit.register(metrics.dump)
+    journal = Journal(args.journal) if args.journal else None
+    store = commands.Store(inventory, stock, search = search,
+                           metrics = metrics, log = journal,
+                           promotions = offers,
+                           session_ttl = args.session_ttl or None)
+    if journal is not None:
+        start = time.perf_counter()
+        replayed = journal.restore(store)
+        print(f"Restored {len(store.sessions)} sessions from the journal, "
+              f"replaying {replayed} events in "
+              f"{time.perf_counter() - start:.3f}s.", file = sys.stderr)
+    watcher = None
+    if args.watch:
+        watcher = InventoryWatcher(store, args.inventory, args.delta)
+        watcher.start()
+    try:
+        asyncio.run(serve(store, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if journal is not None:
+            with store.lock.exclusive():
+                journal.close()
+        cache = store.build_cache.stats()
+        print(f"Build cache: {cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['evictions']} evictions, {cache['size']} of "
+              f"{cache['maxsize']} entries used.", file = sys.stderr)
+
+if __name__ == "__main__":
+    main()
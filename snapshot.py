@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Compiles inventory.json into a binary snapshot and opens snapshots through
+mmap, so the storefront can start without parsing json.
+
+A snapshot is laid out as
+    header        magic, version, part count and section offsets
+    schema        json describing each category's record layout
+    records       per category, one fixed-width record per part, starting
+                  with the part's ID and ending with its stock count
+    ID index      (ID offset, ID length, location) sorted by ID
+    order         the location of each part in inventory order
+    strings       every distinct string, UTF-8 encoded, back to back
+    tables        for each index.InventoryIndex sorted index, its keys
+                  and then the locations of its parts, sorted by key
+Strings in records are (offset, length) pairs into the string table, and a
+location is a part's row within its category shifted left by four bits,
+plus the category's number. The sorted tables let an index be loaded a
+field at a time, when it is first used, without reading every record.
+
+Usage: snapshot.py inventory.json [snapshot file]
+"""
+
+from collections.abc import Mapping
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+import functions
+from index import SORTED_FIELDS
+
+MAGIC = b"SFSNAP\0\0"
+# Version 2 stores prices in cents, and version 3 adds the sorted tables.
+VERSION = 3
+# magic, version, category count, part count, then the offset and size of
+# the schema, records, ID index, order, string and table sections.
+_HEADER = struct.Struct("<8sIIQ12Q")
+_INDEX_ENTRY = struct.Struct("<III")
+_STRING = "II"
+_ID = struct.Struct("<II")
+_ORDER = struct.Struct("<I")
+# Stock is stored as -1 for parts without a count.
+_NO_STOCK = -1
+
+# Return the struct code of a column from the values it holds.
+def _column_code(part_type, field, values):
+    kinds = {type(value) for value in values}
+    if kinds <= {bool}:
+        return "?"
+    if kinds <= {int}:
+        return "q"
+    if kinds <= {int, float}:
+        return "d"
+    if kinds <= {str}:
+        return "s"
+    raise functions.PartException(f"Cannot store the {field!r} field of "
+                                  f"{part_type} parts in a snapshot.")
+
+# Return the struct format of a record with the given column codes.
+def _record_format(codes):
+    return "<" + "".join(_STRING if code == "s" else code for code in codes)
+
+# Return the positions of rows in the order of one column, ties broken by
+# ID, as index._SortedIndex does.
+def _sorted_positions(rows, positions, column):
+    return sorted(positions, key = lambda position: (rows[position][column],
+                                                     rows[position][0]))
+
+# Compile a json inventory into a snapshot file and return the number of
+# parts written. The snapshot remembers the size and modification time of
+# the json file, so a stale snapshot is not used by load_inventory.
+def compile_snapshot(json_file, snapshot_file):
+    # Gather the rows of each category; a repeated ID replaces the earlier
+    # part, as it does in create_inventory.
+    categories = {}
+    locations = {}
+    for item in functions.iter_inventory_items(json_file):
+        _, fields = functions.part_schema(item)
+        functions.create_part(item)
+        if item["type"] not in categories:
+            if len(categories) == 16:
+                raise functions.PartException("A snapshot holds at most 16 "
+                                              "categories.")
+            categories[item["type"]] = (len(categories), fields, [])
+        number, fields, rows = categories[item["type"]]
+        row = ([item["id"], item["name"], functions.part_price(item)] +
+               [item[field] for field in fields] +
+               [item.get("stock", _NO_STOCK)])
+        if item["id"] in locations:
+            rows[locations[item["id"]] >> 4] = row
+        else:
+            if len(rows) == 1 << 28:
+                raise functions.PartException(f"Too many {item['type']} "
+                                              "parts for a snapshot.")
+            locations[item["id"]] = len(rows) << 4 | number
+            rows.append(row)
+
+    strings = bytearray()
+    offsets = {}
+
+    # Add a string to the string table and return its (offset, length).
+    def intern(text):
+        if text not in offsets:
+            encoded = text.encode("utf-8")
+            offsets[text] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return offsets[text]
+
+    # Pack the records of each category, one after another, and the sorted
+    # tables of the category's numeric fields, overall and per socket. Each
+    # table notes where its first part comes in inventory order.
+    firsts = {location: position for position, location
+              in enumerate(locations.values())}
+    schema = []
+    records = bytearray()
+    tables = []
+    sorted_tables = bytearray()
+    for part_type, (number, fields, rows) in categories.items():
+        names = ("id", "name", "price") + fields + ("stock",)
+        codes = [_column_code(part_type, name, [row[column] for row in rows])
+                 for column, name in enumerate(names)]
+        if codes[0] != "s" or codes[-1] != "q":
+            raise functions.PartException(f"{part_type} parts need string "
+                                          "IDs and whole stock counts.")
+        record = struct.Struct(_record_format(codes))
+        schema.append({"type": part_type, "number": number,
+                       "fields": list(names), "codes": "".join(codes),
+                       "offset": len(records), "count": len(rows)})
+        for row in rows:
+            values = []
+            for code, value in zip(codes, row):
+                if code == "s":
+                    values.extend(intern(value))
+                else:
+                    values.append(value)
+            records += record.pack(*values)
+        groups = {None: range(len(rows))}
+        if "socket" in names:
+            column = names.index("socket")
+            for position, row in enumerate(rows):
+                groups.setdefault(row[column], []).append(position)
+        first = {socket: min(firsts[position << 4 | number]
+                             for position in positions)
+                 for socket, positions in groups.items() if positions}
+        for field in SORTED_FIELDS:
+            column = names.index(field) if field in names else None
+            if column is None or codes[column] not in "qd":
+                continue
+            for socket, positions in groups.items():
+                ordered = _sorted_positions(rows, positions, column)
+                tables.append({"type": part_type, "socket": socket,
+                               "field": field,
+                               "first": first.get(socket, 0),
+                               "code": codes[column],
+                               "offset": len(sorted_tables),
+                               "count": len(ordered)})
+                sorted_tables += struct.pack(
+                    f"<{len(ordered)}{codes[column]}",
+                    *(rows[position][column] for position in ordered))
+                sorted_tables += struct.pack(
+                    f"<{len(ordered)}I",
+                    *(position << 4 | number for position in ordered))
+
+    stat = os.stat(json_file)
+    schema = json.dumps({"categories": schema, "tables": tables,
+                         "source_size": stat.st_size,
+                         "source_mtime_ns": stat.st_mtime_ns}
+                        ).encode("utf-8")
+    index = bytearray()
+    for part_id in sorted(locations,
+                          key = lambda part_id: part_id.encode("utf-8")):
+        index += _INDEX_ENTRY.pack(*intern(part_id), locations[part_id])
+    order = struct.pack(f"<{len(locations)}I", *locations.values())
+
+    sections = [schema, records, index, order, strings, sorted_tables]
+    layout = []
+    offset = _HEADER.size
+    for section in sections:
+        layout += [offset, len(section)]
+        offset += len(section)
+    header = _HEADER.pack(MAGIC, VERSION, len(categories), len(locations),
+                          *layout)
+    # Write beside the target and rename, so readers never see half a file.
+    temporary = f"{snapshot_file}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        for section in sections:
+            file.write(section)
+    os.replace(temporary, snapshot_file)
+    return len(locations)
+
+class _SnapshotCategory:
+    """The record layout of one category in a snapshot."""
+    __slots__ = ("type", "component_class", "fields", "codes", "record",
+                 "offset", "count")
+
+    def __init__(self, description):
+        self.type = description["type"]
+        self.component_class = functions.PART_SCHEMAS[self.type][0]
+        self.fields = description["fields"]
+        self.codes = description["codes"]
+        self.record = struct.Struct(_record_format(self.codes))
+        self.offset = description["offset"]
+        self.count = description["count"]
+
+class SnapshotInventory(Mapping):
+    """An inventory backed by a memory-mapped snapshot.
+
+    Opening a snapshot reads only its header and schema. Parts are built
+    from their records the first time they are looked up, and IDs are found
+    by binary search over the sorted ID index, so nothing is parsed or
+    copied up front. Parts set or deleted afterwards are kept in memory over
+    the snapshot, which is never written.
+    """
+    def __init__(self, snapshot_file):
+        try:
+            with open(snapshot_file, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0,
+                                      access = mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise functions.PartException(f"Cannot open snapshot "
+                                          f"{snapshot_file}: {exc}.") from exc
+        if len(self._map) < _HEADER.size:
+            raise functions.PartException(f"{snapshot_file} is not an "
+                                          "inventory snapshot.")
+        (magic, version, _, self._count, schema_offset, schema_size,
+         self._records_offset, _, self._index_offset, _,
+         self._order_offset, _, self._strings_offset, _,
+         self._tables_offset, _) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise functions.PartException(f"{snapshot_file} is not a "
+                                          f"version {VERSION} inventory "
+                                          "snapshot.")
+        schema = json.loads(self._map[schema_offset:
+                                      schema_offset + schema_size])
+        self.source_size = schema["source_size"]
+        self.source_mtime_ns = schema["source_mtime_ns"]
+        self._categories = [None] * 16
+        for description in schema["categories"]:
+            self._categories[description["number"]] = _SnapshotCategory(
+                description)
+        # (part type, socket or None, field) -> table description.
+        self._tables = {(table["type"], table["socket"], table["field"]):
+                        table for table in schema["tables"]}
+        # Parts already built, so repeated lookups return the same object.
+        self._parts = {}
+        # Part ID -> part set since opening, and IDs deleted from the
+        # snapshot.
+        self._changed = {}
+        self._deleted = set()
+
+    # Close the memory map. Parts already looked up stay usable.
+    def close(self):
+        self._map.close()
+
+    # Return the string at an (offset, length) pair of the string table.
+    def _string(self, offset, length):
+        start = self._strings_offset + offset
+        return str(self._map[start:start + length], "utf-8")
+
+    # Return the category of the part at a location and the offset of its
+    # record.
+    def _position(self, location):
+        category = self._categories[location & 15]
+        return category, (self._records_offset + category.offset +
+                          (location >> 4) * category.record.size)
+
+    # Return the record values of the part at a location, with strings
+    # decoded.
+    def _record(self, location):
+        category, offset = self._position(location)
+        raw = category.record.unpack_from(self._map, offset)
+        values = []
+        position = 0
+        for code in category.codes:
+            if code == "s":
+                values.append(self._string(raw[position],
+                                           raw[position + 1]))
+                position += 2
+            else:
+                values.append(raw[position])
+                position += 1
+        return category, values
+
+    # Return the ID of the part at a location without building the part.
+    def _id(self, location):
+        _, offset = self._position(location)
+        return self._string(*_ID.unpack_from(self._map, offset))
+
+    # Return the position of a part ID in the sorted ID index and its
+    # location, or None if it is not in the snapshot.
+    def _find(self, part_id):
+        if not isinstance(part_id, str):
+            return None
+        key = part_id.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, location = _INDEX_ENTRY.unpack_from(
+                self._map, self._index_offset + middle * _INDEX_ENTRY.size)
+            start = self._strings_offset + offset
+            found = self._map[start:start + length]
+            if found < key:
+                low = middle + 1
+            elif key < found:
+                high = middle
+            else:
+                return middle, location
+        return None
+
+    # Return the location of a part ID, or None if it is not in the
+    # snapshot.
+    def _locate(self, part_id):
+        found = self._find(part_id)
+        return None if found is None else found[1]
+
+    # Return the position of a part ID among the IDs of the snapshot, from 0
+    # to one less than their number, or None if it is not in the snapshot.
+    # Positions depend only on the file, so every process opening it agrees
+    # on them.
+    def position(self, part_id):
+        found = self._find(part_id)
+        return None if found is None else found[0]
+
+    # Return the part at a location, building it on first use.
+    def _part(self, location):
+        part = self._parts.get(location)
+        if part is None:
+            category, values = self._record(location)
+            part = category.component_class(values[0], category.type,
+                                            *values[1:-1])
+            self._parts[location] = part
+        return part
+
+    def __getitem__(self, part_id):
+        if part_id in self._changed:
+            return self._changed[part_id]
+        location = None if part_id in self._deleted else \
+            self._locate(part_id)
+        if location is None:
+            raise KeyError(part_id)
+        return self._part(location)
+
+    def __setitem__(self, part_id, part):
+        self._deleted.discard(part_id)
+        self._changed[part_id] = part
+
+    def __delitem__(self, part_id):
+        if part_id in self._changed:
+            del self._changed[part_id]
+            if self._locate(part_id) is not None:
+                self._deleted.add(part_id)
+        elif part_id in self:
+            self._deleted.add(part_id)
+        else:
+            raise KeyError(part_id)
+
+    def __contains__(self, part_id):
+        if part_id in self._changed:
+            return True
+        return part_id not in self._deleted and \
+            self._locate(part_id) is not None
+
+    def __iter__(self):
+        for position in range(self._count):
+            part_id = self._id(_ORDER.unpack_from(
+                self._map, self._order_offset + 4 * position)[0])
+            if part_id not in self._deleted:
+                yield part_id
+        for part_id in self._changed:
+            if self._locate(part_id) is None:
+                yield part_id
+
+    def __len__(self):
+        added = sum(1 for part_id in self._changed
+                    if self._locate(part_id) is None)
+        return self._count - len(self._deleted) + added
+
+    # Return the (key, part ID) pairs of a sorted table, sorted, or an empty
+    # list if there is no such table. Parts deleted since opening are left
+    # out; parts set since are not in the tables.
+    def sorted_table(self, part_type, socket, field):
+        table = self._tables.get((part_type, socket, field))
+        if table is None:
+            return []
+        count = table["count"]
+        start = self._tables_offset + table["offset"]
+        keys = struct.unpack_from(f"<{count}{table['code']}", self._map,
+                                  start)
+        locations = struct.unpack_from(f"<{count}I", self._map,
+                                       start + count * 8)
+        pairs = zip(keys, map(self._id, locations))
+        if not self._deleted:
+            return list(pairs)
+        return [pair for pair in pairs if pair[1] not in self._deleted]
+
+    # Return the IDs of the parts of a type, and of one socket if given, in
+    # inventory order, as sorted_table() does.
+    def category_ids(self, part_type, socket = None):
+        table = self._tables.get((part_type, socket, "price"))
+        if table is None:
+            return []
+        start = self._tables_offset + table["offset"] + table["count"] * 8
+        locations = sorted(struct.unpack_from(f"<{table['count']}I",
+                                              self._map, start))
+        return [part_id for part_id in map(self._id, locations)
+                if part_id not in self._deleted]
+
+    # Return the (part type, socket) pairs of the parts with a socket, in
+    # the inventory order of their first parts.
+    def socket_kinds(self):
+        tables = [table for table in self._tables.values()
+                  if table["socket"] is not None and table["field"] == "price"]
+        return [(table["type"], table["socket"]) for table
+                in sorted(tables, key = lambda table: table["first"])]
+
+    # Return the stock count of a part, or None if it has none.
+    def stock(self, part_id):
+        location = self._locate(part_id)
+        if location is None:
+            return None
+        category, offset = self._position(location)
+        (count,) = struct.unpack_from("<q", self._map, offset +
+                                      category.record.size - 8)
+        return None if count == _NO_STOCK else count
+
+    # Yield (part ID, stock) for every part with a stock count. Only the ID
+    # and stock of each record are read.
+    def stock_counts(self):
+        for category in self._categories:
+            if category is None:
+                continue
+            size = category.record.size
+            start = self._records_offset + category.offset
+            for offset in range(start, start + size * category.count, size):
+                (count,) = struct.unpack_from("<q", self._map,
+                                              offset + size - 8)
+                if count != _NO_STOCK:
+                    yield self._string(*_ID.unpack_from(self._map,
+                                                        offset)), count
+
+# Return the snapshot path used for a json inventory file.
+def snapshot_path(json_file):
+    return os.path.splitext(json_file)[0] + ".snap"
+
+# Open the snapshot of a json inventory file if one is present and matches
+# the json file, and return None otherwise. A snapshot that cannot be read
+# is skipped unless there is no json file.
+def open_current(json_file):
+    path = snapshot_path(json_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        stat = os.stat(json_file)
+    except OSError:
+        stat = None
+    try:
+        inventory = SnapshotInventory(path)
+    except functions.PartException:
+        if stat is None:
+            raise
+        return None
+    if stat is None or (stat.st_size == inventory.source_size and
+                        stat.st_mtime_ns == inventory.source_mtime_ns):
+        return inventory
+    inventory.close()
+    return None
+
+# Return the path of a snapshot matching a json inventory file, compiling
+# it first if it is missing or out of date.
+def current_snapshot(json_file):
+    inventory = open_current(json_file)
+    if inventory is None:
+        compile_snapshot(json_file, snapshot_path(json_file))
+    else:
+        inventory.close()
+    return snapshot_path(json_file)
+
+# Load an inventory, from its snapshot when one is present and matches the
+# json file, and otherwise from the json file with create_inventory. If a
+# stock.StockLedger is passed, stock counts are loaded into it, or read from
+# the snapshot as parts are first used. If a search.SearchIndex is passed,
+# parts are indexed in it, or from the snapshot in a background thread.
+# With compact set, a json file is loaded into an objects.PartStore.
+def load_inventory(json_file, stock = None, search = None, compact = False):
+    inventory = open_current(json_file)
+    if inventory is None:
+        return functions.create_inventory(json_file, compact = compact,
+                                          stock = stock,
+                                          search_index = search)
+    if stock is not None:
+        stock.load_from(inventory.stock)
+    if search is not None:
+        search.defer(inventory, background = True)
+    return inventory
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit(__doc__.strip().rsplit("\n", maxsplit = 1)[1])
+    json_file = sys.argv[1]
+    snapshot_file = sys.argv[2] if len(sys.argv) == 3 else \
+        snapshot_path(json_file)
+    start = time.perf_counter()
+    try:
+        count = compile_snapshot(json_file, snapshot_file)
+    except functions.PartException as exc:
+        sys.exit(f"Error: {exc.value}")
+    print(f"Wrote {count} parts to {snapshot_file} in "
+          f"{time.perf_counter() - start:.2f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Defines the compatible-build enumerator and recommender for storefront.py.
+"""
+
+from bisect import bisect_left, bisect_right
+import heapq
+import itertools
+import math
+import threading
+from typing import Callable, NamedTuple, Optional
+
+import objects
+from index import InventoryIndex
+
+class Build(NamedTuple):
+    """A compatible combination of parts with its total price in cents and
+    power."""
+    motherboard: objects.Motherboard
+    cpu: objects.CPU
+    ram: objects.RAM
+    ram_count: int
+    psu: objects.PSU
+    storage: objects.Storage
+    storage2: Optional[objects.Storage]
+    gpu: Optional[objects.GPU]
+    price: int
+    power_draw: int
+
+    # Return the part IDs of the build, with the RAM repeated ram_count times.
+    def part_ids(self):
+        ids = [self.motherboard.id, self.cpu.id]
+        ids += [self.ram.id] * self.ram_count
+        ids += [self.psu.id, self.storage.id]
+        if self.storage2:
+            ids.append(self.storage2.id)
+        if self.gpu:
+            ids.append(self.gpu.id)
+        return ids
+
+    def to_computer(self, cid):
+        return objects.Computer(cid, self.motherboard,
+                                [self.ram] * self.ram_count, self.cpu,
+                                self.psu, self.storage, self.storage2,
+                                self.gpu)
+
+class Catalog:
+    """Parts grouped and sorted the way the build searches need them.
+
+    The parts are taken from an InventoryIndex. After parts are added to or
+    removed from the index, refresh() gathers again only the groups they
+    belong to; the search spaces are reordered for them on the next
+    recommend() of each objective.
+    """
+    def __init__(self, inventory, index = None):
+        if index is None:
+            index = InventoryIndex(inventory)
+        self.index = index
+        self.sockets = []
+        # Parts sorted by price, per socket for CPUs and motherboards.
+        self.motherboards = {}
+        self.cpus = {}
+        # Lower bounds used to prune partial builds.
+        self.min_cpu_price = {}
+        self.min_cpu_draw = {}
+        # Objective -> _SearchSpace, for recommend(), and the lock searches
+        # take to build or reorder one.
+        self._spaces = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    # Gather the parts of the given (part type, socket) kinds from the index
+    # again, or every part if no kinds are given, and mark them changed in
+    # the search spaces. Sockets are given for CPUs and motherboards only.
+    def refresh(self, kinds = None):
+        index = self.index
+        types = None if kinds is None else {kind for kind, _ in kinds}
+        changed = {socket for kind, socket in kinds or ()
+                   if kind in ("CPU", "Motherboard")}
+        sockets = [socket for socket in index.sockets()
+                   if index.count("CPU", socket = socket) and
+                   index.count("Motherboard", socket = socket)]
+        for socket in set(self.sockets) - set(sockets):
+            del self.motherboards[socket], self.cpus[socket]
+            del self.min_cpu_price[socket], self.min_cpu_draw[socket]
+        for socket in sockets:
+            if kinds is None or socket in changed or \
+                    socket not in self.cpus:
+                changed.add(socket)
+                self.motherboards[socket] = index.range("Motherboard",
+                                                        socket = socket)
+                cpus = self.cpus[socket] = index.range("CPU",
+                                                       socket = socket)
+                self.min_cpu_price[socket] = cpus[0].price
+                self.min_cpu_draw[socket] = min(cpu.power_draw
+                                                for cpu in cpus)
+        self.sockets = sockets
+        if types is None or "RAM" in types:
+            self.rams = index.range("RAM")
+            self.min_ram_price = (self.rams[0].price if self.rams
+                                  else math.inf)
+            self.min_ram_draw = min((ram.power_draw for ram in self.rams),
+                                    default = math.inf)
+        if types is None or "Storage" in types:
+            self.storages = index.range("Storage")
+            self.min_storage_price = (self.storages[0].price
+                                      if self.storages else math.inf)
+        # PSUs sorted by power supplied and GPUs sorted by power draw.
+        if types is None or "PSU" in types:
+            self.psus = index.range("PSU", "power_supplied")
+            self.supplies = [psu.power_supplied for psu in self.psus]
+            self.min_psu_price = min((psu.price for psu in self.psus),
+                                     default = math.inf)
+            self.max_supply = (self.supplies[-1] if self.supplies
+                               else -math.inf)
+        if types is None or "GPU" in types:
+            self.gpus = index.range("GPU", "power_draw")
+        if types is None:
+            self._spaces = {}
+        for space in self._spaces.values():
+            space.stale_types |= types
+            space.stale_sockets |= changed
+
+    # Return the PSUs that supply at least the given power draw.
+    def psus_for(self, power_draw):
+        return self.psus[bisect_left(self.supplies, power_draw):]
+
+    # Return the candidates ordered for an objective, built on first use and
+    # reordered where parts changed since the last use.
+    def search_space(self, objective):
+        with self._lock:
+            space = self._spaces.get(objective)
+            if space is None:
+                space = self._spaces[objective] = _SearchSpace(self,
+                                                               objective)
+            elif space.stale_types:
+                space.refresh(self, space.stale_types, space.stale_sockets)
+            return space
+
+# Yield every compatible build in the inventory, optionally only those
+# priced at or under the budget. Builds follow the compatibility rules:
+# matching sockets, one RAM ID repeated between 1 and ram_slots times, and a
+# total power draw no more than the PSU supplies. The second storage drive
+# and the GPU are optional; storage pairs are yielded once, not in both
+# orders. Branches that cannot lead to a build within the power or price
+# bounds are pruned before they are expanded.
+def enumerate_builds(inventory, budget = None, catalog = None):
+    if catalog is None:
+        catalog = Catalog(inventory)
+    if budget is None:
+        budget = math.inf
+    # Cheapest way to finish a build once the PSU and storage are missing.
+    tail_price = catalog.min_psu_price + catalog.min_storage_price
+    gpus = [None] + catalog.gpus
+
+    for socket in catalog.sockets:
+        base_price = catalog.min_cpu_price[socket] + catalog.min_ram_price
+        base_draw = catalog.min_cpu_draw[socket] + catalog.min_ram_draw
+        for motherboard in catalog.motherboards[socket]:
+            if motherboard.price + base_price + tail_price > budget:
+                break
+            if motherboard.power_draw + base_draw > catalog.max_supply:
+                continue
+            for cpu in catalog.cpus[socket]:
+                price = motherboard.price + cpu.price
+                if price + catalog.min_ram_price + tail_price > budget:
+                    break
+                draw = motherboard.power_draw + cpu.power_draw
+                if draw + catalog.min_ram_draw > catalog.max_supply:
+                    continue
+                yield from _enumerate_rams(catalog, motherboard, cpu, price,
+                                           draw, gpus, budget, tail_price)
+
+# Yield the builds for a motherboard and CPU, from the RAM onwards.
+def _enumerate_rams(catalog, motherboard, cpu, price, draw, gpus, budget,
+                    tail_price):
+    for ram in catalog.rams:
+        for ram_count in range(1, motherboard.ram_slots + 1):
+            ram_price = price + ram.price * ram_count
+            ram_draw = draw + ram.power_draw * ram_count
+            if (ram_price + tail_price > budget or
+                    ram_draw > catalog.max_supply):
+                break
+            for gpu in gpus:
+                gpu_price = ram_price + (gpu.price if gpu else 0)
+                gpu_draw = ram_draw + (gpu.power_draw if gpu else 0)
+                if gpu_draw > catalog.max_supply:
+                    break
+                if gpu_price + tail_price > budget:
+                    continue
+                for psu in catalog.psus_for(gpu_draw):
+                    psu_price = gpu_price + psu.price
+                    if psu_price + catalog.min_storage_price > budget:
+                        continue
+                    for position, storage in enumerate(catalog.storages):
+                        total = psu_price + storage.price
+                        if total > budget:
+                            break
+                        yield Build(motherboard, cpu, ram, ram_count, psu,
+                                    storage, None, gpu, total, gpu_draw)
+                        for storage2 in catalog.storages[position:]:
+                            if total + storage2.price > budget:
+                                break
+                            yield Build(motherboard, cpu, ram, ram_count,
+                                        psu, storage, storage2, gpu,
+                                        total + storage2.price, gpu_draw)
+
+class Objective(NamedTuple):
+    """Build ranking: the sum of part_score over every part in a build."""
+    name: str
+    description: str
+    part_score: Callable[[objects.Component], float]
+
+OBJECTIVES = {
+    "ram": Objective("ram", "Most RAM capacity",
+                     lambda part: part.capacity if part.type == "RAM" else 0),
+    "storage": Objective("storage", "Most storage capacity",
+                         lambda part: (part.capacity if part.type == "Storage"
+                                       else 0)),
+    "gpu": Objective("gpu", "Includes a GPU",
+                     lambda part: 1 if part.type == "GPU" else 0),
+    "cheapest": Objective("cheapest", "Lowest price",
+                          lambda part: -part.price),
+}
+
+# Return the price of a part, the cost of a candidate for most slots.
+def _price(part):
+    return part.price
+
+class _Choices:
+    """Candidates for one slot of a build, for the branch-and-bound search.
+
+    Candidates are kept in descending score order, ties going to the cheaper
+    one, so good builds are found first. A price-sorted prefix maximum of
+    the scores gives the best score affordable with a given amount of money,
+    along with the lowest price that reaches it.
+    """
+    def __init__(self, candidates, score, price):
+        self.candidates = sorted(candidates,
+                                 key = lambda part: (-score(part),
+                                                     price(part)))
+        self.scores = [score(part) for part in self.candidates]
+        self.costs = [price(part) for part in self.candidates]
+        # Index of the first candidate after each one with a lower score.
+        self.group_ends = [0] * len(self.candidates)
+        end = len(self.candidates)
+        for position in range(len(self.candidates) - 1, -1, -1):
+            if (position + 1 < len(self.candidates) and
+                    self.scores[position + 1] != self.scores[position]):
+                end = position + 1
+            self.group_ends[position] = end
+
+        by_price = sorted(zip(self.costs, self.scores))
+        self.prices = [cost for cost, _ in by_price]
+        self.best = [(-math.inf, math.inf)]
+        for cost, value in by_price:
+            if value > self.best[-1][0]:
+                self.best.append((value, cost))
+            else:
+                self.best.append(self.best[-1])
+        self.min_price = self.prices[0] if self.prices else math.inf
+
+    # Return the best score among candidates costing at most money and the
+    # lowest price of a candidate with that score.
+    def best_within(self, money):
+        return self.best[bisect_right(self.prices, money)]
+
+    # Yield the candidates, from start on, for which promising(score, price)
+    # holds. The bound only falls as the price rises, so once a candidate
+    # fails, the rest of its score group is skipped; if even the cheapest
+    # price cannot save its score, no later candidate can pass either.
+    def viable(self, promising, start = 0):
+        position = start
+        while position < len(self.candidates):
+            if promising(self.scores[position], self.costs[position]):
+                yield self.candidates[position]
+                position += 1
+            elif promising(self.scores[position], self.min_price):
+                position = self.group_ends[position]
+            else:
+                return
+
+class _SearchSpace:
+    """The candidates of every build slot, ordered for one Objective."""
+    def __init__(self, catalog, objective):
+        self.objective = objective
+        self.motherboards = {}
+        self.cpus = {}
+        # RAM choices are (RAM, count) pairs, grouped by the slots available.
+        self.rams = {}
+        # Part types, and sockets of CPUs and motherboards, changed in the
+        # catalog since the candidates were ordered.
+        self.stale_types = set()
+        self.stale_sockets = set()
+        self.refresh(catalog)
+
+    # Order the candidates of the given part types again, and for CPUs and
+    # motherboards of the given sockets only, or of every slot if no types
+    # are given. RAM slot counts no motherboard has any more are kept; they
+    # only loosen the bounds of the search.
+    def refresh(self, catalog, types = None, sockets = ()):
+        score = self.objective.part_score
+        for socket in set(self.motherboards) - set(catalog.sockets):
+            del self.motherboards[socket], self.cpus[socket]
+        for socket in catalog.sockets:
+            if types is None or socket in sockets:
+                self.motherboards[socket] = _Choices(
+                    catalog.motherboards[socket], score, _price)
+                self.cpus[socket] = _Choices(catalog.cpus[socket], score,
+                                             _price)
+        if types is None or "RAM" in types:
+            self.rams = {}
+            sockets = catalog.sockets
+        for socket in sockets:
+            for motherboard in catalog.motherboards.get(socket, ()):
+                slots = motherboard.ram_slots
+                if slots not in self.rams:
+                    self.rams[slots] = _Choices(
+                        [(ram, count) for ram in catalog.rams
+                         for count in range(1, slots + 1)],
+                        lambda choice: score(choice[0]) * choice[1],
+                        lambda choice: choice[0].price * choice[1])
+        if types is None or "GPU" in types:
+            self.gpus = _Choices(catalog.gpus, score, _price)
+        if types is None or "PSU" in types:
+            self.psus = _Choices(catalog.psus, score, _price)
+        if types is None or "Storage" in types:
+            self.storages = _Choices(catalog.storages, score, _price)
+        self.stale_types = set()
+        self.stale_sockets = set()
+
+# Return the k best builds at or under the budget, best first, ranked by an
+# Objective or the name of one in OBJECTIVES, ties going to the cheaper
+# build. Searches with branch and bound: each partial build is scored
+# optimistically with the best part each remaining slot could still afford,
+# and is dropped as soon as that bound cannot beat the k-th best build.
+def recommend(inventory, budget, objective = "ram", k = 5, catalog = None):
+    if isinstance(objective, str):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective {objective!r}.")
+        objective = OBJECTIVES[objective]
+    if k <= 0:
+        return []
+    if catalog is None:
+        catalog = Catalog(inventory)
+    score = objective.part_score
+    space = catalog.search_space(objective)
+    motherboards, cpus, rams = space.motherboards, space.cpus, space.rams
+    gpus, psus, storages = space.gpus, space.psus, space.storages
+    best = []
+    tiebreak = 0
+
+    # Return the highest score the remaining slots can add with the money
+    # left, and the lowest price of reaching that score. Slots are given as
+    # (choices, required) pairs. Any way of filling the slots scores less,
+    # or scores the same and costs at least as much.
+    def optimistic(remaining, money, reserve):
+        total_score = total_price = 0
+        for choices, required in remaining:
+            allowance = money - reserve
+            if required:
+                allowance += choices.min_price
+            value, cost = choices.best_within(allowance)
+            if required or value > 0:
+                total_score += value
+                total_price += cost
+        return total_score, total_price
+
+    # Return a test of whether adding a candidate to a partial build could
+    # still enter the top k, given the slots left after the candidate.
+    def bound(spent, gained, remaining):
+        reserve = sum(choices.min_price for choices, required in remaining
+                      if required)
+        def promising(part_score, part_price):
+            if spent + part_price + reserve > budget:
+                return False
+            limit, cost = optimistic(remaining, budget - spent - part_price,
+                                     reserve)
+            if limit == -math.inf:
+                return False
+            return len(best) < k or ((gained + part_score + limit,
+                                      -(spent + part_price + cost)) >
+                                     best[0][:2])
+        return promising
+
+    def offer(build, build_score):
+        nonlocal tiebreak
+        tiebreak += 1
+        entry = (build_score, -build.price, tiebreak, build)
+        if len(best) < k:
+            heapq.heappush(best, entry)
+        elif entry[:2] > best[0][:2]:
+            heapq.heapreplace(best, entry)
+
+    # Search every slot after the motherboard and CPU.
+    def search_rams(motherboard, cpu, spent, gained, draw):
+        tail = [(gpus, False), (psus, True), (storages, True),
+                (storages, False)]
+        for ram, count in rams[motherboard.ram_slots].viable(
+                bound(spent, gained, tail)):
+            ram_spent = spent + ram.price * count
+            ram_gained = gained + score(ram) * count
+            ram_draw = draw + ram.power_draw * count
+            if ram_draw > catalog.max_supply:
+                continue
+            search_gpus(motherboard, cpu, ram, count, ram_spent, ram_gained,
+                        ram_draw)
+
+    def search_gpus(motherboard, cpu, ram, count, spent, gained, draw):
+        tail = [(psus, True), (storages, True), (storages, False)]
+        promising = bound(spent, gained, tail)
+        options = gpus.viable(promising)
+        if promising(0, 0):
+            options = itertools.chain([None], options)
+        for gpu in options:
+            gpu_spent = spent + (gpu.price if gpu else 0)
+            gpu_gained = gained + (score(gpu) if gpu else 0)
+            gpu_draw = draw + (gpu.power_draw if gpu else 0)
+            if gpu_draw > catalog.max_supply:
+                continue
+            for psu in psus.viable(bound(gpu_spent, gpu_gained, tail[1:])):
+                if psu.power_supplied < gpu_draw:
+                    continue
+                search_storages(motherboard, cpu, ram, count, gpu, psu,
+                                gpu_spent + psu.price,
+                                gpu_gained + score(psu), gpu_draw)
+
+    def search_storages(motherboard, cpu, ram, count, gpu, psu, spent, gained,
+                        draw):
+        promising = bound(spent, gained, [(storages, False)])
+        rank = 0
+        while rank < len(storages.candidates):
+            storage = storages.candidates[rank]
+            if not promising(storages.scores[rank], storage.price):
+                if not promising(storages.scores[rank], storages.min_price):
+                    return
+                rank = storages.group_ends[rank]
+                continue
+            storage_spent = spent + storage.price
+            storage_gained = gained + storages.scores[rank]
+            offer(Build(motherboard, cpu, ram, count, psu, storage, None,
+                        gpu, storage_spent, draw), storage_gained)
+            # Pair each drive only with those after it, so each pair of
+            # drives is tried once.
+            for storage2 in storages.viable(bound(storage_spent,
+                                                  storage_gained, []),
+                                            rank):
+                offer(Build(motherboard, cpu, ram, count, psu, storage,
+                            storage2, gpu, storage_spent + storage2.price,
+                            draw), storage_gained + score(storage2))
+            rank += 1
+
+    for socket in catalog.sockets:
+        after_motherboard = [(cpus[socket], True),
+                             (rams[max(rams)], True), (gpus, False),
+                             (psus, True), (storages, True),
+                             (storages, False)]
+        for motherboard in motherboards[socket].viable(
+                bound(0, 0, after_motherboard)):
+            after_cpu = [(rams[motherboard.ram_slots], True)]
+            after_cpu += after_motherboard[2:]
+            for cpu in cpus[socket].viable(bound(motherboard.price,
+                                                 score(motherboard),
+                                                 after_cpu)):
+                draw = motherboard.power_draw + cpu.power_draw
+                if draw + catalog.min_ram_draw > catalog.max_supply:
+                    continue
+                search_rams(motherboard, cpu, motherboard.price + cpu.price,
+                            score(motherboard) + score(cpu), draw)
+
+    return [entry[3] for entry in sorted(best, reverse = True)]
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Defines stock tracking with expiring reservations for storefront.py, and
+stock counts shared between processes for the workers of server.py.
+"""
+
+import heapq
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import time
+
+from functions import PartException
+
+class Reservation:
+    """Units of one part held for a customer until they expire."""
+    __slots__ = ("id", "part_id", "quantity", "expires")
+
+    def __init__(self, reservation_id, part_id, quantity, expires):
+        self.id = reservation_id
+        self.part_id = part_id
+        self.quantity = quantity
+        self.expires = expires
+
+    def __repr__(self):
+        return f"Reservation({self.id}, {self.part_id!r}, {self.quantity})"
+
+class _Stripe:
+    """The stock and reservations of the parts hashed to one lock."""
+    __slots__ = ("lock", "available", "unlimited", "reservations",
+                 "expiries")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Part ID -> units neither sold nor reserved.
+        self.available = {}
+        # Part IDs the lookup found no stock count for.
+        self.unlimited = set()
+        # Reservation ID -> active Reservation.
+        self.reservations = {}
+        # Heap of (expiry time, reservation ID), reclaimed lazily.
+        self.expiries = []
+
+class StockLedger:
+    """Per-part stock counts with reservations that expire after a TTL.
+
+    Parts are spread over independently locked stripes, so customers
+    working with different parts never wait on each other. Parts with no
+    stock count set are treated as unlimited. Counts can also be read on
+    first use from a lookup given to load_from.
+    """
+    def __init__(self, stripes = 64, ttl = 900.0, clock = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._ids = itertools.count(1)
+        self._lookup = None
+
+    def _stripe(self, part_id):
+        return self._stripes[hash(part_id) % len(self._stripes)]
+
+    # Read the stock of parts not set yet with lookup(part_id), which returns
+    # a count or None for unlimited parts, the first time each is used.
+    def load_from(self, lookup):
+        self._lookup = lookup
+
+    # Return whether a part has a stock count, looking it up on first use.
+    # The stripe's lock must be held.
+    def _tracked(self, stripe, part_id):
+        if part_id in stripe.available:
+            return True
+        if self._lookup is None or part_id in stripe.unlimited:
+            return False
+        count = self._lookup(part_id)
+        if count is None:
+            stripe.unlimited.add(part_id)
+            return False
+        stripe.available[part_id] = count
+        return True
+
+    # Return expired reservations in a stripe to its stock. The stripe's lock
+    # must be held.
+    def _reclaim(self, stripe, now):
+        while stripe.expiries and stripe.expiries[0][0] <= now:
+            _, reservation_id = heapq.heappop(stripe.expiries)
+            reservation = stripe.reservations.get(reservation_id)
+            if reservation is not None and reservation.expires <= now:
+                del stripe.reservations[reservation_id]
+                stripe.available[reservation.part_id] += reservation.quantity
+
+    # Set the units of a part in stock, not counting active reservations.
+    def set(self, part_id, quantity):
+        stripe = self._stripe(part_id)
+        with stripe.lock:
+            stripe.available[part_id] = quantity
+            stripe.unlimited.discard(part_id)
+
+    # Add units of a part to stock, or take them away if delta is negative,
+    # leaving its reservations as they are. Stock may go below zero, in
+    # which case nothing more can be reserved until it is restocked.
+    def adjust(self, part_id, delta):
+        stripe = self._stripe(part_id)
+        with stripe.lock:
+            if self._tracked(stripe, part_id):
+                stripe.available[part_id] += delta
+            else:
+                stripe.available[part_id] = delta
+                stripe.unlimited.discard(part_id)
+
+    # Return the units of a part available to reserve, or None if unlimited.
+    def available(self, part_id):
+        stripe = self._stripe(part_id)
+        with stripe.lock:
+            if not self._tracked(stripe, part_id):
+                return None
+            self._reclaim(stripe, self._clock())
+            return stripe.available[part_id]
+
+    # Take units of a part out of stock for ttl seconds.
+    def reserve(self, part_id, quantity = 1, ttl = None):
+        stripe = self._stripe(part_id)
+        now = self._clock()
+        expires = now + (self.ttl if ttl is None else ttl)
+        reservation = Reservation(next(self._ids), part_id, quantity, expires)
+        with stripe.lock:
+            if not self._tracked(stripe, part_id):
+                return reservation
+            self._reclaim(stripe, now)
+            if stripe.available[part_id] < quantity:
+                raise PartException(f"{part_id} is out of stock.\n")
+            stripe.available[part_id] -= quantity
+            stripe.reservations[reservation.id] = reservation
+            heapq.heappush(stripe.expiries, (expires, reservation.id))
+        return reservation
+
+    # Return the units of a reservation to stock, or only some of them.
+    def release(self, reservation, quantity = None):
+        stripe = self._stripe(reservation.part_id)
+        with stripe.lock:
+            if quantity is None or reservation.quantity <= quantity:
+                quantity = reservation.quantity
+                active = stripe.reservations.pop(reservation.id, None)
+            else:
+                active = stripe.reservations.get(reservation.id)
+            reservation.quantity -= quantity
+            if active is not None:
+                stripe.available[reservation.part_id] += quantity
+
+    # Make sure a reservation is active for another ttl seconds, taking its
+    # units out of stock again if it had expired.
+    def renew(self, reservation, ttl = None):
+        stripe = self._stripe(reservation.part_id)
+        now = self._clock()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with stripe.lock:
+            if not self._tracked(stripe, reservation.part_id):
+                reservation.expires = expires
+                return
+            self._reclaim(stripe, now)
+            if reservation.id not in stripe.reservations:
+                if stripe.available[reservation.part_id] < reservation.quantity:
+                    raise PartException(f"{reservation.part_id} is out of "
+                                        "stock.\n")
+                stripe.available[reservation.part_id] -= reservation.quantity
+                stripe.reservations[reservation.id] = reservation
+            reservation.expires = expires
+            heapq.heappush(stripe.expiries, (expires, reservation.id))
+
+    # Turn reservations into sales. All of them are renewed first, so either
+    # every reservation is committed or a PartException names a part that
+    # ran out and none are.
+    def commit(self, reservations):
+        for reservation in reservations:
+            self.renew(reservation)
+        for reservation in reservations:
+            stripe = self._stripe(reservation.part_id)
+            with stripe.lock:
+                stripe.reservations.pop(reservation.id, None)
+
+# States of a part's slot in shared stock: its count not read yet, counted,
+# or sold without a limit.
+_UNREAD, _COUNTED, _UNLIMITED = 0, 1, 2
+
+class SharedStock:
+    """Stock counts in shared memory, with locks shared between processes.
+
+    Each part of an inventory snapshot has a slot, numbered by its position
+    in the snapshot, holding its count and whether the count was read. Make
+    one before starting the worker processes, pass it to each, and open a
+    SharedStockLedger on it there. close() frees the memory once every
+    worker has stopped.
+    """
+    def __init__(self, parts, stripes = 64):
+        self.parts = parts
+        # A count of 8 bytes, then a state byte, for each slot.
+        self.memory = shared_memory.SharedMemory(create = True,
+                                                 size = max(1, parts * 9))
+        self.locks = [multiprocessing.Lock() for _ in range(stripes)]
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+class _SharedCounts:
+    """The available units of every stripe of a SharedStockLedger, kept in
+    the slots of a SharedStock."""
+    def __init__(self, shared, position):
+        self._position = position
+        self._counts = shared.memory.buf[:shared.parts * 8].cast("q")
+        self.states = shared.memory.buf[shared.parts * 8:shared.parts * 9]
+        # Part ID -> slot, or None for parts outside the snapshot.
+        self._slots = {}
+
+    # Return the slot of a part, or None if the snapshot does not have it.
+    def slot(self, part_id):
+        try:
+            return self._slots[part_id]
+        except KeyError:
+            slot = self._slots[part_id] = self._position(part_id)
+            return slot
+
+    def release(self):
+        self._counts.release()
+        self.states.release()
+
+    def __contains__(self, part_id):
+        slot = self.slot(part_id)
+        return slot is not None and self.states[slot] == _COUNTED
+
+    def __getitem__(self, part_id):
+        if part_id not in self:
+            raise KeyError(part_id)
+        return self._counts[self.slot(part_id)]
+
+    def __setitem__(self, part_id, count):
+        slot = self.slot(part_id)
+        if slot is None:
+            raise PartException(f"{part_id} is not in the shared "
+                                "inventory.\n")
+        self._counts[slot] = count
+        self.states[slot] = _COUNTED
+
+class _SharedUnlimited:
+    """The unlimited parts of every stripe of a SharedStockLedger. Parts
+    outside the snapshot count as unlimited."""
+    def __init__(self, counts):
+        self._counts = counts
+
+    def __contains__(self, part_id):
+        slot = self._counts.slot(part_id)
+        return slot is None or self._counts.states[slot] == _UNLIMITED
+
+    def add(self, part_id):
+        slot = self._counts.slot(part_id)
+        if slot is not None:
+            self._counts.states[slot] = _UNLIMITED
+
+    def discard(self, part_id):
+        slot = self._counts.slot(part_id)
+        if slot is not None and self._counts.states[slot] == _UNLIMITED:
+            self._counts.states[slot] = _UNREAD
+
+class SharedStockLedger(StockLedger):
+    """A StockLedger whose counts are shared with other processes.
+
+    Units reserved or returned in one process are seen by all of them at
+    once, and each stripe is locked across processes. Reservations stay in
+    the process that made them, which reclaims them when they expire.
+    Counts are read on first use with lookup(part_id), and position(part_id)
+    gives the slot of each part, as SnapshotInventory.stock and .position
+    do for the snapshot every process opens.
+    """
+    def __init__(self, shared, position, lookup, ttl = 900.0,
+                 clock = time.monotonic):
+        super().__init__(len(shared.locks), ttl, clock)
+        self._counts = _SharedCounts(shared, position)
+        unlimited = _SharedUnlimited(self._counts)
+        for stripe, lock in zip(self._stripes, shared.locks):
+            stripe.lock = lock
+            stripe.available = self._counts
+            stripe.unlimited = unlimited
+        self.load_from(lookup)
+
+    # Parts are striped by slot, so every process locks the same stripe for
+    # a part.
+    def _stripe(self, part_id):
+        slot = self._counts.slot(part_id)
+        if slot is None:
+            return super()._stripe(part_id)
+        return self._stripes[slot % len(self._stripes)]
+
+    # Let go of the shared memory. The ledger cannot be used afterwards.
+    def close(self):
+        self._counts.release()
@@ -3,41 +3,217 @@
 A program that allows users to purchase individual computer components from
 an inventory, or build a complete custom computer.
 """
+import argparse
+import atexit
 import sys
+import time
 
+import batch
+from buildcache import BuildCache
+import buildsession
+import commands
 import objects
 import functions
+import money
+import render
+import snapshot
+from index import InventoryIndex
+from journal import Journal
+from metrics import Metrics
+import promotions
+from search import SearchIndex
+from stock import StockLedger
+import solver
+
+# Run the commands in a JSONL request file instead of prompting a customer.
+# Carts and orders are kept in a journal.Journal if one is given, and take
+# the discounts of a promotions.Promotions if one is given.
+def run_batch(inventory, stock, search, requests_file, output_file,
+              metrics = None, journal = None, offers = None):
+    store = commands.Store(inventory, stock, search = search,
+                           metrics = metrics, log = journal,
+                           promotions = offers)
+    try:
+        if journal is not None:
+            start = time.perf_counter()
+            replayed = journal.restore(store)
+            print(f"Restored {len(store.sessions)} sessions from the journal, "
+                  f"replaying {replayed} events in "
+                  f"{time.perf_counter() - start:.3f}s.", file = sys.stderr)
+        if output_file:
+            with open(output_file, "w", encoding = "utf-8") as output:
+                stats = batch.run_batch(store, requests_file, output)
+        else:
+            stats = batch.run_batch(store, requests_file, sys.stdout)
+    except OSError as exc:
+        sys.exit(f"Error: {exc}")
+    finally:
+        if journal is not None:
+            journal.close()
+    print(f"Ran {stats['commands']} commands in {stats['seconds']:.3f}s "
+          f"({stats['commands_per_sec']:.0f} commands/sec).", file = sys.stderr)
+    cache = store.build_cache.stats()
+    print(f"Build cache: {cache['hits']} hits, {cache['misses']} misses, "
+          f"{cache['evictions']} evictions, {cache['size']} of "
+          f"{cache['maxsize']} entries used.", file = sys.stderr)
+
+# Prompts for each slot of a build, and the message for an ID that is not
+# of the slot's type.
+BUILD_PROMPTS = {
+    "motherboard": ("Enter a motherboard ID: ", "Not a valid motherboard ID."),
+    "rams": ("Enter ram IDs separated by a space, or an ID and a count such "
+             "as RAM_01x2: ", "Invalid RAM ID(s)."),
+    "cpu": ("Enter a CPU ID: ", "Not a valid CPU ID."),
+    "psu": ("Enter a PSU ID: ", "Not a valid PSU ID."),
+    "storage": ("Enter a storage ID: ", "Not a valid storage ID."),
+    "storage2": ("Enter another storage ID or press enter to skip: ",
+                 "Not a valid storage ID."),
+    "gpu": ("Enter a GPU ID or press enter to skip: ",
+            "Not a valid GPU ID.")}
+
+# Prompt a customer for the parts of a computer one at a time, checking
+# each against the parts chosen before it with a buildsession.BuildSession
+# and showing what still fits, then add the computer to their cart. Return
+# the computer, or None if it was not built.
+def build_computer(customer, index, stock, build_cache):
+    session = buildsession.BuildSession(index,
+                                        input("Enter a computer ID: ").upper())
+    print("Enter undo or redo at any step to change your parts, or exit to "
+          "stop building.")
+    while True:
+        slot = session.next_slot()
+        if slot is None:
+            answer = input(f"Press enter to build {session.computer_id}, or "
+                           "enter undo to change a part: ").upper()
+            if "" == answer:
+                break
+        else:
+            prompt, invalid = BUILD_PROMPTS[slot]
+            answer = input(prompt).upper()
+        if "EXIT" == answer:
+            print(f"{session.computer_id} was not built.\n")
+            return None
+        if answer in ("UNDO", "REDO"):
+            try:
+                session.undo() if "UNDO" == answer else session.redo()
+            except functions.PartException as exc:
+                print(exc.value)
+                continue
+            render.show(render.build_session(session))
+            continue
+        if slot is None:
+            continue
+        try:
+            if "rams" == slot:
+                choice = functions.validate_parts(index, answer.split(), "RAM")
+            elif "" == answer and slot in buildsession.OPTIONAL:
+                choice = None
+            else:
+                choice = functions.validate_part(index, answer,
+                                                 buildsession.SLOTS[slot])
+        except functions.PartException:
+            print(invalid)
+            continue
+        # A part that breaks a rule with the parts before it is refused
+        # here, so only that part has to be chosen again.
+        try:
+            session.choose(slot, choice)
+        except functions.PartException as exc:
+            print(exc.value)
+            continue
+        render.show(render.build_session(session))
+    try:
+        computer = session.build(customer, stock, build_cache)
+    except functions.PartException as err:
+        print(f"Could not build computer:\n{err.value}\n")
+        return None
+    render.show(render.compatible_build(computer))
+    return computer
 
 def main():
     # Ensure inventory.json is passed as a positional argument when running
     # this program.
-    if len(sys.argv) != 2:
-        raise IndexError("Pass inventory.json as positional argument.")
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument("inventory", help = "inventory json file")
+    parser.add_argument("--batch", metavar = "REQUESTS",
+                        help = "run the commands in a JSONL request file")
+    parser.add_argument("--output", metavar = "RESULTS",
+                        help = "write batch results to this file instead of "
+                               "standard output")
+    parser.add_argument("--journal", metavar = "DIRECTORY",
+                        help = "keep batch carts and orders in a journal in "
+                               "this directory, restoring them on start")
+    parser.add_argument("--promotions", metavar = "FILE",
+                        help = "take the promotions in this json file off "
+                               "carts")
+    parser.add_argument("--compact", action = "store_true",
+                        help = "keep a json inventory in compact columns "
+                               "instead of one object per part")
+    Metrics.add_arguments(parser)
+    args = parser.parse_args()
 
     # Load inventory.json into a Python dictionary that maps part IDs to their
-    # respective object.
-    inventory = functions.create_inventory(sys.argv[1])
+    # respective object, or into an objects.PartStore with --compact, or
+    # open its compiled snapshot if one is up to date.
+    # Stock counts are loaded alongside and reserved as parts enter carts,
+    # and part names and attributes are indexed for search.
+    # With --profile, metrics are written out when the program exits.
+    # Promotions are compiled for the inventory once it is loaded.
+    stock = StockLedger()
+    search = SearchIndex()
+    offers = None
+    try:
+        metrics = Metrics.from_args(args)
+        start = time.perf_counter()
+        inventory = snapshot.load_inventory(args.inventory, stock = stock,
+                                            search = search,
+                                            compact = args.compact)
+        if args.promotions:
+            offers = promotions.load_promotions(args.promotions, inventory)
+    except functions.PartException as exc:
+        sys.exit(f"Error: {exc.value}")
+    if metrics is not None:
+        metrics.set("inventory_load_seconds", time.perf_counter() - start)
+        metrics.set("inventory_parts", len(inventory))
+        atexit.register(metrics.dump)
+    if args.batch:
+        run_batch(inventory, stock, search, args.batch, args.output, metrics,
+                  Journal(args.journal) if args.journal else None, offers)
+        return
+    # Index the inventory by type, socket and price for faster lookups, as
+    # the indexes are first used. The catalog is made on first recommend.
+    index = InventoryIndex(inventory)
+    catalog = None
+    # Reuse the results of builds tried before.
+    build_cache = BuildCache()
+    if metrics is not None:
+        metrics.watch_cache("build", build_cache.stats)
 
     # Prompt user for their name and budget.
     name = input("Enter your name: ")
     while True:
         try:
-            budget_amt = float(input("Enter your budget: "))
-        except ValueError:
-            print("Please enter a numerical amount.")
+            budget_amt = money.to_cents(input("Enter your budget: "),
+                                        positive = True)
+        except ValueError as exc:
+            print(f"Please enter a numerical amount: {exc}.")
         else:
             break
 
     # Create new customer with given name and budget.
-    customer = objects.Customer(name, budget_amt)
+    customer = objects.Customer(name, budget_amt,
+                                objects.Cart(promotions = offers))
     computer = None
 
     command = input((f"Hello {customer.name}, how can I help you today? "
                      "Enter \'help\' to see all commands: "))
 
     while "exit" != command:
+        # Commands here wait on prompts, so they are counted but not timed.
+        if metrics is not None and command in functions.list_commands():
+            metrics.count(command)
         if "help" == command:
-            functions.list_commands()
+            render.show(render.commands(functions.list_commands()))
 
         elif "list" == command:
             # Prompt user for a specific category to list.
@@ -50,7 +226,8 @@ def main():
                     break
                 elif category in ["", "CPU", "GPU", "RAM", "PSU",
                                   "Motherboard", "Storage"]:
-                    functions.list_parts(inventory, category)
+                    render.show(render.parts(functions.list_parts(
+                        inventory, category, index)))
                     break
                 print("Not a valid category.")
 
@@ -62,12 +239,13 @@ def main():
                     break
                 try:
                     if part_id == computer.id:
-                        functions.details(inventory, computer)
+                        part = functions.details(inventory, computer)
                     else:
-                        functions.details(inventory, part_id)
+                        part = functions.details(inventory, part_id)
                 except functions.PartException as exc:
                     print(f"Error: {exc.value}")
                 else:
+                    render.show(render.part(part))
                     break
 
         elif "compatibility" == command:
@@ -80,100 +258,17 @@ def main():
                 if "EXIT" == part_id2:
                     break
                 try:
-                    functions.compatibility(inventory, part_id1, part_id2)
+                    verdict = functions.compatibility(inventory, part_id1,
+                                                      part_id2)
                 except functions.PartException as exc:
                     print(f"Error: {exc.value}")
                 else:
+                    render.show(render.compatibility(verdict))
                     break
 
         elif "build" == command:
-            # Prompt user for computer components.
-            computer_id = input("Enter a computer ID: ").upper()
-            while True:
-                motherboard = input("Enter a motherboard ID: ").upper()
-                if "EXIT" == motherboard:
-                    break
-                elif motherboard in ["MB_01", "MB_02", "MB_03",
-                                     "MB_04", "MB_05"]:
-                    motherboard = inventory[motherboard]
-                    break
-                print("Not a valid motherboard ID.")
-            while True:
-                ram_objects_list = []
-                rams = input("Enter ram IDs separated by a space: ").upper()
-                if "EXIT" == rams:
-                    break
-                rams_list = rams.split()
-                valid_rams = True
-                # Check if RAM IDs are valid.
-                for ram in rams_list:
-                    if ram not in ["RAM_01", "RAM_02", "RAM_03",
-                                   "RAM_04", "RAM_05"]:
-                        valid_rams = False
-                    else:
-                        ram_objects_list.append(inventory[ram])
-                if valid_rams:
-                    break
-                print("Invalid RAM ID(s).")
-            while True:
-                cpu = input("Enter a CPU ID: ").upper()
-                if "EXIT" == cpu:
-                    break
-                elif cpu in ["CPU_01", "CPU_02", "CPU_03",
-                             "CPU_04", "CPU_05"]:
-                    cpu = inventory[cpu]
-                    break
-                print("Not a valid CPU ID.")
-            while True:
-                psu = input("Enter a PSU ID: ").upper()
-                if "EXIT" == psu:
-                    break
-                elif psu in ["PSU_01", "PSU_02", "PSU_03",
-                             "PSU_04", "PSU_05"]:
-                    psu = inventory[psu]
-                    break
-                print("Not a valid PSU ID.")
-            while True:
-                storage = input("Enter a storage ID: ").upper()
-                if "EXIT" == storage:
-                    break
-                elif storage in ["STORAGE_01", "STORAGE_02", "STORAGE_03",
-                                 "STORAGE_04", "STORAGE_05"]:
-                    storage = inventory[storage]
-                    break
-                print("Not a valid storage ID.")
-            while True:
-                storage2 = input(("Enter another storage ID or "
-                                  "press enter to skip: ")).upper()
-                if "EXIT" == storage2:
-                    break
-                elif storage2 in ["STORAGE_01", "STORAGE_02", "STORAGE_03",
-                                  "STORAGE_04", "STORAGE_05"]:
-                    storage2 = inventory[storage2]
-                    break
-                elif "" == storage2:
-                    storage2 = None
-                    break
-                print("Not a valid storage ID.")
-            while True:
-                gpu = input("Enter a GPU ID or press enter to skip: ").upper()
-                if "EXIT" == gpu:
-                    break
-                elif gpu in ["GPU_01", "GPU_02", "GPU_03", "GPU_04", "GPU_05"]:
-                    gpu = inventory[gpu]
-                    break
-                elif "" == gpu:
-                    gpu = None
-                    break
-                print("Not a valid GPU ID.")
-            try:
-                computer = functions.build(customer, computer_id, motherboard,
-                                 ram_objects_list, cpu, psu, storage,
-                                 storage2, gpu)
-            except AttributeError:
-                print("Could not build computer.\n")
-            except functions.PartException as err:
-                print(f"Could not build computer: {err}\n")
+            computer = build_computer(customer, index, stock,
+                                      build_cache) or computer
 
         elif "remove" == command:
             # Prompt user for specific part/computer ID(s).
@@ -190,10 +285,12 @@ def main():
                             part_ids_list.remove(item)
                             part_ids_list.append(computer)
                 try:
-                    functions.remove(customer, inventory, *part_ids_list)
+                    removed = functions.remove(customer, inventory,
+                                               *part_ids_list, stock = stock)
                 except functions.PartException as exc:
                     print(f"Error: {exc.value}")
                 else:
+                    render.show(render.removed(removed))
                     break
                 if not customer.cart:
                     print("Cart is empty.\n")
@@ -203,38 +300,109 @@ def main():
             if not computer:
                 print("Build a computer first.\n")
             else:
-                functions.compatibility_build(computer)
+                try:
+                    functions.compatibility_build(computer, build_cache)
+                except functions.PartException as err:
+                    print(f"{err.value}\n")
+                else:
+                    render.show(render.compatible_build(computer))
 
         elif "budget" == command:
             # Prompt user for new budget.
             while True:
                 try:
-                    new_budget = float(input("Enter your budget: "))
-                except ValueError:
-                    print("Please enter a numerical amount.")
+                    new_budget = money.to_cents(input("Enter your budget: "),
+                                                positive = True)
+                except ValueError as exc:
+                    print(f"Please enter a numerical amount: {exc}.")
                 else:
                     break
             customer.budget = new_budget
-            print(f"Your new budget is ${customer.budget:.2f}\n")
+            print(f"Your new budget is "
+                  f"{money.format_cents(customer.budget)}\n")
 
         elif "purchase" == command:
-            # Prompt user for a part ID.
+            # Prompt user for part ID(s).
             while True:
-                part_id = input("Enter a part ID: ").upper()
-                if "EXIT" == part_id:
+                part_ids = input("Enter part ID(s) separated by spaces: "
+                                 ).upper().split()
+                if ["EXIT"] == part_ids:
+                    break
+                if not part_ids:
+                    continue
+                try:
+                    if 1 == len(part_ids):
+                        added = functions.purchase(customer, inventory,
+                                                   part_ids[0], stock)
+                    else:
+                        added = functions.purchase_many(customer, inventory,
+                                                        part_ids, stock)
+                except functions.PartException as exc:
+                    print(f"Error: {exc.value}")
+                else:
+                    render.show(render.added(added))
+                    break
+
+        elif "recommend" == command:
+            # Prompt user for what to optimize and how many builds to show.
+            while True:
+                objective = input(("Enter what to optimize for (ram, "
+                                   "storage, gpu, cheapest): ")).lower()
+                if "exit" == objective:
+                    break
+                count = input(("Enter the number of builds to show or "
+                               "press enter for 5: "))
+                if "exit" == count:
                     break
                 try:
-                    functions.purchase(customer, inventory, part_id)
+                    if catalog is None:
+                        catalog = solver.Catalog(inventory, index)
+                    builds = functions.recommend(customer, inventory,
+                                                 objective,
+                                                 int(count) if count else 5,
+                                                 catalog)
+                except ValueError:
+                    print("Please enter a whole number of builds.")
+                except functions.PartException as exc:
+                    print(f"Error: {exc.value}")
+                else:
+                    render.show(render.recommendations(
+                        builds, solver.OBJECTIVES[objective].description,
+                        customer.budget))
+                    break
+
+        elif "search" == command:
+            # Prompt user for words to search for, then show a page of
+            # results at a time.
+            while True:
+                query = input("Enter words to search for: ")
+                if "exit" == query:
+                    break
+                page = 1
+                try:
+                    while True:
+                        results = functions.search(search, query, page = page)
+                        render.show(render.search_results(results))
+                        if not results.more or input(
+                                "Press enter for more results or enter exit: "
+                                ) == "exit":
+                            break
+                        page += 1
                 except functions.PartException as exc:
                     print(f"Error: {exc.value}")
                 else:
                     break
 
         elif "cart" == command:
-            customer.view_cart()
+            render.show(render.cart(customer))
 
         elif "checkout" == command:
-            functions.checkout(customer)
+            try:
+                receipt = functions.checkout(customer, stock)
+            except functions.PartException as exc:
+                print(exc.value)
+            else:
+                render.show(render.receipt(receipt))
 
         command = input("Enter a command: ")
 
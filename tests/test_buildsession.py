@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests buildsession.BuildSession: choices checked against the parts chosen
+before them, the parts each open slot narrows to, and undoing and redoing
+choices.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import buildsession
+import functions
+from index import InventoryIndex
+
+INVENTORY = os.path.join(os.path.dirname(__file__), "..", "inventory.json")
+
+class BuildSessionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.inventory = functions.create_inventory(INVENTORY)
+        cls.index = InventoryIndex(cls.inventory)
+
+    def setUp(self):
+        self.session = buildsession.BuildSession(self.index, "PC")
+
+    # Choose the parts with the given IDs for a slot, a list of IDs for
+    # "rams".
+    def choose(self, slot, part_id):
+        if isinstance(part_id, list):
+            choice = [self.inventory[ram_id] for ram_id in part_id]
+        else:
+            choice = None if part_id is None else self.inventory[part_id]
+        self.session.choose(slot, choice)
+
+    # Return the IDs of the parts that fit a slot.
+    def candidate_ids(self, slot):
+        return [part.id for part in self.session.candidates(slot)]
+
+    def test_choice_breaking_a_rule_is_refused(self):
+        self.choose("motherboard", "MB_01")
+        with self.assertRaises(functions.BuildException) as caught:
+            self.choose("cpu", "CPU_02")
+        self.assertEqual([violation.rule
+                          for violation in caught.exception.violations],
+                         ["socket"])
+        with self.assertRaises(functions.BuildException):
+            self.choose("rams", ["RAM_01"] * 5)
+        with self.assertRaises(functions.PartException):
+            self.choose("cpu", "GPU_01")
+        with self.assertRaises(functions.PartException):
+            self.choose("psu", None)
+        # Refused choices leave the session as it was.
+        self.assertEqual(list(self.session.choices), ["motherboard"])
+        self.assertEqual(self.session.next_slot(), "rams")
+
+    def test_candidates_narrow(self):
+        self.choose("motherboard", "MB_01")
+        self.assertEqual(self.candidate_ids("cpu"),
+                         ["CPU_01", "CPU_03", "CPU_05"])
+        self.choose("rams", ["RAM_01", "RAM_01"])
+        self.choose("cpu", "CPU_05")
+        self.assertEqual(self.session.power_draw, 820)
+        self.assertEqual(self.candidate_ids("psu"),
+                         ["PSU_01", "PSU_03", "PSU_02", "PSU_04"])
+        self.choose("psu", "PSU_01")
+        self.assertEqual(self.session.headroom, 130)
+        self.assertEqual(self.candidate_ids("gpu"), [])
+        self.assertEqual(self.session.count("gpu"), 0)
+        self.assertEqual(self.candidate_ids("cpu"),
+                         ["CPU_01", "CPU_03", "CPU_05"])
+        # The smallest PSU cannot power the CPU chosen, and without it
+        # leaves room for the two CPUs drawing least.
+        with self.assertRaises(functions.BuildException):
+            self.choose("psu", "PSU_05")
+        self.session.undo()
+        self.session.undo()
+        self.choose("psu", "PSU_05")
+        self.assertEqual(self.candidate_ids("cpu"), ["CPU_01", "CPU_03"])
+        self.assertEqual(self.session.candidates("cpu", limit = 1)[0].id,
+                         "CPU_01")
+
+    def test_candidates_match_rules(self):
+        rng = random.Random(0)
+        slots = list(buildsession.SLOTS)
+        for _ in range(200):
+            self.session = buildsession.BuildSession(self.index)
+            for slot in rng.sample(slots, rng.randint(0, len(slots))):
+                options = self.index.parts(buildsession.SLOTS[slot])
+                part = rng.choice(options)
+                choice = [part] * rng.randint(1, 8) if slot == "rams" \
+                    else part
+                try:
+                    self.session.choose(slot, choice)
+                except functions.BuildException:
+                    pass
+            for slot, part_type in buildsession.SLOTS.items():
+                fitting = {part.id for part in self.index.parts(part_type)
+                           if not self.session.violations(
+                               slot, [part] if slot == "rams" else part)}
+                self.assertEqual(set(self.candidate_ids(slot)), fitting,
+                                 (slot, self.session.choices))
+                self.assertEqual(self.session.count(slot), len(fitting))
+
+    def test_undo_and_redo(self):
+        self.choose("motherboard", "MB_01")
+        self.choose("rams", ["RAM_02"] * 2)
+        self.choose("motherboard", "MB_03")
+        self.session.undo()
+        self.assertEqual(self.session.choices["motherboard"].id, "MB_01")
+        self.session.undo()
+        self.assertEqual(list(self.session.choices), ["motherboard"])
+        self.session.redo()
+        self.session.redo()
+        self.assertEqual(self.session.choices["motherboard"].id, "MB_03")
+        self.assertEqual(len(self.session.choices["rams"]), 2)
+        with self.assertRaises(functions.PartException):
+            self.session.redo()
+        # A new choice drops the choices undone.
+        self.session.undo()
+        self.choose("cpu", "CPU_01")
+        with self.assertRaises(functions.PartException):
+            self.session.redo()
+        for _ in range(3):
+            self.session.undo()
+        self.assertEqual(self.session.choices, {})
+        with self.assertRaises(functions.PartException):
+            self.session.undo()
+
+    def test_build_needs_every_slot(self):
+        self.choose("motherboard", "MB_01")
+        self.choose("cpu", "CPU_01")
+        with self.assertRaises(functions.PartException) as caught:
+            self.session.build(None)
+        self.assertEqual(caught.exception.value,
+                         "Choose a RAM, a PSU, a Storage first.\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests bulk.validate_builds: the NumPy and plain Python paths agree with each
+other and with checking each build's Computer against the rules, for builds
+that pass, break rules, have the wrong parts or name unknown parts.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import bulk
+import functions
+import rules
+
+INVENTORY = os.path.join(os.path.dirname(__file__), "..", "inventory.json")
+
+class ValidateBuildsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.inventory = functions.create_inventory(INVENTORY)
+        rng = random.Random(0)
+        ids = {}
+        for part in cls.inventory.values():
+            ids.setdefault(part.type, []).append(part.id)
+        cls.builds = [["MB_01", "CPU_01", "PSU_02", "STORAGE_01", "RAM_01",
+                       "RAM_01"],
+                      ["MB_01", "CPU_02", "PSU_05", "STORAGE_01", "RAM_01",
+                       "RAM_02", "GPU_05"],
+                      ["CPU_01", "MB_01", "PSU_01", "NOT_A_PART"],
+                      [],
+                      ["MB_02", "CPU_02", "PSU_04", "STORAGE_01",
+                       "STORAGE_02", "STORAGE_03", "RAM_01"]]
+        for _ in range(500):
+            build = [rng.choice(ids["Motherboard"]), rng.choice(ids["CPU"]),
+                     rng.choice(ids["PSU"]), rng.choice(ids["Storage"])]
+            build += [rng.choice(ids["RAM"])] * rng.randint(0, 7)
+            if rng.random() < 0.3:
+                build.append(rng.choice(ids["RAM"]))
+            if rng.random() < 0.5:
+                build.append(rng.choice(ids["GPU"]))
+            rng.shuffle(build)
+            cls.builds.append(build)
+
+    def test_known_verdicts(self):
+        verdicts = bulk.validate_builds(self.inventory, self.builds[:5])
+        self.assertEqual(list(map(bool, verdicts.ok)),
+                         [True, False, False, False, False])
+        self.assertEqual([violation.rule
+                          for violation in verdicts[1].violations],
+                         ["socket", "ram-id", "power"])
+        self.assertEqual(verdicts[0].price, 70000)
+        self.assertEqual(verdicts[0].power_draw, 420)
+        self.assertEqual(verdicts[2].violations[0].message,
+                         "NOT_A_PART is not a valid part ID.")
+        self.assertEqual({violation.rule for violation
+                          in verdicts[4].violations}, {"parts"})
+
+    @unittest.skipIf(bulk.np is None, "NumPy is not installed")
+    def test_numpy_matches_python(self):
+        with_numpy = bulk.validate_builds(self.inventory, self.builds)
+        plain = bulk.validate_builds(self.inventory, self.builds,
+                                     use_numpy = False)
+        self.assertIsInstance(with_numpy.ok, bulk.np.ndarray)
+        self.assertIsInstance(plain.ok, list)
+        self.assertEqual(with_numpy.to_dicts(), plain.to_dicts())
+
+    def test_matches_rules(self):
+        verdicts = bulk.validate_builds(self.inventory, self.builds)
+        for build, verdict in zip(self.builds, verdicts):
+            if any(violation.rule == "parts"
+                   for violation in verdict.violations):
+                continue
+            computer = bulk._computer(self.inventory, build)
+            self.assertEqual(list(verdict.violations),
+                             rules.validate(computer), build)
+            self.assertEqual(verdict.price, computer.price)
+            self.assertEqual(verdict.power_draw, computer.power_draw)
+
+    def test_extra_rule(self):
+        rules.register_rule("no-gpu", "Builds have no GPU.",
+                            lambda computer: None if computer.gpu is None
+                            else rules.Violation("no-gpu", "No GPUs."))
+        self.addCleanup(rules.RULES.pop, "no-gpu")
+        for use_numpy in (True, False):
+            verdicts = bulk.validate_builds(self.inventory, self.builds[:2],
+                                            use_numpy = use_numpy)
+            self.assertTrue(verdicts[0].ok)
+            self.assertEqual(verdicts[1].violations[-1].rule, "no-gpu")
+
+if __name__ == "__main__":
+    unittest.main()
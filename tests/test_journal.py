@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Tests restoring journal.Journal into a store: after a clean close, after a
+snapshot written in the background, and after a crash left the last line
+of the log or of a long order half written, with the stock the carts held
+reserved again.
+
+Usage: python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import commands
+import functions
+from journal import Journal, sessions_state
+from stock import StockLedger
+
+INVENTORY = os.path.join(os.path.dirname(__file__), "..", "inventory.json")
+
+# Requests as (customer, command, args): carts filled, a computer built,
+# parts taken out again and one order placed.
+REQUESTS = [
+    ("alice", "budget", {"amount": 5000}),
+    ("alice", "purchase", {"part_id": "CPU_01", "quantity": 2}),
+    ("alice", "purchase", {"part_ids": ["RAM_01", "GPU_01"]}),
+    ("bob", "budget", {"amount": 3000}),
+    ("bob", "build", {"computer_id": "pc1", "motherboard": "MB_01",
+                      "rams": ["RAM_01", "RAM_01"], "cpu": "CPU_01",
+                      "psu": "PSU_02", "storage": "STORAGE_01"}),
+    ("alice", "remove", {"items": ["CPU_01"]}),
+    ("carol", "budget", {"amount": 1000}),
+    ("carol", "purchase", {"part_id": "MB_02", "quantity": 3}),
+    ("carol", "checkout", {}),
+    ("carol", "purchase", {"part_id": "STORAGE_02"}),
+]
+
+class JournalRestoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    # Return a store over a freshly loaded inventory and stock, with the
+    # journal restored into it, and the journal.
+    def open_store(self, snapshot_every = 10_000):
+        stock = StockLedger()
+        inventory = functions.create_inventory(INVENTORY, stock = stock)
+        journal = Journal(self.directory, snapshot_every = snapshot_every)
+        store = commands.Store(inventory, stock, matrix = False,
+                               log = journal)
+        journal.restore(store)
+        return store, journal
+
+    # Run requests against a store, failing on any error.
+    def run_requests(self, store, requests):
+        for customer, command, args in requests:
+            result = commands.execute(store, customer, command, args)
+            self.assertTrue(result["ok"], result)
+
+    # Return the sessions of a store as a snapshot holds them, and the
+    # units of every part available to reserve.
+    @staticmethod
+    def state(store):
+        return (sessions_state(store),
+                {part_id: store.stock.available(part_id)
+                 for part_id in store.inventory})
+
+    # Run the requests, close the journal and return the state of the store
+    # before closing.
+    def shop(self, snapshot_every = 10_000):
+        store, journal = self.open_store(snapshot_every)
+        self.run_requests(store, REQUESTS)
+        expected = self.state(store)
+        journal.close()
+        return expected
+
+    def test_restore_after_close(self):
+        expected = self.shop()
+        store, journal = self.open_store()
+        self.addCleanup(journal.close)
+        self.assertEqual(self.state(store), expected)
+        self.assertEqual(journal.orders, 1)
+        self.assertEqual(journal.sold, {"MB_02": 3})
+
+    def test_restore_after_checkpoint(self):
+        expected = self.shop(snapshot_every = 4)
+        with open(os.path.join(self.directory, "snapshot.json"),
+                  encoding = "utf-8") as file:
+            snapshot = json.load(file)
+        with open(os.path.join(self.directory, "log.jsonl"),
+                  encoding = "utf-8") as file:
+            logged = [json.loads(line)["seq"] for line in file]
+        # The log holds just the events after the snapshot.
+        self.assertTrue(0 < snapshot["seq"] <= len(REQUESTS))
+        self.assertEqual(logged, list(range(snapshot["seq"] + 1,
+                                            len(REQUESTS) + 1)))
+        store, journal = self.open_store()
+        self.addCleanup(journal.close)
+        self.assertEqual(self.state(store), expected)
+        self.assertEqual(journal.seq, len(REQUESTS))
+
+    def test_restore_after_torn_line(self):
+        expected = self.shop()
+        path = os.path.join(self.directory, "log.jsonl")
+        size = os.path.getsize(path)
+        with open(path, "ab") as file:
+            file.write(b'{"seq": 11, "customer": "alice", "op": "ad')
+        store, journal = self.open_store()
+        self.addCleanup(journal.close)
+        self.assertEqual(self.state(store), expected)
+        self.assertEqual(os.path.getsize(path), size)
+        # Events go on from the last whole one.
+        self.run_requests(store, [("alice", "purchase",
+                                   {"part_id": "GPU_02"})])
+        self.assertEqual(journal.seq, len(REQUESTS) + 1)
+
+    def test_restore_after_long_order(self):
+        self.shop()
+        path = os.path.join(self.directory, "orders.jsonl")
+        with open(path, encoding = "utf-8") as file:
+            order = json.loads(file.readline())
+        # An order line longer than a chunk of the file read at a time,
+        # after an earlier one and before a line left half written.
+        order["padding"] = "x" * 100_000
+        lines = (json.dumps({**order, "seq": 1}) + "\n" +
+                 json.dumps(order) + "\n")
+        with open(path, "w", encoding = "utf-8") as file:
+            file.write(lines + '{"seq": 1')
+        store, journal = self.open_store()
+        journal.close()
+        # The order was found in the file, so it was not recorded again.
+        with open(path, encoding = "utf-8") as file:
+            self.assertEqual(file.read(), lines)
+        self.assertEqual(store.sessions["carol"].customer.cart.count, 1)
+
+    def test_restore_reserves_stock_again(self):
+        self.shop()
+        store, journal = self.open_store()
+        self.addCleanup(journal.close)
+        fresh = StockLedger()
+        functions.create_inventory(INVENTORY, stock = fresh)
+        # Units held by the carts, or sold.
+        held = {"CPU_01": 2, "RAM_01": 3, "GPU_01": 1, "MB_01": 1,
+                "PSU_02": 1, "STORAGE_01": 1, "STORAGE_02": 1,
+                "MB_02": 3}
+        for part_id in store.inventory:
+            self.assertEqual(store.stock.available(part_id),
+                             fresh.available(part_id) -
+                             held.get(part_id, 0), part_id)
+        # Reservations are held by the carts again, so removing parts gives
+        # their stock back.
+        self.run_requests(store, [("alice", "remove",
+                                   {"items": ["CPU_01", "GPU_01"]})])
+        self.assertEqual(store.stock.available("CPU_01"),
+                         fresh.available("CPU_01") - 1)
+        self.assertEqual(store.stock.available("GPU_01"),
+                         fresh.available("GPU_01"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests money: amounts taken in as whole cents and refused outside their
+bounds, cents shown as dollars, and LineTotals summing a cart with and
+without NumPy.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import money
+
+class ToCentsTest(unittest.TestCase):
+    def test_amounts(self):
+        self.assertEqual(money.to_cents(19), 1900)
+        self.assertEqual(money.to_cents(19.99), 1999)
+        self.assertEqual(money.to_cents(0.29), 29)
+        self.assertEqual(money.to_cents(1.005e2), 10050)
+        self.assertEqual(money.to_cents("19.99"), 1999)
+        self.assertEqual(money.to_cents(" $19.9 "), 1990)
+        self.assertEqual(money.to_cents("1e3"), 100000)
+        self.assertEqual(money.to_cents(0), 0)
+        self.assertIsInstance(money.to_cents(19.99), int)
+
+    def test_fractions_of_a_cent_are_refused(self):
+        # 0.1 + 0.2 is not 0.3 as a float, and is not taken as 30 cents.
+        for amount in ("19.999", 0.001, 0.1 + 0.2, "0.0001"):
+            with self.assertRaises(ValueError, msg = amount) as caught:
+                money.to_cents(amount)
+            self.assertIn("whole number of cents", str(caught.exception))
+
+    def test_not_amounts_are_refused(self):
+        for amount in (True, None, "abc", "", "nan", float("inf"), "-inf",
+                       [19]):
+            with self.assertRaises(ValueError, msg = amount):
+                money.to_cents(amount)
+
+    def test_bounds(self):
+        self.assertEqual(money.to_cents(10 ** 9), money.MAX_CENTS)
+        self.assertEqual(money.to_cents("1000000000.00"), money.MAX_CENTS)
+        for amount in (10 ** 9 + 1, "1000000000.01", 1e10):
+            with self.assertRaises(ValueError, msg = amount) as caught:
+                money.to_cents(amount)
+            self.assertIn("above $1000000000.00", str(caught.exception))
+        for amount in (-1, -0.01, "-5", "$-5"):
+            with self.assertRaises(ValueError, msg = amount):
+                money.to_cents(amount)
+        self.assertEqual(money.to_cents("0.01", positive = True), 1)
+        for amount in (0, 0.0, "0.00"):
+            with self.assertRaises(ValueError, msg = amount) as caught:
+                money.to_cents(amount, positive = True)
+            self.assertIn("not above zero", str(caught.exception))
+
+class DollarsTest(unittest.TestCase):
+    def test_to_dollars(self):
+        self.assertEqual(money.to_dollars(1900), 19)
+        self.assertIsInstance(money.to_dollars(1900), int)
+        self.assertEqual(money.to_dollars(1999), 19.99)
+        self.assertEqual(money.to_dollars(-5), -0.05)
+        self.assertEqual(money.to_cents(money.to_dollars(1999)), 1999)
+
+    def test_format_cents(self):
+        self.assertEqual(money.format_cents(1999), "$19.99")
+        self.assertEqual(money.format_cents(5), "$0.05")
+        self.assertEqual(money.format_cents(0), "$0.00")
+        self.assertEqual(money.format_cents(-500), "-$5.00")
+
+class LineTotalsTest(unittest.TestCase):
+    def test_lines(self):
+        totals = money.LineTotals()
+        totals.set("CPU_01", 10000, 2)
+        totals.set("GPU_01", 10000, 1, discount = 1000)
+        self.assertEqual(len(totals), 2)
+        self.assertEqual(totals.total(), 29000)
+        self.assertEqual(totals.discount(), 1000)
+        totals.set("CPU_01", 12000, 1)
+        self.assertEqual(totals.total(), 21000)
+        # A line set to no units is dropped and its slot goes to the next
+        # new line.
+        totals.set("GPU_01", 10000, 0)
+        self.assertEqual(len(totals), 1)
+        self.assertEqual(totals.discount(), 0)
+        totals.set("RAM_01", 5000, 3)
+        self.assertEqual(len(totals.prices), 2)
+        self.assertEqual(totals.total(), 27000)
+        totals.set("PSU_01", 8000, 0)
+        self.assertEqual(len(totals), 2)
+
+    def test_long_carts(self):
+        rng = random.Random(0)
+        totals = money.LineTotals()
+        expected = {}
+        for _ in range(2000):
+            key = rng.randrange(300)
+            line = (rng.randint(1, money.MAX_CENTS), rng.randint(0, 5),
+                    rng.randint(0, 100))
+            totals.set(key, *line)
+            expected[key] = line
+        self.assertGreaterEqual(len(totals.prices), money.VECTOR_MIN)
+        self.assertEqual(totals.total(),
+                         sum(price * units - discount
+                             for price, units, discount in expected.values()
+                             if units))
+        self.assertEqual(len(totals),
+                         sum(1 for line in expected.values() if line[1]))
+
+    def test_total_beyond_64_bits(self):
+        totals = money.LineTotals()
+        for key in range(money.VECTOR_MIN):
+            totals.set(key, money.MAX_CENTS, 10 ** 8)
+        self.assertEqual(totals.total(),
+                         money.VECTOR_MIN * money.MAX_CENTS * 10 ** 8)
+
+    @unittest.skipIf(money.np is None, "NumPy is not installed")
+    def test_numpy_matches_python(self):
+        rng = random.Random(1)
+        totals = money.LineTotals()
+        for key in range(money.VECTOR_MIN * 3):
+            totals.set(key, rng.randint(1, 10 ** 6), rng.randint(1, 9),
+                       rng.randint(0, 1000))
+        with_numpy = totals.total()
+        vector_min = money.VECTOR_MIN
+        money.VECTOR_MIN = len(totals.prices) + 1
+        self.addCleanup(setattr, money, "VECTOR_MIN", vector_min)
+        self.assertEqual(with_numpy, totals.total())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests objects.PartStore against the dict of parts it stands in for: looking
+parts up, changing and deleting them, reusing the rows of deleted parts,
+and carts repriced from it.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import objects
+
+INVENTORY = os.path.join(os.path.dirname(__file__), "..", "inventory.json")
+
+# Fields compared between parts.
+FIELDS = ("id", "type", "name", "price", "power_draw", "socket", "capacity",
+          "power_supplied", "ram_slots", "overclockable")
+
+# Return a part of a type, as create_part makes it from an inventory item.
+def make_part(part_id, part_type, price, **fields):
+    return functions.create_part({"id": part_id, "type": part_type,
+                                  "name": f"{part_type} {part_id}",
+                                  "price": price, **fields})
+
+class PartStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.parts = functions.create_inventory(INVENTORY)
+        self.store = functions.create_inventory(INVENTORY, compact = True)
+
+    # Assert that two parts have the same fields.
+    def assertSamePart(self, part, other):
+        self.assertIs(type(part), type(other))
+        for field in FIELDS:
+            self.assertEqual(getattr(part, field, None),
+                             getattr(other, field, None), field)
+
+    def test_matches_dict(self):
+        self.assertIsInstance(self.store, objects.PartStore)
+        self.assertEqual(list(self.store), list(self.parts))
+        for part_id, part in self.parts.items():
+            self.assertSamePart(self.store[part_id], part)
+
+    def test_delete_reuses_row(self):
+        rows = len(self.store.ids("GPU"))
+        del self.store["GPU_02"]
+        self.assertNotIn("GPU_02", self.store)
+        self.assertIsNone(self.store.ids("GPU")[1])
+        with self.assertRaises(KeyError):
+            self.store["GPU_02"]
+        gpu = make_part("GPU_09", "GPU", 250, power_draw = 450,
+                        overclockable = True)
+        self.store["GPU_09"] = gpu
+        self.assertEqual(len(self.store.ids("GPU")), rows)
+        self.assertEqual(self.store.ids("GPU")[1], "GPU_09")
+        self.assertEqual(self.store.column("GPU", "price")[1], gpu.price)
+        self.assertSamePart(self.store["GPU_09"], gpu)
+        self.assertEqual(len(self.store), len(self.parts))
+
+    def test_replace_with_other_type(self):
+        storage = make_part("GPU_01", "Storage", 80, capacity = 500)
+        self.store["GPU_01"] = storage
+        self.assertSamePart(self.store["GPU_01"], storage)
+        self.assertNotIn("GPU_01", self.store.ids("GPU"))
+
+    def test_parts_looked_up_stay_unchanged(self):
+        before = self.store["CPU_01"]
+        changed = make_part("CPU_01", "CPU", 120, power_draw = 400,
+                            socket = "LGA")
+        self.store["CPU_01"] = changed
+        self.assertEqual(before.price, self.parts["CPU_01"].price)
+        self.assertEqual(self.store["CPU_01"].price, changed.price)
+        del self.store["CPU_01"]
+        self.store["CPU_09"] = make_part("CPU_09", "CPU", 50,
+                                         power_draw = 100, socket = "PGA")
+        self.assertEqual(before.socket, "LGA")
+
+    def test_cart_repriced_from_store(self):
+        cart = objects.Cart()
+        cart.add(self.store["CPU_01"], 2)
+        self.store["CPU_01"] = make_part("CPU_01", "CPU", 120,
+                                         power_draw = 400, socket = "LGA")
+        cart.reprice(self.store["CPU_01"])
+        self.assertEqual(cart.total, 2 * 12000)
+        self.assertEqual(cart.line_totals.total(), cart.total)
+
+    def test_random_changes_match_dict(self):
+        rng = random.Random(0)
+        parts = list(self.parts.values())
+        expected = dict(self.parts)
+        for _ in range(2000):
+            part = rng.choice(parts)
+            if rng.random() < 0.6:
+                self.store[part.id] = part
+                expected[part.id] = part
+            elif part.id in expected:
+                del self.store[part.id]
+                del expected[part.id]
+        self.assertEqual(set(self.store), set(expected))
+        for part_id, part in expected.items():
+            self.assertSamePart(self.store[part_id], part)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests promotions.Promotions on carts: offers on lines, bundles on computers,
+and loose CPUs and motherboards paired by bundles, where several bundles
+cover the same parts.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+import objects
+import promotions
+
+INVENTORY = os.path.join(os.path.dirname(__file__), "..", "inventory.json")
+
+# Two bundles covering the LGA CPUs: one with MB_01 only, one with any LGA
+# motherboard.
+OVERLAPPING = [
+    {"name": "MB_01 bundle", "type": "bundle", "amount": 20,
+     "cpu": {"socket": "LGA"}, "motherboard": {"ids": ["MB_01"]}},
+    {"name": "LGA bundle", "type": "bundle", "amount": 20,
+     "cpu": {"socket": "LGA"}, "motherboard": {"socket": "LGA"}}]
+
+class PromotionsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.inventory = functions.create_inventory(INVENTORY)
+
+    # Return a cart taking the given promotions off.
+    def cart(self, rules):
+        return objects.Cart(promotions = promotions.Promotions(
+            rules, self.inventory))
+
+    # Return a computer of the given CPU and motherboard.
+    def computer(self, cpu_id, motherboard_id):
+        inventory = self.inventory
+        return objects.Computer("PC", inventory[motherboard_id],
+                                [inventory["RAM_01"]], inventory[cpu_id],
+                                inventory["PSU_02"], inventory["STORAGE_01"])
+
+    def test_best_offer_applies(self):
+        cart = self.cart([
+            {"name": "GPU sale", "type": "percent", "percent": 10,
+             "parts": {"category": "GPU"}},
+            {"name": "GPU_01 sale", "type": "percent", "percent": 12.5,
+             "parts": {"ids": ["GPU_01"]}},
+            {"name": "GPU 3 for 2", "type": "multibuy", "buy": 3, "pay": 2,
+             "parts": {"category": "GPU"}}])
+        cart.add(self.inventory["GPU_01"], 2)
+        self.assertEqual(cart.discount, 2500)
+        cart.add(self.inventory["GPU_01"])
+        self.assertEqual(cart.discount, 10000)
+        cart.add(self.inventory["GPU_02"])
+        self.assertEqual(cart.discount, 12000)
+
+    def test_overlapping_bundles_on_loose_parts(self):
+        cart = self.cart(OVERLAPPING)
+        cart.add(self.inventory["CPU_01"])
+        cart.add(self.inventory["MB_03"])
+        self.assertEqual(cart.discount, 2000)
+        # Only the LGA bundle covers MB_03, so the second CPU pairs with
+        # MB_01 through either bundle.
+        cart.add(self.inventory["CPU_03"])
+        cart.add(self.inventory["MB_01"])
+        self.assertEqual(cart.discount, 4000)
+        cart.remove("MB_03")
+        self.assertEqual(cart.discount, 2000)
+        cart.remove("CPU_01")
+        cart.remove("CPU_03")
+        self.assertEqual(cart.discount, 0)
+
+    def test_overlapping_bundles_match_computers(self):
+        cart = self.cart(OVERLAPPING)
+        cart.add_computer(self.computer("CPU_01", "MB_03"))
+        loose = self.cart(OVERLAPPING)
+        loose.add(self.inventory["CPU_01"])
+        loose.add(self.inventory["MB_03"])
+        self.assertEqual(cart.discount, loose.discount)
+
+    def test_overlapping_bundles_divide_units(self):
+        # MB_01 can pair only through the first bundle and MB_03 only
+        # through the second; the CPUs are shared, so the cheaper percent
+        # must go where the dearer one cannot.
+        cart = self.cart([
+            {"name": "MB_01 bundle", "type": "bundle", "percent": 50,
+             "cpu": {"socket": "LGA"}, "motherboard": {"ids": ["MB_01"]}},
+            {"name": "MB_03 bundle", "type": "bundle", "percent": 10,
+             "cpu": {"ids": ["CPU_01"]}, "motherboard": {"ids": ["MB_03"]}}])
+        for part_id in ("CPU_01", "CPU_05", "MB_01", "MB_03"):
+            cart.add(self.inventory[part_id])
+        # CPU_05 with MB_01 at 50%, CPU_01 with MB_03 at 10%.
+        self.assertEqual(cart.discount, 30000 + 4000)
+
+    def test_percent_bundle_pairs_dearest_units(self):
+        cart = self.cart([
+            {"name": "LGA bundle", "type": "bundle", "percent": 10,
+             "cpu": {"socket": "LGA"}, "motherboard": {"socket": "LGA"}}])
+        cart.add(self.inventory["CPU_01"])
+        cart.add(self.inventory["CPU_05"])
+        cart.add(self.inventory["MB_03"])
+        self.assertEqual(cart.discount, (50000 + 30000) // 10)
+
+    def test_bundle_never_below_nothing(self):
+        cart = self.cart([
+            {"name": "Big bundle", "type": "bundle", "amount": 1000,
+             "cpu": {"socket": "LGA"}, "motherboard": {"socket": "LGA"}}])
+        cart.add(self.inventory["CPU_01"])
+        cart.add(self.inventory["MB_01"])
+        self.assertEqual(cart.discount, 20000)
+        self.assertEqual(cart.line_totals.total(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
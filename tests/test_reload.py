@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests reload.InventoryWatcher: diffing a changed inventory.json against the
+live inventory, with a dict of parts or a compact objects.PartStore, and
+reading a delta file, with carts holding changed parts repriced and removed
+parts dropped.
+
+Usage: python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import commands
+import functions
+import reload
+from stock import StockLedger
+
+INVENTORY = os.path.join(os.path.dirname(__file__), "..", "inventory.json")
+
+class ReloadTest(unittest.TestCase):
+    compact = False
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "inventory.json")
+        shutil.copyfile(INVENTORY, self.path)
+        stock = StockLedger()
+        inventory = functions.create_inventory(self.path,
+                                               compact = self.compact,
+                                               stock = stock)
+        self.store = commands.Store(inventory, stock, matrix = False)
+        self.watcher = reload.InventoryWatcher(self.store, self.path)
+
+    # Rewrite inventory.json with its items passed through change, which
+    # returns the item to keep or None to drop it, and the items to append.
+    def rewrite(self, change = lambda item: item, added = ()):
+        with open(self.path, encoding = "utf-8") as file:
+            entries = json.load(file)["inventory"]
+        items = [change(dict(entry["item"])) for entry in entries]
+        items = [item for item in items if item is not None] + list(added)
+        with open(self.path, "w", encoding = "utf-8") as file:
+            json.dump({"inventory": [{"item": item} for item in items]},
+                      file)
+        # Make sure the signature changes within the clock's resolution.
+        stat = os.stat(self.path)
+        os.utime(self.path, ns = (stat.st_atime_ns,
+                                  stat.st_mtime_ns + 1_000_000_000))
+
+    # Run a command for a customer, failing on any error.
+    def run_command(self, customer, command, args):
+        result = commands.execute(self.store, customer, command, args)
+        self.assertTrue(result["ok"], result)
+        return result["result"]
+
+    def test_unchanged_file_changes_nothing(self):
+        self.rewrite()
+        self.assertEqual(self.watcher.poll(), 0)
+
+    def test_diff_applies_only_changes(self):
+        self.run_command("alice", "purchase", {"part_id": "CPU_01",
+                                               "quantity": 2})
+        self.run_command("alice", "purchase", {"part_id": "GPU_02"})
+        available = self.store.stock.available("GPU_02")
+
+        def change(item):
+            if item["id"] == "CPU_01":
+                item["price"] = 150
+            return None if item["id"] == "GPU_02" else item
+
+        self.rewrite(change, [{"id": "GPU_09", "type": "GPU",
+                               "name": "New GPU", "price": 250,
+                               "power_draw": 450, "overclockable": True,
+                               "stock": 2}])
+        self.assertEqual(self.watcher.poll(), 3)
+        inventory = self.store.inventory
+        self.assertEqual(inventory["CPU_01"].price, 15000)
+        self.assertNotIn("GPU_02", inventory)
+        self.assertEqual(inventory["GPU_09"].name, "New GPU")
+        self.assertEqual(self.store.stock.available("GPU_09"), 2)
+        customer = self.store.sessions["alice"].customer
+        self.assertEqual(dict(customer.cart.counts), {"CPU_01": 2})
+        self.assertEqual(customer.cart.total, 2 * 15000)
+        self.assertEqual(customer.cart.line_totals.total(),
+                         customer.cart.total)
+        # The removed part's reservation was given back.
+        self.assertEqual(self.store.stock.available("GPU_02"), available + 1)
+
+    def test_delta_file(self):
+        self.run_command("bob", "purchase", {"part_id": "RAM_01"})
+        with open(self.watcher.delta_file, "w", encoding = "utf-8") as file:
+            file.write(json.dumps({"item": {
+                "id": "RAM_01", "type": "RAM", "name": "MemoryMajesty 8GB",
+                "price": 90, "power_draw": 5, "capacity": 8}}) + "\n")
+            file.write(json.dumps({"remove": "PSU_05"}) + "\n")
+            # A line still being written is left for the next check.
+            file.write('{"remove": "PSU_0')
+        self.assertEqual(self.watcher.poll(), 2)
+        self.assertNotIn("PSU_05", self.store.inventory)
+        self.assertIn("PSU_04", self.store.inventory)
+        cart = self.store.sessions["bob"].customer.cart
+        self.assertEqual(cart.total, 9000)
+        with open(self.watcher.delta_file, "a", encoding = "utf-8") as file:
+            file.write('4"}\n')
+        self.assertEqual(self.watcher.poll(), 1)
+        self.assertNotIn("PSU_04", self.store.inventory)
+
+class CompactReloadTest(ReloadTest):
+    compact = True
+
+if __name__ == "__main__":
+    unittest.main()
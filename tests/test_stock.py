@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests stock.StockLedger: reserving and releasing units, reservations
+expiring and being renewed, and commits that either sell every reservation
+or none of them.
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import functions
+from stock import StockLedger
+
+class Clock:
+    """A clock for the ledger that only moves when told to."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class StockLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.ledger = StockLedger(stripes = 4, ttl = 60.0,
+                                  clock = self.clock)
+        self.ledger.set("CPU_01", 3)
+        self.ledger.set("GPU_01", 1)
+
+    # Assert that reserving units of a part fails as out of stock.
+    def assertOutOfStock(self, part_id, quantity = 1):
+        with self.assertRaises(functions.PartException) as caught:
+            self.ledger.reserve(part_id, quantity)
+        self.assertEqual(caught.exception.value,
+                         f"{part_id} is out of stock.\n")
+
+    def test_reserve_and_release(self):
+        reservation = self.ledger.reserve("CPU_01", 2)
+        self.assertEqual(self.ledger.available("CPU_01"), 1)
+        self.assertOutOfStock("CPU_01", 2)
+        self.assertEqual(self.ledger.available("CPU_01"), 1)
+        self.ledger.release(reservation, 1)
+        self.assertEqual(reservation.quantity, 1)
+        self.assertEqual(self.ledger.available("CPU_01"), 2)
+        self.ledger.release(reservation)
+        self.assertEqual(self.ledger.available("CPU_01"), 3)
+        # Releasing again gives nothing more back.
+        self.ledger.release(reservation)
+        self.assertEqual(self.ledger.available("CPU_01"), 3)
+
+    def test_unlimited_and_looked_up_parts(self):
+        looked_up = []
+
+        def lookup(part_id):
+            looked_up.append(part_id)
+            return 2 if part_id == "RAM_01" else None
+
+        self.ledger.load_from(lookup)
+        self.assertIsNone(self.ledger.available("STORAGE_01"))
+        self.ledger.reserve("STORAGE_01", 1000)
+        self.assertEqual(self.ledger.available("RAM_01"), 2)
+        self.ledger.reserve("RAM_01", 2)
+        self.assertOutOfStock("RAM_01")
+        self.ledger.adjust("RAM_01", 1)
+        self.assertEqual(self.ledger.available("RAM_01"), 1)
+        self.ledger.adjust("STORAGE_01", -1)
+        self.assertEqual(self.ledger.available("STORAGE_01"), -1)
+        self.assertOutOfStock("STORAGE_01")
+        # Each part is looked up once, and parts set are never looked up.
+        self.assertEqual(looked_up, ["STORAGE_01", "RAM_01"])
+
+    def test_reservations_expire(self):
+        first = self.ledger.reserve("CPU_01", 2)
+        self.clock.now = 30.0
+        second = self.ledger.reserve("CPU_01", 1, ttl = 10.0)
+        self.assertEqual(self.ledger.available("CPU_01"), 0)
+        self.clock.now = 40.0
+        self.assertEqual(self.ledger.available("CPU_01"), 1)
+        self.ledger.renew(first)
+        self.clock.now = 60.0
+        self.assertEqual(self.ledger.available("CPU_01"), 1)
+        self.clock.now = 100.0
+        self.assertEqual(self.ledger.available("CPU_01"), 3)
+        # A reservation renewed after it expired takes its units again,
+        # and releasing an expired one gives nothing back.
+        self.ledger.renew(second)
+        self.assertEqual(self.ledger.available("CPU_01"), 2)
+        self.ledger.release(first)
+        self.assertEqual(self.ledger.available("CPU_01"), 2)
+
+    def test_renew_after_units_sold(self):
+        reservation = self.ledger.reserve("GPU_01")
+        self.clock.now = 61.0
+        self.ledger.commit([self.ledger.reserve("GPU_01")])
+        with self.assertRaises(functions.PartException):
+            self.ledger.renew(reservation)
+        self.assertEqual(self.ledger.available("GPU_01"), 0)
+
+    def test_commit_sells_every_reservation(self):
+        reservations = [self.ledger.reserve("CPU_01", 2),
+                        self.ledger.reserve("GPU_01")]
+        self.clock.now = 61.0
+        self.ledger.commit(reservations)
+        self.clock.now = 1000.0
+        self.assertEqual(self.ledger.available("CPU_01"), 1)
+        self.assertEqual(self.ledger.available("GPU_01"), 0)
+        # Sold units never come back to stock.
+        for reservation in reservations:
+            self.ledger.release(reservation)
+        self.assertEqual(self.ledger.available("CPU_01"), 1)
+        self.assertEqual(self.ledger.available("GPU_01"), 0)
+
+    def test_commit_with_a_part_short_sells_nothing(self):
+        reservations = [self.ledger.reserve("CPU_01", 2),
+                        self.ledger.reserve("GPU_01")]
+        self.clock.now = 61.0
+        # The GPU's reservation expired and another customer took the unit.
+        taken = self.ledger.reserve("GPU_01")
+        with self.assertRaises(functions.PartException) as caught:
+            self.ledger.commit(reservations)
+        self.assertEqual(caught.exception.value, "GPU_01 is out of stock.\n")
+        # The CPUs are still only reserved, so releasing them restocks them.
+        self.ledger.release(reservations[0])
+        self.ledger.release(taken)
+        self.assertEqual(self.ledger.available("CPU_01"), 3)
+        self.assertEqual(self.ledger.available("GPU_01"), 1)
+
+if __name__ == "__main__":
+    unittest.main()